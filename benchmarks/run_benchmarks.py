@@ -0,0 +1,254 @@
+# /benchmarks/run_benchmarks.py
+"""
+Offline microbenchmarks for the database layer, CounterView rendering and the
+job worker. Everything runs against a throwaway SQLite file; Discord is never
+contacted (views are rendered with a stub bot and the worker's message edits
+go nowhere because no views are posted).
+
+    python benchmarks/run_benchmarks.py                   # run and compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline   # run and store the results as the new baseline
+    python benchmarks/run_benchmarks.py --quick           # smaller workloads, for a fast sanity check
+
+Results are written as JSON (default: benchmarks/results/latest.json). A metric
+that is worse than the baseline by more than its threshold is reported as a
+regression and the script exits with status 1. A missing baseline exits with
+status 2, so a comparison can never pass by silently not running. The committed
+baseline keeps each metric's worst value over three full runs. Timings do not
+carry across hardware: refresh it with --save-baseline on the machine that runs
+the comparison.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modules.database_manager import DatabaseManager
+from modules.async_database import AsyncDatabaseManager
+from modules.sync_journal import MutationJournal
+from modules.job_scheduler import JobScheduler
+from modules.render_scheduler import RenderScheduler
+from modules.autocomplete_index import AutocompleteIndex
+from modules.render_cache import RenderCache
+from modules.views import CounterView
+from main import CounterBot
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+DEFAULT_THRESHOLD = 0.30 # Fractional slowdown tolerated before a metric counts as a regression
+GUILD_ID = 1
+
+class BenchmarkWorkspace:
+    """A temp directory holding a fresh database and journal, mirroring the bot's production wiring."""
+    def __init__(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix='counterbot-bench-')
+        self.db_manager = DatabaseManager(os.path.join(self._tmp.name, 'bench.db'))
+        self.db_manager.journal = MutationJournal(os.path.join(self._tmp.name, 'journal'))
+        self.db_manager.initialize_database()
+
+    def close(self):
+        self.db_manager.journal.close(); self.db_manager.engine.dispose(); self._tmp.cleanup()
+
+class StubBot:
+    """
+    Just enough of CounterBot for CounterView and CounterBot.db_worker to run
+    offline. The worker methods are CounterBot's own, so the benchmark measures
+    the production code path.
+    """
+    db_worker = CounterBot.db_worker
+    purge_group_views = CounterBot.purge_group_views
+    proactive_group_refresh = CounterBot.proactive_group_refresh
+    render_view_edit = CounterBot.render_view_edit
+    edit_view_message = CounterBot.edit_view_message
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = AsyncDatabaseManager(db_manager)
+        self.db_queue = JobScheduler(lane_count=4)
+        self.render_scheduler = RenderScheduler(self.render_view_edit)
+        self.autocomplete_index = AutocompleteIndex()
+        self.locked_groups: set[tuple] = set()
+        self._pending_refreshes: set[tuple] = set()
+        self.purging_groups: set[tuple] = set()
+        self.rendered_versions: dict[int, int] = {}
+        self.render_cache = RenderCache()
+        self.sent_payload_hashes: dict[int, str] = {}
+
+    def get_channel(self, channel_id: int): return None
+
+def timed(func, repeat: int) -> float:
+    """Median wall-clock seconds of `repeat` calls."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter(); func(); samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def metric(value: float, unit: str, better: str) -> dict:
+    return {'value': round(value, 6), 'unit': unit, 'better': better}
+
+# --- Benchmarks ---
+def bench_database(sizes: dict) -> dict:
+    workspace = BenchmarkWorkspace(); db = workspace.db_manager
+    n = sizes['db_ops']
+    try:
+        started = time.perf_counter()
+        for i in range(n): db.create_counter(GUILD_ID, f"group{i % 10}", f"counter{i}")
+        create_rate = n / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for i in range(n): db.update_counter(GUILD_ID, f"group{i % 10}", f"counter{i}", 'inc')
+        update_rate = n / (time.perf_counter() - started)
+
+        batch = {f"counter{i}": 1 for i in range(0, n, 10)}
+        deltas_seconds = timed(lambda: db.apply_counter_deltas(GUILD_ID, "group0", batch), repeat=5)
+
+        db.cache.invalidate(GUILD_ID, "group0")
+        cold_read = timed(lambda: (db.cache.invalidate(GUILD_ID, "group0"), db.get_counters_in_group(GUILD_ID, "group0")), repeat=5)
+        warm_read = timed(lambda: db.get_counters_in_group(GUILD_ID, "group0"), repeat=50)
+
+        started = time.perf_counter()
+        for i in range(n): db.delete_counter(GUILD_ID, f"group{i % 10}", f"counter{i}")
+        delete_rate = n / (time.perf_counter() - started)
+        return {
+            'db.create_counter': metric(create_rate, 'ops/s', 'higher'),
+            'db.update_counter': metric(update_rate, 'ops/s', 'higher'),
+            'db.apply_counter_deltas_batch': metric(deltas_seconds * 1000, 'ms', 'lower'),
+            'db.get_counters_in_group_cold': metric(cold_read * 1000, 'ms', 'lower'),
+            'db.get_counters_in_group_warm': metric(warm_read * 1000, 'ms', 'lower'),
+            'db.delete_counter': metric(delete_rate, 'ops/s', 'higher'),
+        }
+    finally: workspace.close()
+
+def bench_hot_path(sizes: dict) -> dict:
+    """Per-operation latency of the calls on the click and render paths, with the counter cache bypassed."""
+    workspace = BenchmarkWorkspace(); db = workspace.db_manager
+    n = sizes['hot_ops']
+    try:
+        db.create_counters(GUILD_ID, "hot", [f"counter{i}" for i in range(40)])
+        for i in range(20): db.add_active_view(message_id=i, channel_id=1, guild_id=GUILD_ID, group_name="hot")
+        def per_op(func) -> float:
+            started = time.perf_counter()
+            for i in range(n): func(i)
+            return (time.perf_counter() - started) / n * 1e6
+        return {
+            'hot.increment': metric(per_op(lambda i: db.apply_counter_deltas(GUILD_ID, "hot", {f"counter{i % 40}": 1})), 'us', 'lower'),
+            'hot.page_read': metric(per_op(lambda i: (db.cache.invalidate(GUILD_ID, "hot"), db.get_group_page(GUILD_ID, "hot", i % 10 + 1, 4))), 'us', 'lower'),
+            'hot.group_exists': metric(per_op(lambda i: (db.cache.invalidate(GUILD_ID, "hot"), db.is_group_empty(GUILD_ID, "hot"))), 'us', 'lower'),
+            'hot.views_for_group': metric(per_op(lambda i: db.get_views_for_group(GUILD_ID, "hot")), 'us', 'lower'),
+        }
+    finally: workspace.close()
+
+async def bench_render(sizes: dict) -> dict:
+    workspace = BenchmarkWorkspace(); db = workspace.db_manager
+    results = {}
+    try:
+        bot = StubBot(db)
+        for count in sizes['render_counts']:
+            group_name = f"render{count}"
+            for i in range(count): db.create_counter(GUILD_ID, group_name, f"counter{i:05d}")
+            view = CounterView(bot=bot, guild_id=GUILD_ID, group_name=group_name, page=max(1, count // 8))
+            samples, cached_samples = [], []
+            for _ in range(sizes['render_repeat']):
+                bot.render_cache = RenderCache() # Cold: the page is queried and rendered
+                started = time.perf_counter()
+                await view._rebuild_ui(); view._get_content()
+                samples.append(time.perf_counter() - started)
+                started = time.perf_counter() # Warm: served from the versioned render cache
+                await view._rebuild_ui(); view._get_content()
+                cached_samples.append(time.perf_counter() - started)
+            results[f'render.group_{count}_counters'] = metric(statistics.median(samples) * 1000, 'ms', 'lower')
+            results[f'render.group_{count}_counters_cached'] = metric(statistics.median(cached_samples) * 1000, 'ms', 'lower')
+        bot.db.shutdown()
+        return results
+    finally: workspace.close()
+
+async def bench_queue(sizes: dict) -> dict:
+    workspace = BenchmarkWorkspace(); db = workspace.db_manager
+    try:
+        bot = StubBot(db)
+        for i in range(40): db.create_counter(GUILD_ID, f"queue{i % 8}", f"counter{i}")
+        bot.db_queue.start(bot.db_worker)
+        latencies = []
+
+        async def submit(i: int):
+            event = asyncio.Event()
+            job = {'action': 'update_counter', 'payload': {'guild_id': GUILD_ID, 'group_name': f"queue{i % 8}", 'counter_name': f"counter{i % 40}", 'action': 'inc'}, 'event': event}
+            started = time.perf_counter()
+            await bot.db_queue.put(job); await event.wait()
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for offset in range(0, sizes['queue_jobs'], sizes['queue_burst']):
+            await asyncio.gather(*(submit(i) for i in range(offset, min(offset + sizes['queue_burst'], sizes['queue_jobs']))))
+        throughput = len(latencies) / (time.perf_counter() - started)
+        await bot.db_queue.stop(); bot.db.shutdown()
+        return {
+            'queue.latency_p50': metric(percentile(latencies, 0.50) * 1000, 'ms', 'lower'),
+            'queue.latency_p95': metric(percentile(latencies, 0.95) * 1000, 'ms', 'lower'),
+            'queue.throughput': metric(throughput, 'jobs/s', 'higher'),
+        }
+    finally: workspace.close()
+
+# --- Baseline comparison ---
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous['value']: continue
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = -change if current['better'] == 'higher' else change
+        limit = previous.get('threshold', threshold)
+        status = 'REGRESSION' if worse > limit else 'ok'
+        print(f"  {name:<40} {previous['value']:>12.3f} -> {current['value']:>12.3f} {current['unit']:<6} ({change:+.1%}) {status}")
+        if worse > limit: regressions.append(name)
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CounterBot microbenchmarks.")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Where to write the JSON results.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline file to compare against.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Tolerated fractional slowdown per metric (default 0.30).")
+    parser.add_argument('--quick', action='store_true', help="Run smaller workloads.")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL) # The modules log every mutation; that would dominate the timings.
+
+    sizes = {'db_ops': 200, 'hot_ops': 300, 'render_counts': [4, 40, 400], 'render_repeat': 10, 'queue_jobs': 200, 'queue_burst': 20} if args.quick else \
+            {'db_ops': 1000, 'hot_ops': 2000, 'render_counts': [4, 40, 400, 4000], 'render_repeat': 30, 'queue_jobs': 1000, 'queue_burst': 50}
+    results = {}
+    results.update(bench_database(sizes))
+    results.update(bench_hot_path(sizes))
+    results.update(asyncio.run(bench_render(sizes)))
+    results.update(asyncio.run(bench_queue(sizes)))
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(), 'quick': args.quick, 'metrics': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f: json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f: json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}"); return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}; run with --save-baseline to create one."); return 2
+    with open(args.baseline) as f: baseline = json.load(f)
+    if baseline.get('quick') != args.quick: print("Warning: baseline and this run use different workload sizes.")
+    regressions = compare(results, baseline['metrics'], args.threshold)
+    if regressions: print(f"{len(regressions)} regression(s) beyond threshold: {', '.join(regressions)}"); return 1
+    print("No regressions beyond threshold."); return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
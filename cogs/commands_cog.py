@@ -1,13 +1,22 @@
 # /cogs/commands_cog.py
 
+import os
 import asyncio
 import logging
+import tempfile
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from modules.error_handler import send_error_report
 from modules.views import CounterView, ConfirmationView
+from modules.group_purge import describe_purge_failures
+from modules.counter_transfer import FORMATS, MAX_IMPORT_BYTES, format_for, export_counters, download_attachment, new_import_report, import_counters
+
+MAX_BULK_ITEMS = 200
+MAX_FILES_PER_MESSAGE = 10 # Discord's attachment limit per message
+MAX_LEADERBOARD_SIZE = 25
+MAX_SUMMARY_GROUPS = 25
 
 # --- AUTOCOMPLETE HANDLERS (Defined OUTSIDE the class) ---
 # This is the correct pattern. They are now standalone functions.
@@ -15,12 +24,10 @@ from modules.views import CounterView, ConfirmationView
 async def get_groups_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     """Provides autocomplete suggestions for group names."""
     try:
-        # Access the bot instance via interaction.client
-        groups = interaction.client.db_manager.get_all_groups(interaction.guild_id)
-        return [
-            app_commands.Choice(name=g.capitalize(), value=g)
-            for g in groups if current.lower() in g.lower()
-        ][:25] # Discord has a limit of 25 choices
+        # Access the bot instance via interaction.client. Keystrokes are answered from the in-memory index.
+        bot = interaction.client
+        groups = await bot.autocomplete_index.search_groups(interaction.guild_id, current, bot.db.get_counter_names)
+        return [app_commands.Choice(name=g.capitalize(), value=g) for g in groups] # Already capped at Discord's 25 choices
     except Exception:
         # On any error, return an empty list to prevent crashing.
         return []
@@ -30,14 +37,37 @@ async def get_counters_autocomplete(interaction: discord.Interaction, current: s
     group_name = interaction.namespace.group
     if not group_name: return []
     try:
-        counters = interaction.client.db_manager.get_counters_in_group(interaction.guild_id, group_name)
-        return [
-            app_commands.Choice(name=c['name'].capitalize(), value=c['name'])
-            for c in counters if current.lower() in c['name'].lower()
-        ][:25]
+        bot = interaction.client
+        counters = await bot.autocomplete_index.search_counters(interaction.guild_id, group_name, current, bot.db.get_counter_names)
+        return [app_commands.Choice(name=c.capitalize(), value=c) for c in counters]
     except Exception:
         return []
 
+def parse_name_list(raw: str) -> list[str]:
+    """Splits a comma- or newline-separated list of counter names."""
+    return [name.strip().lower() for name in raw.replace('\n', ',').split(',') if name.strip()]
+
+def parse_adjustments(raw: str) -> tuple[dict[str, int], list[str]]:
+    """Parses `name=+3, other=-2` into {name: delta}. Returns the deltas and the entries that could not be parsed."""
+    deltas, invalid = {}, []
+    for entry in raw.replace('\n', ',').split(','):
+        if not entry.strip(): continue
+        name, _, amount = entry.rpartition('=')
+        name = name.strip().lower()
+        try: delta = int(amount.strip())
+        except ValueError: invalid.append(entry.strip()); continue
+        if not name: invalid.append(entry.strip()); continue
+        deltas[name] = deltas.get(name, 0) + delta
+    return deltas, invalid
+
+def format_activity(window: dict) -> str:
+    return f"**{window['net']:+}** net (🔼 {window['increments']} / 🔽 {window['decrements']})"
+
+def format_name_report(label: str, names: list[str], limit: int = 20) -> str:
+    if not names: return ""
+    shown = ", ".join(f"`{name}`" for name in names[:limit])
+    return f"\n{label} ({len(names)}): {shown}" + (f" and {len(names) - limit} more" if len(names) > limit else "")
+
 # --- MAIN COG CLASS ---
 
 class CommandsCog(commands.Cog):
@@ -82,6 +112,47 @@ class CommandsCog(commands.Cog):
                 await self.send_and_delete(interaction, f"✅ Successfully created counter `{name}` in group `{group}`!")
         except Exception as e: await send_error_report(interaction, e)
 
+    @app_commands.command(name="bulkcreate", description="Creates many counters in a group at once.")
+    @app_commands.describe(group="The group name (case-insensitive).", names="Counter names, separated by commas.")
+    @app_commands.autocomplete(group=get_groups_autocomplete)
+    async def bulkcreate(self, interaction: discord.Interaction, group: str, names: str):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            counter_names = parse_name_list(names)
+            if not counter_names: await interaction.followup.send("❌ **Error:** No counter names given.", ephemeral=True); return
+            if len(counter_names) > MAX_BULK_ITEMS: await interaction.followup.send(f"❌ **Error:** At most {MAX_BULK_ITEMS} counters can be created at once.", ephemeral=True); return
+            job_event = asyncio.Event()
+            job = {'action': 'create_counters', 'payload': {'guild_id': interaction.guild.id, 'group_name': group.lower(), 'counter_names': counter_names}, 'event': job_event}
+            await self.bot.db_queue.put(job)
+            await job_event.wait()
+            if job.get('error'): await interaction.followup.send(f"❌ **Error:** {job['error']}", ephemeral=True); return
+            result = job['result']
+            report = f"✅ Created {len(result['created'])} of {len(counter_names)} counters in group `{group}`."
+            report += format_name_report("⚠️ Already existed or repeated", result['duplicates'])
+            await interaction.followup.send(report, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
+    @app_commands.command(name="bulkadjust", description="Adjusts many counters in a group at once.")
+    @app_commands.describe(group="The group the counters belong to.", adjustments="Entries like `apples=+3, pears=-2`, separated by commas.")
+    @app_commands.autocomplete(group=get_groups_autocomplete)
+    async def bulkadjust(self, interaction: discord.Interaction, group: str, adjustments: str):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            deltas, invalid = parse_adjustments(adjustments)
+            if invalid: await interaction.followup.send(f"❌ **Error:** Could not read {', '.join(f'`{entry}`' for entry in invalid[:10])}. Use `name=+3` or `name=-2`.", ephemeral=True); return
+            if not deltas: await interaction.followup.send("❌ **Error:** No adjustments given.", ephemeral=True); return
+            if len(deltas) > MAX_BULK_ITEMS: await interaction.followup.send(f"❌ **Error:** At most {MAX_BULK_ITEMS} counters can be adjusted at once.", ephemeral=True); return
+            job_event = asyncio.Event()
+            job = {'action': 'adjust_counters', 'payload': {'guild_id': interaction.guild.id, 'group_name': group.lower(), 'deltas': deltas}, 'event': job_event}
+            await self.bot.db_queue.put(job)
+            await job_event.wait()
+            if job.get('error'): await interaction.followup.send(f"❌ **Error:** {job['error']}", ephemeral=True); return
+            result = job['result']
+            report = f"✅ Adjusted {len(result['adjusted'])} counters in group `{group}`."
+            report += format_name_report("⚠️ Not found", result['missing'])
+            await interaction.followup.send(report, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
     @app_commands.command(name="listcounters", description="Lists all interactive counters in a specified group.")
     @app_commands.describe(group="The group you want to list (case-insensitive).")
     @app_commands.autocomplete(group=get_groups_autocomplete)
@@ -96,13 +167,113 @@ class CommandsCog(commands.Cog):
     async def listgroups(self, interaction: discord.Interaction):
         try:
             await interaction.response.defer(ephemeral=True)
-            groups = self.bot.db_manager.get_all_groups(interaction.guild.id)
+            groups = await self.bot.db.get_all_groups(interaction.guild.id)
             if not groups: await interaction.followup.send("There are no counter groups in this server yet.", ephemeral=True); return
             formatted_list = "\n".join([f"- `{group.capitalize()}`" for group in sorted(groups)])
             embed = discord.Embed(title="Available Counter Groups", description=formatted_list, color=discord.Color.blue())
             await interaction.followup.send(embed=embed, ephemeral=True)
         except Exception as e: await send_error_report(interaction, e)
 
+    @app_commands.command(name="counterstats", description="Shows recent activity for a group or one of its counters.")
+    @app_commands.describe(group="The group to inspect.", name="Optional: a single counter in the group.")
+    @app_commands.autocomplete(group=get_groups_autocomplete, name=get_counters_autocomplete)
+    async def counterstats(self, interaction: discord.Interaction, group: str, name: str = None):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            group_lower = group.lower(); name_lower = name.lower() if name else None
+            stats = await self.bot.db.get_counter_stats(interaction.guild.id, group_lower, name_lower)
+            title = f"Activity: `{group.capitalize()}`" + (f" / `{name.capitalize()}`" if name else "")
+            embed = discord.Embed(title=title, color=discord.Color.blue())
+            for label, key in (("Last hour", 'last_hour'), ("Last 24 hours", 'last_24h'), ("Last 7 days", 'last_7d')):
+                embed.add_field(name=label, value=format_activity(stats['windows'][key]), inline=True)
+            if stats['peak_hour']:
+                embed.add_field(name="Busiest hour (7 days)", value=f"<t:{stats['peak_hour']['bucket_start']}:f> — {stats['peak_hour']['activity']} clicks", inline=False)
+            if stats['top_counters']:
+                top = "\n".join(f"- `{c['name'].capitalize()}`: 🔼 {c['increments']} / 🔽 {c['decrements']}" for c in stats['top_counters'])
+                embed.add_field(name="Most active (24 hours)", value=top, inline=False)
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
+    @app_commands.command(name="leaderboard", description="Shows the highest counters in this server or in one group.")
+    @app_commands.describe(group="Optional: only rank the counters of this group.", size=f"How many counters to show (1-{MAX_LEADERBOARD_SIZE}, default 10).")
+    @app_commands.autocomplete(group=get_groups_autocomplete)
+    async def leaderboard(self, interaction: discord.Interaction, group: str = None, size: app_commands.Range[int, 1, MAX_LEADERBOARD_SIZE] = 10):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            group_lower = group.lower() if group else None
+            entries = await self.bot.db.get_leaderboard(interaction.guild.id, size, group_lower)
+            if not entries: await interaction.followup.send("There are no counters to rank yet." if not group else f"No group named `{group}` found.", ephemeral=True); return
+            lines = [f"**{rank}.** `{e['name'].capitalize()}`" + ("" if group else f" ({e['group'].capitalize()})") + f": **{e['value']}**" for rank, e in enumerate(entries, start=1)]
+            title = f"Leaderboard: `{group.capitalize()}`" if group else "Server Leaderboard"
+            embed = discord.Embed(title=title, description="\n".join(lines), color=discord.Color.blue())
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
+    @app_commands.command(name="groupsummary", description="Shows the counter count and total of every group in this server.")
+    async def groupsummary(self, interaction: discord.Interaction):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            summary = await self.bot.db.get_group_summary(interaction.guild.id)
+            if not summary: await interaction.followup.send("There are no counter groups in this server yet.", ephemeral=True); return
+            ranked = sorted(summary, key=lambda g: g['total'], reverse=True)
+            lines = [f"- `{g['group'].capitalize()}`: **{g['total']}** across {g['counters']} counters (highest {g['max']}, lowest {g['min']})" for g in ranked[:MAX_SUMMARY_GROUPS]]
+            if len(ranked) > MAX_SUMMARY_GROUPS: lines.append(f"...and {len(ranked) - MAX_SUMMARY_GROUPS} more groups")
+            embed = discord.Embed(title="Group Summary", description="\n".join(lines), color=discord.Color.blue())
+            embed.add_field(name="Groups", value=str(len(summary)), inline=True)
+            embed.add_field(name="Counters", value=str(sum(g['counters'] for g in summary)), inline=True)
+            embed.add_field(name="Total", value=str(sum(g['total'] for g in summary)), inline=True)
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
+    @app_commands.command(name="exportcounters", description="Exports every counter in this server as CSV or JSON Lines files.")
+    @app_commands.describe(format="The file format (default: csv).")
+    @app_commands.choices(format=[app_commands.Choice(name=fmt.upper(), value=fmt) for fmt in FORMATS])
+    async def exportcounters(self, interaction: discord.Interaction, format: str = 'csv'):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            with tempfile.TemporaryDirectory(prefix='counterbot-export-') as directory:
+                paths, rows = await export_counters(self.bot.db, interaction.guild.id, directory, format, base_name=f"counters-{interaction.guild.id}")
+                for start in range(0, len(paths), MAX_FILES_PER_MESSAGE):
+                    content = f"✅ Exported {rows} counters in {len(paths)} file(s)." if start == 0 else None
+                    await interaction.followup.send(content, files=[discord.File(path) for path in paths[start:start + MAX_FILES_PER_MESSAGE]], ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
+    @app_commands.command(name="importcounters", description="Creates or overwrites counters from an exported CSV or JSON Lines file.")
+    @app_commands.describe(file="A .csv (group,counter,value) or .jsonl file, as written by /exportcounters.")
+    async def importcounters(self, interaction: discord.Interaction, file: discord.Attachment):
+        try:
+            await interaction.response.defer(ephemeral=True)
+            fmt = format_for(file.filename)
+            if fmt is None: await interaction.followup.send("❌ **Error:** Only `.csv` and `.jsonl` files can be imported.", ephemeral=True); return
+            if file.size > MAX_IMPORT_BYTES: await interaction.followup.send(f"❌ **Error:** Import files can be at most {MAX_IMPORT_BYTES // (1024 * 1024)} MB.", ephemeral=True); return
+            guild_id = interaction.guild.id
+            async def apply_group(group_name: str, rows: list[list]):
+                # Through the group's lane, so the import is ordered with the clicks and edits of the same group.
+                job_event = asyncio.Event()
+                job = {'action': 'import_counters', 'payload': {'guild_id': guild_id, 'group_name': group_name, 'rows': rows}, 'event': job_event, 'defer_refresh': True}
+                await self.bot.db_queue.put(job)
+                await job_event.wait()
+                if job.get('error'): raise RuntimeError(job['error'])
+            report = new_import_report()
+            try:
+                with tempfile.TemporaryDirectory(prefix='counterbot-import-') as directory:
+                    path = os.path.join(directory, f"import.{fmt}")
+                    await download_attachment(file.url, path)
+                    await import_counters(apply_group, path, fmt, report)
+            except Exception:
+                if report['imported']: await interaction.followup.send(f"⚠️ The import failed partway: {report['imported']} counters in {len(report['groups'])} group(s) were already imported.", ephemeral=True)
+                raise
+            finally: # Groups written before a failure are refreshed too
+                if report['groups']: self.bot.autocomplete_index.invalidate(guild_id)
+                for group_name in sorted(report['groups']): await self.bot.proactive_group_refresh(guild_id, group_name, locked=False)
+            message = f"✅ Imported {report['imported']} counters into {len(report['groups'])} group(s)."
+            if report['stopped']: message = f"⚠️ The import stopped early ({report['stopped']}). {report['imported']} counters in {len(report['groups'])} group(s) were imported before that."
+            if report['invalid']:
+                message += f"\n⚠️ Skipped {report['invalid']} invalid rows:\n" + "\n".join(f"- {error}" for error in report['errors'])
+                if report['invalid'] > len(report['errors']): message += f"\n- and {report['invalid'] - len(report['errors'])} more"
+            await interaction.followup.send(message, ephemeral=True)
+        except Exception as e: await send_error_report(interaction, e)
+
     @app_commands.command(name="deletecounter", description="Deletes a counter from a group.")
     @app_commands.describe(group="The group the counter belongs to.", name="The counter to delete.")
     @app_commands.autocomplete(group=get_groups_autocomplete, name=get_counters_autocomplete)
@@ -115,7 +286,7 @@ class CommandsCog(commands.Cog):
             await self.bot.db_queue.put(job_del)
             await job_event_del.wait()
             await self.send_and_delete(interaction, f"✅ Deleted counter `{name}` from group `{group}`.")
-            if self.bot.db_manager.is_group_empty(interaction.guild.id, group_lower):
+            if await self.bot.db.is_group_empty(interaction.guild.id, group_lower):
                 confirm_view = ConfirmationView(author=interaction.user, confirmation_text=f"The group **`{group.capitalize()}`** is now empty. Would you like to delete it and all its associated messages?")
                 await interaction.followup.send(confirm_view.confirmation_text, view=confirm_view, ephemeral=True)
                 message = await interaction.original_response()
@@ -126,7 +297,7 @@ class CommandsCog(commands.Cog):
                     job_purge = {'action': 'delete_group', 'payload': {'guild_id': interaction.guild.id, 'group_name': group_lower}, 'event': job_event_purge}
                     await self.bot.db_queue.put(job_purge)
                     await job_event_purge.wait()
-                    await message.edit(content=f"✅ Successfully purged the empty group `{group}`.", view=None)
+                    await message.edit(content=f"✅ Successfully purged the empty group `{group}`." + describe_purge_failures(job_purge), view=None)
         except Exception as e: await send_error_report(interaction, e)
 
     @app_commands.command(name="deletegroup", description="[DANGEROUS] Deletes an entire group and all of its counters.")
@@ -135,7 +306,7 @@ class CommandsCog(commands.Cog):
     async def deletegroup(self, interaction: discord.Interaction, group: str):
         try:
             group_name_lower = group.lower()
-            if not self.bot.db_manager.get_all_groups(interaction.guild.id, group_filter=group_name_lower):
+            if not await self.bot.db.get_all_groups(interaction.guild.id, group_filter=group_name_lower):
                  await interaction.response.send_message(f"No group named `{group}` found.", ephemeral=True); return
             confirmation_text = f"**⚠️ IRREVERSIBLE ACTION ⚠️**\n\nThis will permanently delete:\n1. The group **`{group.capitalize()}`** and all of its counters from the database.\n2. **ALL** interactive counter list messages ever posted for this group.\n\nAre you absolutely sure?"
             view = ConfirmationView(author=interaction.user, confirmation_text=confirmation_text)
@@ -148,7 +319,7 @@ class CommandsCog(commands.Cog):
                 job = {'action': 'delete_group', 'payload': {'guild_id': interaction.guild.id, 'group_name': group_name_lower}, 'event': job_event}
                 await self.bot.db_queue.put(job)
                 await job_event.wait()
-                await message.edit(content=f"✅ Successfully purged group `{group}` and all associated data.", view=None)
+                await message.edit(content=f"✅ Successfully purged group `{group}` and all associated data." + describe_purge_failures(job), view=None)
         except Exception as e: await send_error_report(interaction, e)
 
 async def setup(bot: commands.Bot):
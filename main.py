@@ -1,17 +1,36 @@
 # Counter_Bot.py
 
 import os
+import sys
+import time
+import signal
 import asyncio
+import subprocess
 import logging
 import discord
 from discord.ext import commands
 from threading import Thread
-from flask import Flask
+from flask import Flask, Response, jsonify
 from dotenv import load_dotenv
 
 from modules.gdrive_sync import GDriveSync
+from modules.local_sync import LocalDirectorySync
+from modules.sync_journal import MutationJournal, JournalSync
 from modules.database_manager import DatabaseManager
-from modules.views import CounterView
+from modules.async_database import AsyncDatabaseManager
+from modules.db_service import DatabaseService, RemoteDatabaseManager
+from modules.views import CounterView, CounterActionButton, CounterPageButton, route_digest
+from modules.job_scheduler import JobScheduler
+from modules.write_coalescer import DeltaCoalescer
+from modules.render_scheduler import RenderScheduler
+from modules.view_restorer import ViewRestorer
+from modules.autocomplete_index import AutocompleteIndex
+from modules.group_purge import GroupPurger
+from modules.render_cache import RenderCache
+from modules.loop_watchdog import LoopWatchdog
+from modules.admission import AdmissionController
+from modules.metrics import REGISTRY, JOB_SECONDS, JOBS_TOTAL, ADMISSION_DECISIONS
+from modules.startup import StartupOrchestrator, StartupError, command_tree_fingerprint
 
 load_dotenv()
 BOT_MODE = os.getenv('BOT_MODE', 'development')
@@ -22,57 +41,178 @@ TOKEN = os.getenv('DISCORD_TOKEN')
 GDRIVE_FOLDER_ID = os.getenv('GDRIVE_FOLDER_ID')
 DB_FILE_NAME = "counters.db"
 SYNC_INTERVAL_SECONDS = 60
+SYNC_LOCAL_DIR = os.getenv('SYNC_LOCAL_DIR') # When set, replaces Google Drive with a local directory store
+JOURNAL_DIR = os.getenv('JOURNAL_DIR', 'journal')
+SNAPSHOT_EVERY_SEGMENTS = int(os.getenv('SNAPSHOT_EVERY_SEGMENTS', '30'))
+DB_WORKER_LANES = int(os.getenv('DB_WORKER_LANES', '4'))
+CLICK_COALESCE_SECONDS = float(os.getenv('CLICK_COALESCE_SECONDS', '0.25'))
+COUNTER_CACHE_MB = float(os.getenv('COUNTER_CACHE_MB', '8'))
+MAX_CONCURRENT_EDITS = int(os.getenv('MAX_CONCURRENT_EDITS', '8'))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+RESTORE_CONCURRENCY = int(os.getenv('RESTORE_CONCURRENCY', '8'))
+AUTOCOMPLETE_MAX_NAMES = int(os.getenv('AUTOCOMPLETE_MAX_NAMES', '200000'))
+AUTOCOMPLETE_IDLE_SECONDS = float(os.getenv('AUTOCOMPLETE_IDLE_SECONDS', '900'))
+LOOP_WATCHDOG = os.getenv('LOOP_WATCHDOG', '0') == '1' # Opt-in: logs the loop thread's stack whenever the loop stalls
+LOOP_STALL_THRESHOLD_MS = float(os.getenv('LOOP_STALL_THRESHOLD_MS', '250'))
+RENDER_CACHE_ENTRIES = int(os.getenv('RENDER_CACHE_ENTRIES', '2048'))
+AGGREGATE_CACHE_ENTRIES = int(os.getenv('AGGREGATE_CACHE_ENTRIES', '1024')) # Cached leaderboards and group summaries
+PURGE_CONCURRENCY = int(os.getenv('PURGE_CONCURRENCY', '4'))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '10')) # How long close() waits for queued jobs
+HISTORY_PRUNE_INTERVAL_SECONDS = int(os.getenv('HISTORY_PRUNE_INTERVAL_SECONDS', '3600'))
+# Click admission: token buckets per user and per guild (clicks per second, burst size) and a db_queue depth cap.
+CLICK_USER_RATE = float(os.getenv('CLICK_USER_RATE', '5'))
+CLICK_USER_BURST = float(os.getenv('CLICK_USER_BURST', '10'))
+CLICK_GUILD_RATE = float(os.getenv('CLICK_GUILD_RATE', '50'))
+CLICK_GUILD_BURST = float(os.getenv('CLICK_GUILD_BURST', '100'))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', '500'))
+# Sharding: each bot process runs one shard and reaches the database through the single-writer service on this socket.
+DB_SERVICE_SOCKET = os.getenv('DB_SERVICE_SOCKET')
+SHARD_ID = int(os.getenv('SHARD_ID')) if os.getenv('SHARD_ID') else None
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+KEEP_ALIVE_PORT = int(os.getenv('KEEP_ALIVE_PORT', '8080'))
+COMMAND_TREE_FINGERPRINT_KEY = 'command_tree_fingerprint'
+
+def build_storage():
+    """Database, journal and remote store. Owned by the bot itself, or by the database service when sharded."""
+    db_manager = DatabaseManager(DB_FILE_NAME, cache_budget_bytes=int(COUNTER_CACHE_MB * 1024 * 1024), pool_size=DB_POOL_SIZE, aggregate_cache_entries=AGGREGATE_CACHE_ENTRIES)
+    db = AsyncDatabaseManager(db_manager, max_workers=DB_POOL_SIZE)
+    store = LocalDirectorySync(DB_FILE_NAME, SYNC_LOCAL_DIR) if SYNC_LOCAL_DIR else GDriveSync(DB_FILE_NAME, GDRIVE_FOLDER_ID)
+    journal = MutationJournal(JOURNAL_DIR); db_manager.journal = journal
+    journal_sync = JournalSync(db_manager, store, journal, snapshot_every=SNAPSHOT_EVERY_SEGMENTS)
+    return db_manager, db, store, journal, journal_sync
+
+async def storage_maintenance(db, journal, journal_sync, last_prune: float) -> float:
+    """One sync_worker tick of the storage owner: hourly history pruning, then the incremental journal sync. Returns the last prune time."""
+    if time.monotonic() - last_prune >= HISTORY_PRUNE_INTERVAL_SECONDS:
+        last_prune = time.monotonic()
+        try: await db.prune_history()
+        except Exception as e: log.error(f"Failed to prune counter history: {e}", exc_info=True)
+    if journal.has_pending():
+        log.info("Journal has pending mutations, starting incremental sync...")
+        try: await journal_sync.sync(); log.info("Incremental sync successful.")
+        except Exception as e: log.error(f"Failed to sync journal to the remote store: {e}", exc_info=True)
+    return last_prune
 
 class CounterBot(commands.Bot):
     def __init__(self):
-        super().__init__(command_prefix="!", intents=discord.Intents.default())
-        self.db_manager = DatabaseManager(DB_FILE_NAME)
-        self.gdrive_sync = GDriveSync(DB_FILE_NAME, GDRIVE_FOLDER_ID)
-        self.db_queue = asyncio.Queue()
-        self.locked_groups = set()
-        self.db_is_dirty = False
+        super().__init__(command_prefix="!", intents=discord.Intents.default(), shard_id=SHARD_ID, shard_count=SHARD_COUNT)
+        if DB_SERVICE_SOCKET:
+            # Shard process: the database service owns the file, the journal and the remote store.
+            self.db_manager = self.gdrive_sync = self.journal = self.journal_sync = None
+            self.db = RemoteDatabaseManager(DB_SERVICE_SOCKET)
+            self.db.on_invalidate(self.on_database_invalidation)
+        else: self.db_manager, self.db, self.gdrive_sync, self.journal, self.journal_sync = build_storage()
+        self.db_queue = JobScheduler(lane_count=DB_WORKER_LANES)
+        self.coalescer = DeltaCoalescer(self.db_queue, window_seconds=CLICK_COALESCE_SECONDS)
+        self.admission = AdmissionController(self.db_queue, self.coalescer, user_rate=CLICK_USER_RATE, user_burst=CLICK_USER_BURST, guild_rate=CLICK_GUILD_RATE, guild_burst=CLICK_GUILD_BURST, max_queue_depth=MAX_QUEUE_DEPTH)
+        self.render_scheduler = RenderScheduler(self.render_view_edit, max_concurrent_edits=MAX_CONCURRENT_EDITS)
+        self.view_restorer = ViewRestorer(lambda record: self.edit_view_message(record, locked=False), concurrency=RESTORE_CONCURRENCY)
+        self.group_purger = GroupPurger(self, concurrency=PURGE_CONCURRENCY)
+        self.autocomplete_index = AutocompleteIndex(max_names=AUTOCOMPLETE_MAX_NAMES, idle_seconds=AUTOCOMPLETE_IDLE_SECONDS, route_digest=route_digest)
+        self.locked_groups: set[tuple] = set() # (guild_id, group_name) pairs under a structural change
+        self._pending_refreshes: set[tuple] = set() # (guild_id, group_name, locked) refreshes still looking up their messages
+        self.purging_groups: set[tuple] = set() # (guild_id, group_name) pairs whose posted messages are being deleted
+        self.rendered_versions: dict[int, int] = {} # message_id -> group version currently shown
+        self.render_cache = RenderCache(max_entries=RENDER_CACHE_ENTRIES)
+        self.sent_payload_hashes: dict[int, str] = {} # message_id -> hash of the payload it currently shows
+        self._unsaved_payload_hashes: dict[int, str] = {}
+        self.sync_task: asyncio.Task = None
+        self.sync_stopping = asyncio.Event() # Set by close(): the sync worker finishes its current pass and exits
+        self.startup_timings: dict[str, float] = {}
+        self.loop_watchdog = LoopWatchdog(threshold_seconds=LOOP_STALL_THRESHOLD_MS / 1000) if LOOP_WATCHDOG else None
         self.version = "V1.2.0"
         self.mode = BOT_MODE
+        self.register_metrics()
+
+    def register_metrics(self):
+        """Exposes the live state of the bot's queues and caches as scrape-time gauges."""
+        REGISTRY.gauge('counterbot_db_queue_depth', "Jobs waiting in each db_worker lane.", lambda: {str(s['lane']): s['depth'] for s in self.db_queue.stats()}, labels=('lane',))
+        REGISTRY.gauge('counterbot_render_backlog', "Message edits waiting in the render scheduler.", self.render_scheduler.backlog)
+        REGISTRY.gauge('counterbot_render_events', "Render scheduler event totals since startup, by kind.", lambda: {k: v for k, v in self.render_scheduler.stats().items() if k not in ('backlog', 'active_channels')}, labels=('kind',))
+        REGISTRY.gauge('counterbot_click_batches', "Coalesced click totals since startup.", lambda: {'clicks_received': self.coalescer.clicks_received, 'batches_flushed': self.coalescer.batches_flushed}, labels=('kind',))
+        REGISTRY.gauge('counterbot_render_cache', "Render cache statistics.", self.render_cache.stats, labels=('stat',))
+        REGISTRY.gauge('counterbot_admission', "Admission controller state.", self.admission.stats, labels=('stat',))
+        if self.db_manager is None: return # Storage metrics are exposed by the database service's owner process.
+        REGISTRY.gauge('counterbot_counter_cache', "Counter cache statistics.", self.db_manager.cache.stats, labels=('stat',))
+        REGISTRY.gauge('counterbot_sync_events', "Journal sync totals since startup, by kind.", lambda: dict(self.journal_sync.stats), labels=('kind',))
+        REGISTRY.gauge('counterbot_journal_seq', "Last journal sequence number written.", lambda: self.journal.seq)
 
     async def setup_hook(self):
         log.info("--- Starting Async Setup Hook ---")
-        if not await self.gdrive_sync.authenticate():
-            log.critical("Google Drive authentication FAILED."); return
-        await self.gdrive_sync.download_database()
-        self.db_manager.initialize_database()
-        self.loop.create_task(self.db_worker())
-        self.loop.create_task(self.sync_worker())
-        await self.load_cogs()
-        await self.re_attach_persistent_views()
-        await self.tree.sync()
+        if self.loop_watchdog: self.loop_watchdog.start()
+        # One stateless handler per button template routes the clicks of every posted list, from the first event on.
+        self.add_dynamic_items(CounterActionButton, CounterPageButton)
+        startup = StartupOrchestrator()
+        if self.journal_sync is None: startup.add('restore_database', self.db.connect) # Sharded: the service restores the database.
+        else:
+            startup.add('authenticate', self.authenticate_storage)
+            startup.add('restore_database', self.journal_sync.restore, depends_on=('authenticate',))
+        startup.add('load_cogs', self.load_cogs)
+        startup.add('start_workers', self.start_workers, depends_on=('restore_database',))
+        startup.add('sync_commands', self.sync_command_tree, depends_on=('load_cogs', 'restore_database'))
+        try: self.startup_timings = await startup.run()
+        except StartupError as e: log.critical(str(e)); return
         log.info("--- Async Setup Hook Finished ---")
-        
+
+    async def authenticate_storage(self):
+        if not await self.gdrive_sync.authenticate(): raise StartupError("Google Drive authentication FAILED.")
+
+    async def start_workers(self):
+        self.sent_payload_hashes.update(await self.db.get_payload_hashes())
+        self.db_queue.start(self.db_worker)
+        self.sync_task = self.loop.create_task(self.sync_worker())
+        self.loop.create_task(self.re_attach_persistent_views())
+
+    async def sync_command_tree(self):
+        """Syncs the global command tree only when its fingerprint differs from the one stored at the last sync."""
+        if self.shard_id not in (None, 0): return # The tree is global; shard 0 syncs it for every shard.
+        fingerprint = command_tree_fingerprint(self.tree, self.application_id)
+        if await self.db.get_meta(COMMAND_TREE_FINGERPRINT_KEY) == fingerprint:
+            log.info("[Setup Hook] Command tree unchanged; skipping tree.sync().")
+            return
+        await self.tree.sync()
+        await self.db.set_meta(COMMAND_TREE_FINGERPRINT_KEY, fingerprint)
+        log.info("[Setup Hook] Command tree synced and fingerprint stored.")
+
     async def re_attach_persistent_views(self):
-        log.info("[Setup Hook] Re-attaching and refreshing persistent views...")
-        active_views = self.db_manager.get_all_active_views()
-        count = 0
-        for record in active_views:
-            try:
-                view = CounterView(bot=self, guild_id=record['guild_id'], group_name=record['group_name'])
-                await view.update_message_by_id(record['channel_id'], record['message_id'])
-                count += 1
-            except discord.errors.NotFound:
-                message_id_for_log = record.get('message_id', 'Unknown')
-                log.warning(f"Message {message_id_for_log} not found.")
-                if self.mode == 'development':
-                    prompt = f"  > Stale view for message {message_id_for_log} found. Delete from DB? (y/n) (Defaults to 'y' in 3s): "
-                    try:
-                        loop = asyncio.get_running_loop()
-                        future = loop.run_in_executor(None, lambda: input(prompt).lower())
-                        choice = await asyncio.wait_for(future, timeout=3.0)
-                    except asyncio.TimeoutError:
-                        print("\n  > Timed out. Defaulting to 'y'.")
-                        choice = 'y'
-                    if choice == 'y': self.db_manager.remove_active_view(message_id_for_log); log.info("  > Stale view entry deleted.")
-                    else: log.warning("  > Stale view entry kept.")
-                else: self.db_manager.remove_active_view(message_id_for_log)
-            except Exception as e: log.error(f"Failed to refresh view on startup for record {record}: {e}")
-        log.info(f"Successfully refreshed {count} persistent views.")
+        """Refreshes every posted list in the background. Buttons already route by custom_id; this only brings the values up to date."""
+        log.info("[Setup Hook] Refreshing persistent views...")
+        try:
+            active_views = [record for record in await self.db.get_all_active_views() if self.owns_guild(record['guild_id'])]
+            stale_ids = await self.view_restorer.run(active_views)
+            progress = self.view_restorer.progress
+            log.info(f"Successfully refreshed {progress['restored']} persistent views in {progress['elapsed']}s ({progress['failed']} failed).")
+            if not stale_ids: return
+            log.warning(f"{len(stale_ids)} posted messages no longer exist.")
+            if self.mode == 'development':
+                prompt = f"  > {len(stale_ids)} stale views found. Delete them from DB? (y/n) (Defaults to 'y' in 3s): "
+                try:
+                    loop = asyncio.get_running_loop()
+                    future = loop.run_in_executor(None, lambda: input(prompt).lower())
+                    choice = await asyncio.wait_for(future, timeout=3.0)
+                except asyncio.TimeoutError:
+                    print("\n  > Timed out. Defaulting to 'y'.")
+                    choice = 'y'
+                if choice != 'y': log.warning("  > Stale view entries kept."); return
+            await self.db.remove_active_views(stale_ids)
+            for message_id in stale_ids: self.forget_message(message_id)
+            log.info(f"  > {len(stale_ids)} stale view entries deleted.")
+        except Exception as e: log.error(f"Persistent view restoration failed: {e}", exc_info=True)
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether this process's shard receives the guild's events (Discord's `(guild_id >> 22) % shard_count` rule)."""
+        return self.shard_count is None or (guild_id >> 22) % self.shard_count == (self.shard_id or 0)
+
+    def on_database_invalidation(self, event: dict):
+        """Pushed by the database service when another process changed a group, or after a reconnect ('resync')."""
+        if event['event'] == 'resync': self.autocomplete_index.invalidate(); return
+        if not self.owns_guild(event['guild_id']): return
+        self.autocomplete_index.invalidate(event['guild_id'])
+        self.loop.create_task(self.proactive_group_refresh(event['guild_id'], event['group_name'], locked=False))
+
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Guilds that are in use while views are still being restored jump the restore queue.
+        if self.view_restorer.running and interaction.guild_id: self.view_restorer.prioritize(interaction.guild_id)
 
     async def load_cogs(self):
         log.info("[Setup Hook] Loading command cogs...")
@@ -86,60 +226,175 @@ class CounterBot(commands.Bot):
                 except Exception as e:
                     log.error(f"❌ Failed to load cog: {filename}", exc_info=e)
 
+    async def stop_sync_worker(self) -> bool:
+        """Lets the periodic sync finish the pass in flight and waits for it. Returns False if the pass had to be cancelled."""
+        if self.sync_task is None: return True
+        self.sync_stopping.set()
+        try: await asyncio.wait_for(asyncio.shield(self.sync_task), timeout=SHUTDOWN_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            self.sync_task.cancel(); log.warning(f"Shutdown: the periodic sync did not finish within {SHUTDOWN_DRAIN_SECONDS}s and was cancelled.")
+            return False
+        except Exception as e: log.error(f"Sync worker failed: {e}", exc_info=True)
+        return True
+
+    async def close(self):
+        # No periodic upload or snapshot may overlap the final sync, the database shutdown or the clean-shutdown marker.
+        sync_stopped = await self.stop_sync_worker()
+        # Clicks still in their coalescing window and jobs already queued are committed before the final sync.
+        self.coalescer.flush_all()
+        if not await self.db_queue.drain(timeout=SHUTDOWN_DRAIN_SECONDS): log.warning(f"Shutdown: {self.db_queue.qsize()} queued jobs were not processed within {SHUTDOWN_DRAIN_SECONDS}s.")
+        await self.db_queue.stop()
+        try:
+            await self.save_payload_hashes()
+            if self.journal_sync: await self.journal_sync.sync()
+        except Exception as e: log.error(f"Final sync on shutdown failed: {e}", exc_info=True)
+        await super().close()
+        await asyncio.to_thread(self.db.shutdown)
+        # A cancelled pass may still be writing in its thread, so the file cannot be vouched for.
+        if self.journal_sync and sync_stopped: await asyncio.to_thread(self.journal_sync.mark_clean_shutdown)
+        if self.loop_watchdog: self.loop_watchdog.stop()
+
     async def on_ready(self):
         log.info("=" * 30); log.info(f"{self.user} is online. Version: {self.version}"); log.info("=" * 30)
         
-    async def purge_group_views(self, guild_id: int, group_name: str):
-        log.info(f"Purging all Discord messages for group '{group_name}'...")
-        views_to_delete = self.db_manager.get_views_for_group(guild_id, group_name)
-        for record in views_to_delete:
-            try:
-                channel = self.get_channel(record['channel_id']) or await self.fetch_channel(record['channel_id'])
-                message = await channel.fetch_message(record['message_id'])
-                await message.delete()
-                log.info(f"  > Deleted message {record['message_id']}")
-            except Exception: pass
+    async def purge_group_views(self, guild_id: int, group_name: str, records: list[dict], job: dict):
+        """Deletes a deleted group's posted messages and stores the outcome in `job['purge']`."""
+        log.info(f"Purging {len(records)} Discord messages for group '{group_name}'...")
+        try: job['purge'] = summary = await self.group_purger.purge(records)
+        except Exception as e:
+            log.error(f"Purge of group '{group_name}' failed: {e}", exc_info=True)
+            job['purge'] = {'messages': len(records), 'deleted': 0, 'missing': 0, 'failed': len(records), 'errors': [str(e)]}; return
+        finally: self.purging_groups.discard((guild_id, group_name))
+        for record in records: self.forget_message(record['message_id'])
+        log.info(f"  > Purge of '{group_name}' finished in {summary['elapsed']}s: {summary['deleted']} deleted, {summary['missing']} already gone, {summary['failed']} failed.")
+        if summary['errors']: log.warning(f"  > Purge errors for '{group_name}': {summary['errors']}")
 
     async def proactive_group_refresh(self, guild_id: int, group_name: str, locked: bool):
+        """Schedules a re-render of every posted message of the group. Edits are sent by the RenderScheduler."""
+        # Edits render the group's state when they are sent, so a refresh that has not scheduled its edits yet covers this one too.
+        key = (guild_id, group_name, locked)
+        if key in self._pending_refreshes: ADMISSION_DECISIONS.inc(decision='refresh_deduplicated'); return
         log.info(f"Proactively refreshing views for group '{group_name}' to locked={locked}")
-        views_to_update = self.db_manager.get_views_for_group(guild_id, group_name)
-        for record in views_to_update:
-            try:
-                view = CounterView(bot=self, guild_id=record['guild_id'], group_name=record['group_name'])
-                await view.update_message_by_id(record['channel_id'], record['message_id'], locked=locked)
-            except discord.errors.NotFound: self.db_manager.remove_active_view(record['message_id'])
-            except Exception as e: log.error(f"Failed to proactively refresh message {record['message_id']}: {e}")
-
-    async def db_worker(self):
-        log.info("DB worker started.")
-        while True:
-            job = await self.db_queue.get()
-            group_name = job.get('payload', {}).get('group_name'); guild_id = job.get('payload', {}).get('guild_id')
-            try:
-                action, payload = job.get('action'), job.get('payload', {})
-                if action == 'delete_group': await self.purge_group_views(guild_id, group_name)
-                if action == 'create_counter': job['error'] = self.db_manager.create_counter(**payload)
-                elif action == 'update_counter': self.db_manager.update_counter(**payload)
-                elif action == 'delete_counter': self.db_manager.delete_counter(**payload)
-                elif action == 'delete_group': self.db_manager.delete_group(**payload)
-                if not job.get('error'): self.db_is_dirty = True; await self.proactive_group_refresh(guild_id, group_name, locked=False)
-                else: await self.proactive_group_refresh(guild_id, group_name, locked=False)
-            except Exception as e:
-                log.error(f"Critical worker error: {e}", exc_info=True); job['error'] = "A critical worker error occurred."
-                await self.proactive_group_refresh(guild_id, group_name, locked=False)
-            finally:
-                if group_name in self.locked_groups: self.locked_groups.remove(group_name)
-                if event := job.get('event'): event.set()
-                self.db_queue.task_done()
+        self._pending_refreshes.add(key)
+        try: records = await self.db.get_views_for_group(guild_id, group_name)
+        finally: self._pending_refreshes.discard(key)
+        if (guild_id, group_name) in self.purging_groups: return # A lookup that started before the delete; its messages are going away
+        for record in records: self.render_scheduler.schedule(record, locked=locked)
+
+    async def edit_view_message(self, record: dict, locked: bool):
+        """Renders the group's current state and edits it into one posted message. Raises NotFound if it is gone."""
+        view = CounterView(bot=self, guild_id=record['guild_id'], group_name=record['group_name'])
+        await view.update_message_by_id(record['channel_id'], record['message_id'], locked=locked)
+
+    async def render_view_edit(self, record: dict, locked: bool):
+        try: await self.edit_view_message(record, locked)
+        except discord.errors.NotFound:
+            await self.db.remove_active_view(record['message_id']); self.forget_message(record['message_id'])
+
+    def note_rendered(self, message_id: int, version: int, payload_hash: str):
+        """Records what a message now shows. Hashes are persisted in batches by the sync worker."""
+        self.rendered_versions[message_id] = version
+        if self.sent_payload_hashes.get(message_id) != payload_hash:
+            self.sent_payload_hashes[message_id] = payload_hash; self._unsaved_payload_hashes[message_id] = payload_hash
+
+    def forget_message(self, message_id: int):
+        for state in (self.rendered_versions, self.sent_payload_hashes, self._unsaved_payload_hashes): state.pop(message_id, None)
+
+    async def save_payload_hashes(self):
+        if not self._unsaved_payload_hashes: return
+        hashes, self._unsaved_payload_hashes = self._unsaved_payload_hashes, {}
+        await self.db.save_payload_hashes([[message_id, payload_hash] for message_id, payload_hash in hashes.items()])
+
+    async def db_worker(self, job: dict):
+        """Processes a single job. Called by the JobScheduler lane that owns the job's group."""
+        group_name = job.get('payload', {}).get('group_name'); guild_id = job.get('payload', {}).get('guild_id')
+        action, payload = job.get('action'), job.get('payload', {})
+        started = asyncio.get_running_loop().time()
+        try:
+            if action == 'create_counter':
+                job['error'] = await self.db.create_counter(**payload)
+                if not job['error']: self.autocomplete_index.on_counter_created(**payload)
+            elif action == 'create_counters':
+                job['result'] = await self.db.create_counters(**payload)
+                for counter_name in job['result']['created']: self.autocomplete_index.on_counter_created(guild_id, group_name, counter_name)
+            elif action == 'adjust_counters': job['result'] = await self.db.adjust_counters(**payload)
+            elif action == 'update_counter': await self.db.update_counter(**payload)
+            elif action == 'apply_deltas': await self.db.apply_counter_deltas(**payload)
+            elif action == 'delete_counter': await self.db.delete_counter(**payload); self.autocomplete_index.on_counter_deleted(**payload)
+            elif action == 'import_counters': job['result'] = await self.db.import_counters(**payload)
+            elif action == 'delete_group':
+                # The rows go first; the Discord-side purge runs off the lane and completes the job when it is done.
+                # delete_group also removes the group's active_views rows; edits already scheduled for them are dropped.
+                records = await self.db.get_views_for_group(guild_id, group_name)
+                self.purging_groups.add((guild_id, group_name))
+                await self.db.delete_group(**payload); self.autocomplete_index.on_group_deleted(**payload)
+                dropped = self.render_scheduler.cancel_group(guild_id, group_name)
+                if dropped: log.info(f"Dropped {dropped} pending edits of group '{group_name}' before purging it.")
+                job['purge_task'] = asyncio.create_task(self.purge_group_views(guild_id, group_name, records, job))
+            # Imports refresh each group once at the end instead of once per batch.
+            if not job.get('defer_refresh'): await self.proactive_group_refresh(guild_id, group_name, locked=False)
+            JOBS_TOTAL.inc(action=action, outcome='rejected' if job.get('error') else 'ok')
+        except Exception as e:
+            log.error(f"Critical worker error: {e}", exc_info=True); job['error'] = "A critical worker error occurred."
+            JOBS_TOTAL.inc(action=action, outcome='error')
+            if not job.get('defer_refresh'): await self.proactive_group_refresh(guild_id, group_name, locked=False)
+        finally:
+            JOB_SECONDS.observe(asyncio.get_running_loop().time() - started, action=action)
+            for merged_job in job.get('merged_jobs', ()):
+                if job.get('error'): merged_job['error'] = job['error']
+                if merged_event := merged_job.get('event'): merged_event.set()
+            if event := job.get('event'):
+                if purge_task := job.get('purge_task'): purge_task.add_done_callback(lambda _: event.set())
+                else: event.set()
 
     async def sync_worker(self):
         log.info("Sync worker started.")
+        last_prune = time.monotonic()
         while True:
-            await asyncio.sleep(SYNC_INTERVAL_SECONDS)
-            if self.db_is_dirty:
-                log.info("Database is dirty, starting sync to Google Drive...");
-                try: await self.gdrive_sync.upload_database(); self.db_is_dirty = False; log.info("Sync to Google Drive successful.")
-                except Exception as e: log.error(f"Failed to sync database to Google Drive: {e}", exc_info=True)
+            try: await asyncio.wait_for(self.sync_stopping.wait(), timeout=SYNC_INTERVAL_SECONDS)
+            except asyncio.TimeoutError: pass
+            else: log.info("Sync worker stopped."); return
+            try: await self.save_payload_hashes()
+            except Exception as e: log.error(f"Failed to save rendered payload hashes: {e}", exc_info=True)
+            if self.journal_sync: last_prune = await storage_maintenance(self.db, self.journal, self.journal_sync, last_prune)
+
+async def run_database_service():
+    """`python main.py db-service`: the single writer of a sharded deployment. Restores, serves and syncs the database."""
+    db_manager, db, store, journal, journal_sync = build_storage()
+    if not await store.authenticate(): log.critical("Google Drive authentication FAILED."); return
+    await journal_sync.restore()
+    service = DatabaseService(db, DB_SERVICE_SOCKET); await service.start()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM): asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    last_prune = time.monotonic()
+    while not stop.is_set():
+        try: await asyncio.wait_for(stop.wait(), timeout=SYNC_INTERVAL_SECONDS)
+        except asyncio.TimeoutError: last_prune = await storage_maintenance(db, journal, journal_sync, last_prune)
+    await service.stop()
+    try: await journal_sync.sync()
+    except Exception as e: log.error(f"Final sync on shutdown failed: {e}", exc_info=True)
+    await asyncio.to_thread(db.shutdown)
+    await asyncio.to_thread(journal_sync.mark_clean_shutdown)
+
+def run_cluster():
+    """`python main.py cluster`: runs the database service and SHARD_COUNT (default 2) shard processes on this machine."""
+    shard_count = SHARD_COUNT or 2
+    env = {**os.environ, 'DB_SERVICE_SOCKET': DB_SERVICE_SOCKET or os.path.abspath('counterbot-db.sock'), 'SHARD_COUNT': str(shard_count)}
+    script = os.path.abspath(__file__)
+    processes = [subprocess.Popen([sys.executable, script, 'db-service'], env=env)]
+    for shard_id in range(shard_count):
+        processes.append(subprocess.Popen([sys.executable, script], env={**env, 'SHARD_ID': str(shard_id), 'KEEP_ALIVE_PORT': str(KEEP_ALIVE_PORT + shard_id)}))
+    log.info(f"Cluster started: database service (pid {processes[0].pid}) and {shard_count} shards.")
+    try:
+        while all(process.poll() is None for process in processes): time.sleep(1)
+        log.critical("A cluster process exited; stopping the cluster.")
+    except KeyboardInterrupt: pass
+    finally:
+        # Shards first, so their final writes reach the service before it syncs and exits.
+        for process in processes[1:] + processes[:1]:
+            if process.poll() is None: process.terminate()
+            try: process.wait(timeout=30)
+            except subprocess.TimeoutExpired: process.kill()
 
 # --- Keep-Alive & Main Execution ---
 app = Flask('')
@@ -147,9 +402,29 @@ app = Flask('')
 def home():
     return "CounterBot is alive!"
 
+@app.route('/health')
+def health():
+    bot = app.config.get('BOT')
+    if bot is None: return jsonify({'status': 'starting'}), 503
+    return jsonify({
+        'status': 'ok' if bot.is_ready() else 'starting', 'version': bot.version, 'startup_timings': bot.startup_timings,
+        'db_queue_depth': bot.db_queue.qsize(), 'loop': bot.loop_watchdog.stats() if bot.loop_watchdog else {'enabled': False}
+    })
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def keep_alive():
-    Thread(target=lambda: app.run(host='0.0.0.0', port=8080)).start()
+    Thread(target=lambda: app.run(host='0.0.0.0', port=KEEP_ALIVE_PORT)).start()
 
 if __name__ == "__main__":
-    if TOKEN and GDRIVE_FOLDER_ID: keep_alive(); bot = CounterBot(); bot.run(TOKEN)
-    else: log.critical("Missing TOKEN or GDRIVE_FOLDER_ID environment variables.")
\ No newline at end of file
+    role = sys.argv[1] if len(sys.argv) > 1 else 'bot'
+    if role == 'cluster': run_cluster()
+    elif role == 'db-service':
+        if DB_SERVICE_SOCKET and (GDRIVE_FOLDER_ID or SYNC_LOCAL_DIR): asyncio.run(run_database_service())
+        else: log.critical("Missing DB_SERVICE_SOCKET or GDRIVE_FOLDER_ID (or SYNC_LOCAL_DIR) environment variables.")
+    elif TOKEN and (DB_SERVICE_SOCKET or GDRIVE_FOLDER_ID or SYNC_LOCAL_DIR):
+        bot = CounterBot(); app.config['BOT'] = bot
+        keep_alive(); bot.run(TOKEN)
+    else: log.critical("Missing TOKEN or GDRIVE_FOLDER_ID (or SYNC_LOCAL_DIR) environment variables.")
\ No newline at end of file
@@ -0,0 +1,61 @@
+# /modules/async_database.py
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.database_manager import DatabaseManager
+
+log = logging.getLogger(__name__)
+
+class AsyncDatabaseManager:
+    """
+    Async facade over DatabaseManager. Every call runs on a dedicated, bounded
+    thread pool sized to match the engine's connection pool, so SQLite I/O and
+    fsyncs never block the event loop. Method names mirror DatabaseManager and
+    are awaited by callers: `await bot.db.get_counters_in_group(...)`.
+    """
+    def __init__(self, db_manager: DatabaseManager, max_workers: int = 4):
+        self.sync = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.sync.close_fast_connections()
+        self.sync.engine.dispose()
+        log.info("Async database executor shut down.")
+
+    async def initialize_database(self): return await self._run(self.sync.initialize_database)
+    async def get_group_version(self, guild_id: int, group_name: str) -> int: return await self._run(self.sync.get_group_version, guild_id, group_name)
+    async def get_group_page(self, guild_id: int, group_name: str, page: int, per_page: int) -> dict: return await self._run(self.sync.get_group_page, guild_id, group_name, page, per_page)
+    async def create_counter(self, guild_id: int, group_name: str, counter_name: str): return await self._run(self.sync.create_counter, guild_id, group_name, counter_name)
+    async def create_counters(self, guild_id: int, group_name: str, counter_names: list[str]) -> dict: return await self._run(self.sync.create_counters, guild_id, group_name, counter_names)
+    async def adjust_counters(self, guild_id: int, group_name: str, deltas: dict[str, int]) -> dict: return await self._run(self.sync.adjust_counters, guild_id, group_name, deltas)
+    async def update_counter(self, guild_id: int, group_name: str, counter_name: str, action: str): return await self._run(self.sync.update_counter, guild_id, group_name, counter_name, action)
+    async def apply_counter_deltas(self, guild_id: int, group_name: str, deltas: dict[str, int], activity: dict[str, list[int]] = None): return await self._run(self.sync.apply_counter_deltas, guild_id, group_name, deltas, activity)
+    async def delete_counter(self, guild_id: int, group_name: str, counter_name: str): return await self._run(self.sync.delete_counter, guild_id, group_name, counter_name)
+    async def delete_group(self, guild_id: int, group_name: str): return await self._run(self.sync.delete_group, guild_id, group_name)
+    async def get_counters_in_group(self, guild_id: int, group_name: str) -> list[dict]: return await self._run(self.sync.get_counters_in_group, guild_id, group_name)
+    async def get_all_groups(self, guild_id: int, group_filter: str = None) -> list[str]: return await self._run(self.sync.get_all_groups, guild_id, group_filter)
+    async def get_counter_names(self, guild_id: int) -> list[tuple[str, str]]: return await self._run(self.sync.get_counter_names, guild_id)
+    async def get_guild_version(self, guild_id: int) -> int: return await self._run(self.sync.get_guild_version, guild_id)
+    async def get_leaderboard(self, guild_id: int, limit: int = 10, group_name: str = None) -> list[dict]: return await self._run(self.sync.get_leaderboard, guild_id, limit, group_name)
+    async def get_group_summary(self, guild_id: int) -> list[dict]: return await self._run(self.sync.get_group_summary, guild_id)
+    async def get_counter_batch(self, guild_id: int, after: list[str] = None, limit: int = 1000) -> list[list]: return await self._run(self.sync.get_counter_batch, guild_id, after, limit)
+    async def import_counters(self, guild_id: int, group_name: str, rows: list[list]) -> int: return await self._run(self.sync.import_counters, guild_id, group_name, rows)
+    async def add_active_view(self, message_id: int, channel_id: int, guild_id: int, group_name: str): return await self._run(self.sync.add_active_view, message_id, channel_id, guild_id, group_name)
+    async def remove_active_view(self, message_id: int): return await self._run(self.sync.remove_active_view, message_id)
+    async def remove_active_views(self, message_ids: list[int]): return await self._run(self.sync.remove_active_views, message_ids)
+    async def prune_history(self) -> int: return await self._run(self.sync.prune_history)
+    async def get_counter_stats(self, guild_id: int, group_name: str, counter_name: str = None) -> dict: return await self._run(self.sync.get_counter_stats, guild_id, group_name, counter_name)
+    async def get_payload_hashes(self) -> dict[int, str]: return await self._run(self.sync.get_payload_hashes)
+    async def save_payload_hashes(self, hashes: list[list]): return await self._run(self.sync.save_payload_hashes, hashes)
+    async def get_views_for_group(self, guild_id: int, group_name: str) -> list[dict]: return await self._run(self.sync.get_views_for_group, guild_id, group_name)
+    async def get_all_active_views(self) -> list[dict]: return await self._run(self.sync.get_all_active_views)
+    async def is_group_empty(self, guild_id: int, group_name: str) -> bool: return await self._run(self.sync.is_group_empty, guild_id, group_name)
+    async def get_meta(self, key: str) -> str | None: return await self._run(self.sync.get_meta, key)
+    async def set_meta(self, key: str, value: str): return await self._run(self.sync.set_meta, key, value)
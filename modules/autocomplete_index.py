@@ -0,0 +1,213 @@
+# /modules/autocomplete_index.py
+
+import time
+import heapq
+import bisect
+import asyncio
+import logging
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+MAX_CHOICES = 25 # Discord's autocomplete limit
+WORD_SEPARATORS = (' ', '-', '_', '.')
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class NameIndex:
+    """
+    Searchable set of names. A sorted list serves prefix lookups by bisection and
+    a trigram inverted index narrows substring and fuzzy candidates, so a query
+    never scans every name once it is three characters or longer.
+    """
+    def __init__(self, names=()):
+        self.names: list[str] = []
+        self._grams: dict[str, set[str]] = {}
+        for name in names: self.add(name)
+
+    def __len__(self): return len(self.names)
+    def __contains__(self, name: str): return self._find(name) is not None
+
+    def _find(self, name: str) -> int | None:
+        i = bisect.bisect_left(self.names, name)
+        return i if i < len(self.names) and self.names[i] == name else None
+
+    def add(self, name: str):
+        if name in self: return
+        bisect.insort(self.names, name)
+        for gram in _trigrams(name): self._grams.setdefault(gram, set()).add(name)
+
+    def remove(self, name: str):
+        if (i := self._find(name)) is None: return
+        del self.names[i]
+        for gram in _trigrams(name):
+            bucket = self._grams.get(gram)
+            if bucket is None: continue
+            bucket.discard(name)
+            if not bucket: del self._grams[gram]
+
+    def _prefixed(self, query: str):
+        i = bisect.bisect_left(self.names, query)
+        while i < len(self.names) and self.names[i].startswith(query): yield self.names[i]; i += 1
+
+    def search(self, query: str, limit: int = MAX_CHOICES) -> list[str]:
+        """Returns up to `limit` names ranked: exact, prefix, word prefix, substring, then fuzzy (shared trigrams)."""
+        query = query.lower().strip()
+        if not query: return self.names[:limit]
+        ranked: dict[str, tuple] = {}
+        for name in self._prefixed(query): ranked[name] = (0 if name == query else 1, len(name), name)
+        if len(ranked) < limit:
+            query_grams = _trigrams(query)
+            if query_grams:
+                shared: dict[str, int] = {}
+                for gram in query_grams:
+                    for name in self._grams.get(gram, ()): shared[name] = shared.get(name, 0) + 1
+                candidates = shared.items()
+            else:
+                # One or two characters: there is no trigram to look up, so fall back to a scan.
+                candidates = ((name, 0) for name in self.names if query in name)
+            for name, overlap in candidates:
+                if name in ranked: continue
+                position = name.find(query)
+                if position > 0 and name[position - 1] in WORD_SEPARATORS: ranked[name] = (2, position, len(name), name)
+                elif position > 0: ranked[name] = (3, position, len(name), name)
+                elif overlap * 2 >= len(query_grams): ranked[name] = (4, -overlap, len(name), name)
+        return [name for *_, name in heapq.nsmallest(limit, ranked.values())]
+
+class GuildIndex:
+    """
+    Group and counter names of one guild. `routes` maps the digests that list buttons carry in place of names
+    too long for a custom_id back to (group, counter or None); `route_digest(group, counter)` picks the names that need one.
+    A (group, None) pair is a group with posted lists but no counters: it is routable, but not offered as a choice.
+    """
+    def __init__(self, pairs, route_digest=None):
+        self.groups = NameIndex()
+        self.counters: dict[str, NameIndex] = {}
+        self.routes: dict[str, tuple[str, str | None]] = {}
+        self.route_digest = route_digest
+        for group_name, counter_name in pairs:
+            if counter_name is None: self._add_route(group_name, None)
+            else: self.add_counter(group_name, counter_name)
+        self.last_used = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.groups) + sum(len(counters) for counters in self.counters.values())
+
+    def _add_route(self, group_name: str, counter_name: str | None):
+        if self.route_digest and (digest := self.route_digest(group_name, counter_name)): self.routes[digest] = (group_name, counter_name)
+
+    def _remove_route(self, group_name: str, counter_name: str | None):
+        if self.route_digest and (digest := self.route_digest(group_name, counter_name)): self.routes.pop(digest, None)
+
+    def add_counter(self, group_name: str, counter_name: str):
+        self.groups.add(group_name)
+        self.counters.setdefault(group_name, NameIndex()).add(counter_name)
+        self._add_route(group_name, None); self._add_route(group_name, counter_name)
+
+    def remove_counter(self, group_name: str, counter_name: str):
+        counters = self.counters.get(group_name)
+        if counter_name not in (counters or ()): return
+        counters.remove(counter_name); self._remove_route(group_name, counter_name)
+        # An emptied group keeps its route: its posted lists stay up until the group itself is deleted.
+        if not counters: del self.counters[group_name]; self.groups.remove(group_name)
+
+    def remove_group(self, group_name: str):
+        for counter_name in self.counters.pop(group_name, NameIndex()).names: self._remove_route(group_name, counter_name)
+        self.groups.remove(group_name); self._remove_route(group_name, None)
+
+class AutocompleteIndex:
+    """
+    Per-guild, in-memory index behind the slash-command autocomplete handlers.
+
+    A guild is loaded from the database on its first keystroke (concurrent
+    keystrokes share one load) and is then kept current by the db_worker, which
+    calls the `on_*` hooks after each committed mutation. A load that overlaps a
+    mutation of the same guild is used for that answer but not kept, so the
+    index never holds names the hook has already moved past. Guilds idle for
+    `idle_seconds` are evicted, and least-recently-used guilds are evicted while
+    the total number of indexed names exceeds `max_names`. With a `route_digest`
+    function, each guild also resolves the name digests of its list buttons.
+    """
+    def __init__(self, max_names: int = 200_000, idle_seconds: float = 900.0, route_digest=None):
+        self.max_names = max_names
+        self.idle_seconds = idle_seconds
+        self.route_digest = route_digest
+        self._guilds: OrderedDict[int, GuildIndex] = OrderedDict()
+        self._loading: dict[int, asyncio.Future] = {}
+        self._mutations: dict[int, int] = {} # guild_id -> mutations seen while its load is in flight
+        self.indexed_names = 0
+        self.hits = 0; self.loads = 0; self.evictions = 0
+
+    async def guild(self, guild_id: int, load) -> GuildIndex:
+        """Returns the guild's index, calling `await load(guild_id)` -> [(group, counter), ...] on a miss."""
+        self._evict_idle()
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            self._guilds.move_to_end(guild_id); index.last_used = time.monotonic(); self.hits += 1
+            return index
+        if guild_id in self._loading: return await asyncio.shield(self._loading[guild_id])
+        future = asyncio.get_running_loop().create_future()
+        self._loading[guild_id] = future
+        mutations = self._mutations.get(guild_id, 0)
+        try:
+            index = GuildIndex(await load(guild_id), self.route_digest); self.loads += 1
+            if self._mutations.get(guild_id, 0) == mutations: self._store(guild_id, index)
+            future.set_result(index)
+            return index
+        except asyncio.CancelledError: future.cancel(); raise
+        except Exception as e:
+            future.set_exception(e); future.exception() # Marks it retrieved when no keystroke is waiting on it.
+            raise
+        finally: del self._loading[guild_id]; self._mutations.pop(guild_id, None)
+
+    async def search_groups(self, guild_id: int, query: str, load) -> list[str]:
+        return (await self.guild(guild_id, load)).groups.search(query)
+
+    async def search_counters(self, guild_id: int, group_name: str, query: str, load) -> list[str]:
+        counters = (await self.guild(guild_id, load)).counters.get(group_name.lower())
+        return counters.search(query) if counters is not None else []
+
+    async def resolve_route(self, guild_id: int, digest: str, load) -> tuple[str, str | None] | None:
+        """The (group, counter or None) a button's name digest stands for, or None if those names are gone."""
+        return (await self.guild(guild_id, load)).routes.get(digest)
+
+    def _store(self, guild_id: int, index: GuildIndex):
+        self._guilds[guild_id] = index; self.indexed_names += index.size
+        while self.indexed_names > self.max_names and len(self._guilds) > 1: self._evict(next(iter(self._guilds)))
+
+    def _evict(self, guild_id: int):
+        index = self._guilds.pop(guild_id); self.indexed_names -= index.size; self.evictions += 1
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._guilds:
+            guild_id, index = next(iter(self._guilds.items()))
+            if index.last_used >= cutoff: break
+            self._evict(guild_id)
+
+    def _mutate(self, guild_id: int, change):
+        if guild_id in self._loading: self._mutations[guild_id] = self._mutations.get(guild_id, 0) + 1
+        index = self._guilds.get(guild_id)
+        if index is None: return
+        before = index.size; change(index); self.indexed_names += index.size - before
+
+    # --- Hooks, called by the db_worker after a successful commit ---
+    def on_counter_created(self, guild_id: int, group_name: str, counter_name: str):
+        self._mutate(guild_id, lambda index: index.add_counter(group_name, counter_name))
+
+    def on_counter_deleted(self, guild_id: int, group_name: str, counter_name: str):
+        self._mutate(guild_id, lambda index: index.remove_counter(group_name, counter_name))
+
+    def on_group_deleted(self, guild_id: int, group_name: str):
+        self._mutate(guild_id, lambda index: index.remove_group(group_name))
+
+    def invalidate(self, guild_id: int = None):
+        """Drops one guild's index (or all of them) after changes made outside this process; the next keystroke reloads it."""
+        for guild_id in ([guild_id] if guild_id is not None else [*self._guilds, *self._loading]):
+            if guild_id in self._loading: self._mutations[guild_id] = self._mutations.get(guild_id, 0) + 1
+            if guild_id in self._guilds: self._evict(guild_id)
+
+    def stats(self) -> dict:
+        return {'guilds': len(self._guilds), 'indexed_names': self.indexed_names, 'hits': self.hits, 'loads': self.loads, 'evictions': self.evictions}
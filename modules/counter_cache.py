@@ -0,0 +1,193 @@
+# /modules/counter_cache.py
+
+import sys
+import math
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+class CacheInconsistencyError(AssertionError):
+    """Raised in verify mode when a cached entry no longer matches the database."""
+
+class CounterCache:
+    """
+    Write-through, group-keyed cache sitting in front of DatabaseManager reads.
+    Entries are evicted least-recently-used once the estimated memory footprint
+    exceeds the configured budget. DatabaseManager updates entries in place after
+    every committed mutation, so a warm cache never needs to go back to SQLite.
+
+    Mutations run inside `write_guard()`. Readers capture `generation` before
+    querying and pass it to `put_*`, which refuses to store a result if a write
+    started or finished in the meantime (or is still in flight), since that
+    result may be stale or may already include a delta the hook will re-apply.
+    """
+    def __init__(self, memory_budget_bytes: int = 8 * 1024 * 1024, verify: bool = False):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.verify = verify
+        self._entries: OrderedDict[tuple, list] = OrderedDict()
+        self._sizes: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self.used_bytes = 0
+        self.generation = 0
+        self._writers = 0
+        self.hits = 0; self.misses = 0; self.evictions = 0
+
+    @staticmethod
+    def _estimate_size(value: list) -> int:
+        size = sys.getsizeof(value)
+        for item in value:
+            if isinstance(item, dict): size += sys.getsizeof(item) + sys.getsizeof(item['name']) + 32
+            else: size += sys.getsizeof(item)
+        return size
+
+    def _get(self, key: tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None: self.misses += 1; return None
+            self._entries.move_to_end(key); self.hits += 1
+            return value
+
+    def _put(self, key: tuple, value: list, generation: int = None):
+        with self._lock:
+            if generation is not None and (generation != self.generation or self._writers): return
+            self._store(key, value)
+            while self.used_bytes > self.memory_budget_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self.used_bytes -= self._sizes.pop(old_key); self.evictions += 1
+
+    def _store(self, key: tuple, value: list):
+        """Inserts or replaces an entry and re-accounts its size. Caller must hold the lock."""
+        self.used_bytes -= self._sizes.get(key, 0)
+        self._entries[key] = value; self._entries.move_to_end(key)
+        self._sizes[key] = self._estimate_size(value); self.used_bytes += self._sizes[key]
+
+    def _drop(self, key: tuple):
+        """Removes an entry if present. Caller must hold the lock."""
+        if key in self._entries:
+            del self._entries[key]; self.used_bytes -= self._sizes.pop(key)
+
+    # --- Reads ---
+    def get_group(self, guild_id: int, group_name: str) -> list[dict] | None:
+        items = self._get(('group', guild_id, group_name))
+        return None if items is None else [dict(item) for item in items]
+
+    def get_group_page(self, guild_id: int, group_name: str, page: int, per_page: int) -> tuple[int, int, list[dict]] | None:
+        """Returns (total, clamped page, items) for one page of a cached group without copying the rest of it."""
+        with self._lock:
+            items = self._entries.get(('group', guild_id, group_name))
+            if items is None: self.misses += 1; return None
+            self._entries.move_to_end(('group', guild_id, group_name)); self.hits += 1
+            page = max(1, min(page, math.ceil(len(items) / per_page) or 1))
+            return len(items), page, [dict(item) for item in items[(page - 1) * per_page:page * per_page]]
+
+    def put_group(self, guild_id: int, group_name: str, items: list[dict], generation: int = None):
+        self._put(('group', guild_id, group_name), [dict(item) for item in items], generation)
+
+    def get_groups(self, guild_id: int) -> list[str] | None:
+        groups = self._get(('groups', guild_id))
+        return None if groups is None else list(groups)
+
+    def put_groups(self, guild_id: int, groups: list[str], generation: int = None):
+        self._put(('groups', guild_id), sorted(groups), generation)
+
+    @contextmanager
+    def write_guard(self):
+        """Wraps a mutation's transaction and its write-through hook."""
+        with self._lock: self.generation += 1; self._writers += 1
+        try: yield
+        finally:
+            with self._lock: self.generation += 1; self._writers -= 1
+
+    # --- Write-through hooks, called by DatabaseManager after a successful commit ---
+    def on_counter_created(self, guild_id: int, group_name: str, counter_name: str, value: int = 0):
+        with self._lock:
+            items = self._entries.get(('group', guild_id, group_name))
+            if items is not None:
+                names = [item['name'] for item in items]
+                items.insert(bisect.bisect_left(names, counter_name), {'name': counter_name, 'value': value})
+                self._store(('group', guild_id, group_name), items)
+            groups = self._entries.get(('groups', guild_id))
+            if groups is not None and group_name not in groups:
+                bisect.insort(groups, group_name); self._store(('groups', guild_id), groups)
+
+    def on_counter_deltas(self, guild_id: int, group_name: str, deltas: dict[str, int]):
+        with self._lock:
+            items = self._entries.get(('group', guild_id, group_name))
+            if items is None: return
+            for item in items:
+                if item['name'] in deltas: item['value'] += deltas[item['name']]
+
+    def on_counter_deleted(self, guild_id: int, group_name: str, counter_name: str):
+        with self._lock:
+            items = self._entries.get(('group', guild_id, group_name))
+            if items is None:
+                # We cannot tell whether the group just became empty, so forget the group list.
+                self._drop(('groups', guild_id)); return
+            items[:] = [item for item in items if item['name'] != counter_name]
+            self._store(('group', guild_id, group_name), items)
+            groups = self._entries.get(('groups', guild_id))
+            if not items and groups is not None and group_name in groups:
+                groups.remove(group_name); self._store(('groups', guild_id), groups)
+
+    def on_group_deleted(self, guild_id: int, group_name: str):
+        with self._lock:
+            self._drop(('group', guild_id, group_name))
+            groups = self._entries.get(('groups', guild_id))
+            if groups is not None and group_name in groups:
+                groups.remove(group_name); self._store(('groups', guild_id), groups)
+
+    def invalidate(self, guild_id: int, group_name: str = None):
+        with self._lock:
+            self.generation += 1
+            if group_name is not None: self._drop(('group', guild_id, group_name))
+            self._drop(('groups', guild_id))
+
+    def check(self, cached, actual, description: str):
+        """Used in verify mode to compare a cache hit against a fresh database read."""
+        if cached != actual:
+            raise CacheInconsistencyError(f"Cache entry for {description} is stale: cached={cached!r} actual={actual!r}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "used_bytes": self.used_bytes, "budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+
+class AggregateCache:
+    """
+    Guild-wide query results (leaderboards, group summaries) tagged with the guild's data
+    version. Mutations never touch these entries: a result is served only while the
+    guild's version still equals the one it was computed at, so any change anywhere in
+    the guild retires it. Bounded to `max_entries`, least-recently-used first.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0
+
+    def get(self, key: tuple, version: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version: self.misses += 1; return None
+            self._entries.move_to_end(key); self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, version: int, value):
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] > version: return # A slower reader must not replace a newer result
+            self._entries[key] = (version, value); self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hits / total, 4) if total else 0.0}
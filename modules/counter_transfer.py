@@ -0,0 +1,167 @@
+# /modules/counter_transfer.py
+
+import io
+import os
+import csv
+import json
+import asyncio
+import logging
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+CSV_HEADER = ['group', 'counter', 'value']
+EXPORT_BATCH_ROWS = 1000
+EXPORT_CHUNK_BYTES = 8 * 1000 * 1000 # Stays under Discord's default upload limit, which counts in MB, with room for the request overhead
+IMPORT_BATCH_ROWS = 500
+MAX_IMPORT_BYTES = 64 * 1024 * 1024
+MAX_NAME_LENGTH = 100 # Longer names could not be offered as autocomplete choices
+MAX_REPORTED_ERRORS = 10
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+SQLITE_INTEGER = range(-2**63, 2**63)
+
+def format_for(filename: str) -> str | None:
+    """The import format implied by a file name, or None if it is not one we read."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+# --- Export ---
+
+async def stream_counters(db, guild_id: int, batch_size: int = EXPORT_BATCH_ROWS):
+    """Yields the guild's counters one keyset batch at a time. Works against the local and the remote database alike."""
+    after = None
+    while batch := await db.get_counter_batch(guild_id, after, batch_size):
+        yield batch
+        after = batch[-1][:2]
+
+class ChunkedExportWriter:
+    """
+    Writes exported rows to numbered files in `directory`, starting a new file before one would
+    grow past `chunk_bytes`. Every CSV chunk carries its own header, so each file can be imported on its own.
+    """
+    def __init__(self, directory: str, base_name: str, fmt: str, chunk_bytes: int = EXPORT_CHUNK_BYTES):
+        if fmt not in FORMATS: raise ValueError(f"Unknown export format '{fmt}'.")
+        self.directory = directory; self.base_name = base_name; self.fmt = fmt; self.chunk_bytes = chunk_bytes
+        self.paths: list[str] = []
+        self.rows = 0
+        self._file = None
+        self._size = 0
+
+    def _encode(self, row: list) -> bytes:
+        if self.fmt == 'jsonl': return (json.dumps(dict(zip(CSV_HEADER, row)), ensure_ascii=False) + '\n').encode()
+        buffer = io.StringIO(); csv.writer(buffer, lineterminator='\n').writerow(row)
+        return buffer.getvalue().encode()
+
+    def _open_chunk(self):
+        if self._file: self._file.close()
+        path = os.path.join(self.directory, f"{self.base_name}-{len(self.paths) + 1}.{self.fmt}")
+        self._file = open(path, 'wb'); self.paths.append(path); self._size = 0
+        if self.fmt == 'csv': self._put(self._encode(CSV_HEADER))
+
+    def _put(self, line: bytes):
+        self._file.write(line); self._size += len(line)
+
+    def write_rows(self, rows: list[list]):
+        for row in rows:
+            line = self._encode(row)
+            if self._file is None or self._size + len(line) > self.chunk_bytes: self._open_chunk()
+            self._put(line); self.rows += 1
+
+    def close(self) -> list[str]:
+        if self._file is None: self._open_chunk() # An empty guild still gets a (header-only) file
+        self._file.close()
+        return self.paths
+
+async def export_counters(db, guild_id: int, directory: str, fmt: str, base_name: str = 'counters') -> tuple[list[str], int]:
+    """Streams the guild's counters into chunk files. Returns the file paths and the number of rows written."""
+    writer = ChunkedExportWriter(directory, base_name, fmt)
+    try:
+        async for batch in stream_counters(db, guild_id): await asyncio.to_thread(writer.write_rows, batch)
+    finally: paths = writer.close()
+    return paths, writer.rows
+
+# --- Import ---
+
+async def download_attachment(url: str, path: str, max_bytes: int = MAX_IMPORT_BYTES):
+    """Streams an attachment to disk in small chunks instead of reading it into memory."""
+    received = 0
+    async with aiohttp.ClientSession() as session, session.get(url) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as file:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                received += len(chunk)
+                if received > max_bytes: raise ValueError(f"The file is larger than {max_bytes // (1024 * 1024)} MB.")
+                await asyncio.to_thread(file.write, chunk)
+
+def clean_row(group, counter, value) -> list:
+    """Validates one imported row and returns it as [group, counter, value]. Raises ValueError with the reason."""
+    names = []
+    for label, name in (('group', group), ('counter', counter)):
+        if not isinstance(name, str) or not name.strip(): raise ValueError(f"missing {label} name")
+        name = name.strip().lower()
+        if len(name) > MAX_NAME_LENGTH: raise ValueError(f"{label} name is longer than {MAX_NAME_LENGTH} characters")
+        names.append(name)
+    if isinstance(value, bool): raise ValueError("value is not a whole number")
+    try: value = int(value.strip()) if isinstance(value, str) else value
+    except ValueError: raise ValueError("value is not a whole number") from None
+    if not isinstance(value, int): raise ValueError("value is not a whole number")
+    if value not in SQLITE_INTEGER: raise ValueError("value is out of range")
+    return [*names, value]
+
+def read_import_rows(path: str, fmt: str):
+    """Yields (line_number, row, error) for every record of the file; exactly one of row and error is set."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        if fmt == 'csv':
+            reader = csv.reader(file)
+            for record in reader:
+                if not record or not any(field.strip() for field in record): continue
+                if reader.line_num == 1 and [field.strip().lower() for field in record] == CSV_HEADER: continue
+                if len(record) != 3: yield reader.line_num, None, f"expected 3 columns, found {len(record)}"; continue
+                try: yield reader.line_num, clean_row(*record), None
+                except ValueError as e: yield reader.line_num, None, str(e)
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip(): continue
+                try: record = json.loads(line)
+                except ValueError: yield line_number, None, "not valid JSON"; continue
+                if not isinstance(record, dict): yield line_number, None, "not a JSON object"; continue
+                try: yield line_number, clean_row(record.get('group'), record.get('counter'), record.get('value')), None
+                except ValueError as e: yield line_number, None, str(e)
+
+def take_valid_rows(records, limit: int, report: dict) -> list[list]:
+    """Pulls up to `limit` valid rows from `records`, counting the invalid ones it passes into `report`."""
+    rows = []
+    for line_number, row, error in records:
+        if error:
+            report['invalid'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS: report['errors'].append(f"line {line_number}: {error}")
+            continue
+        rows.append(row)
+        if len(rows) >= limit: break
+    return rows
+
+def new_import_report() -> dict:
+    return {'imported': 0, 'invalid': 0, 'errors': [], 'groups': set(), 'stopped': None}
+
+async def import_counters(apply_group, path: str, fmt: str, report: dict, batch_rows: int = IMPORT_BATCH_ROWS):
+    """
+    Applies the file's valid rows `batch_rows` at a time, so memory use depends on the batch size, not on the file.
+    Each batch is split by group and handed to `await apply_group(group_name, [[counter, value], ...])`; the groups
+    of one batch are applied concurrently. Progress is kept in `report` (see new_import_report) as it happens, so
+    the caller still knows which groups changed if the import fails halfway. A file that turns out not to be UTF-8
+    stops the import with the reason in `report['stopped']`.
+    """
+    records = read_import_rows(path, fmt)
+    try:
+        while True:
+            try: rows = await asyncio.to_thread(take_valid_rows, records, batch_rows, report)
+            except UnicodeDecodeError: report['stopped'] = "the file is not UTF-8 text"; return
+            if not rows: return
+            by_group: dict[str, list[list]] = {}
+            for group_name, counter_name, value in rows: by_group.setdefault(group_name, []).append([counter_name, value])
+            async def apply(group_name: str, group_rows: list[list]):
+                await apply_group(group_name, group_rows)
+                report['groups'].add(group_name); report['imported'] += len(group_rows)
+            await asyncio.gather(*(apply(group_name, group_rows) for group_name, group_rows in by_group.items()))
+    finally: records.close()
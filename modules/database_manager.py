@@ -1,6 +1,12 @@
 # /modules/database_manager.py
 
+import re
+import math
+import time
 import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
 from sqlalchemy import (
     create_engine,
     Column,
@@ -8,14 +14,41 @@ from sqlalchemy import (
     String,
     BigInteger,
     UniqueConstraint,
-    func
+    PrimaryKeyConstraint,
+    Index,
+    func,
+    update,
+    insert,
+    select,
+    literal_column,
+    exists,
+    tuple_,
+    bindparam,
+    event
 )
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 
+from modules.counter_cache import CounterCache, AggregateCache
+from modules.metrics import DB_TRANSACTION_SECONDS, DB_TRANSACTION_FAILURES
+
 log = logging.getLogger(__name__)
 Base = declarative_base()
 
+# History retention: raw events and minute rollups are short-lived, hour rollups keep the long view.
+ROLLUP_RESOLUTIONS = {'minute': 60, 'hour': 3600}
+HISTORY_RETENTION_SECONDS = {'events': 7 * 86400, 'minute': 2 * 86400, 'hour': 90 * 86400}
+# Applied to every connection, pooled or fast-path. WAL lets reads proceed while the single writer commits, and
+# synchronous=NORMAL only fsyncs at checkpoints: a power loss can drop the newest commits, which the journal replays.
+SQLITE_PRAGMAS = (('journal_mode', 'WAL'), ('synchronous', 'NORMAL'), ('cache_size', -16384), ('mmap_size', 64 * 1024 * 1024), ('temp_store', 'MEMORY'))
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS: cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 class Counter(Base):
     __tablename__ = 'counters'
     id = Column(Integer, primary_key=True)
@@ -23,7 +56,11 @@ class Counter(Base):
     group_name = Column(String, nullable=False)
     counter_name = Column(String, nullable=False)
     value = Column(Integer, nullable=False, default=0)
-    __table_args__ = (UniqueConstraint('guild_id', 'group_name', 'counter_name', name='_guild_group_counter_uc'),)
+    __table_args__ = (
+        UniqueConstraint('guild_id', 'group_name', 'counter_name', name='_guild_group_counter_uc'),
+        Index('ix_counters_guild_value', 'guild_id', 'value'), # Guild leaderboards walk this in value order
+        Index('ix_counters_guild_group_value', 'guild_id', 'group_name', 'value'), # Covers group leaderboards and summaries
+    )
     def __repr__(self): return f"<Counter(guild='{self.guild_id}', group='{self.group_name}', name='{self.counter_name}', value={self.value})>"
 
 class ActiveView(Base):
@@ -34,78 +71,620 @@ class ActiveView(Base):
     group_name = Column(String, nullable=False)
     def __repr__(self): return f"<ActiveView(message_id='{self.message_id}', group_name='{self.group_name}')>"
 
+class GroupVersion(Base):
+    __tablename__ = 'group_versions'
+    guild_id = Column(BigInteger, primary_key=True)
+    group_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    def __repr__(self): return f"<GroupVersion(guild='{self.guild_id}', group='{self.group_name}', version={self.version})>"
+
+class BotMeta(Base):
+    __tablename__ = 'bot_meta'
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    def __repr__(self): return f"<BotMeta(key='{self.key}')>"
+
+class RenderedPayload(Base):
+    __tablename__ = 'rendered_payloads'
+    message_id = Column(BigInteger, primary_key=True)
+    payload_hash = Column(String, nullable=False)
+    def __repr__(self): return f"<RenderedPayload(message_id='{self.message_id}')>"
+
+class CounterEvent(Base):
+    """Append-only log of counter activity. One row per counter per committed batch."""
+    __tablename__ = 'counter_events'
+    id = Column(Integer, primary_key=True)
+    guild_id = Column(BigInteger, nullable=False)
+    group_name = Column(String, nullable=False)
+    counter_name = Column(String, nullable=False)
+    kind = Column(String, nullable=False) # 'adjust', 'delete' or 'import'
+    increments = Column(Integer, nullable=False, default=0)
+    decrements = Column(Integer, nullable=False, default=0)
+    at = Column(BigInteger, nullable=False)
+    __table_args__ = (Index('ix_counter_events_at', 'at'),)
+
+class CounterRollup(Base):
+    """Activity summed per counter into minute and hour buckets. `/counterstats` reads only these."""
+    __tablename__ = 'counter_rollups'
+    guild_id = Column(BigInteger, nullable=False)
+    group_name = Column(String, nullable=False)
+    counter_name = Column(String, nullable=False)
+    resolution = Column(String, nullable=False)
+    bucket_start = Column(BigInteger, nullable=False)
+    increments = Column(Integer, nullable=False, default=0)
+    decrements = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        PrimaryKeyConstraint('guild_id', 'group_name', 'resolution', 'bucket_start', 'counter_name'),
+        Index('ix_counter_rollups_expiry', 'resolution', 'bucket_start'),
+    )
+
+# --- Fast path: the hot statements, built from the ORM tables and compiled to SQL text once ---
+# They run on per-thread sqlite3 connections (see DatabaseManager._execute_fast), skipping Session setup, ORM
+# compilation and the identity map. sqlite3 keeps each connection's prepared statements in its statement cache.
+_NAMED_SQLITE = sqlite_dialect.dialect(paramstyle='named')
+def _compile(stmt, column_keys: list[str] = None) -> str:
+    compiled = stmt.compile(dialect=_NAMED_SQLITE, column_keys=column_keys)
+    unbound = [name for name in re.findall(r':(\w+)', str(compiled)) if not name.startswith('b_') and name not in (column_keys or ())]
+    if unbound: raise ValueError(f"Fast-path statement has parameters without a b_ name: {unbound}") # Constants must be literal_column()
+    return str(compiled)
+
+ONE, ZERO = literal_column('1'), literal_column('0')
+GROUP_CACHE_FILL_LIMIT = 2000 # Larger groups are rendered page by page instead of being cached whole
+
+def _in_group(table):
+    return (table.c.guild_id == bindparam('b_guild')) & (table.c.group_name == bindparam('b_group'))
+
+_counters, _views, _versions, _rollups = Counter.__table__, ActiveView.__table__, GroupVersion.__table__, CounterRollup.__table__
+ROLLUP_UPSERT = sqlite_insert(_rollups)
+ROLLUP_UPSERT = ROLLUP_UPSERT.on_conflict_do_update(
+    index_elements=['guild_id', 'group_name', 'resolution', 'bucket_start', 'counter_name'],
+    set_={'increments': _rollups.c.increments + ROLLUP_UPSERT.excluded.increments, 'decrements': _rollups.c.decrements + ROLLUP_UPSERT.excluded.decrements}
+)
+FAST_SQL = {
+    'increment': _compile(update(_counters).where(_in_group(_counters), _counters.c.counter_name == bindparam('b_name')).values(value=_counters.c.value + bindparam('b_delta'))),
+    'group_count': _compile(select(func.count()).select_from(_counters).where(_in_group(_counters))),
+    'group_page': _compile(select(_counters.c.counter_name, _counters.c.value).where(_in_group(_counters)).order_by(_counters.c.counter_name).limit(bindparam('b_limit')).offset(bindparam('b_offset'))),
+    'group_all': _compile(select(_counters.c.counter_name, _counters.c.value).where(_in_group(_counters)).order_by(_counters.c.counter_name)),
+    'group_exists': _compile(select(exists().where(_in_group(_counters)))),
+    'group_version': _compile(select(_versions.c.version).where(_in_group(_versions))),
+    'bump_version': _compile(sqlite_insert(_versions).values(guild_id=bindparam('b_guild'), group_name=bindparam('b_group'), version=ONE).on_conflict_do_update(index_elements=['guild_id', 'group_name'], set_={'version': _versions.c.version + ONE})),
+    'export_first': _compile(select(_counters.c.group_name, _counters.c.counter_name, _counters.c.value).where(_counters.c.guild_id == bindparam('b_guild')).order_by(_counters.c.group_name, _counters.c.counter_name).limit(bindparam('b_limit')).offset(ZERO)),
+    'export_after': _compile(
+        select(_counters.c.group_name, _counters.c.counter_name, _counters.c.value)
+        .where(_counters.c.guild_id == bindparam('b_guild'), tuple_(_counters.c.group_name, _counters.c.counter_name) > tuple_(bindparam('b_group'), bindparam('b_name')))
+        .order_by(_counters.c.group_name, _counters.c.counter_name).limit(bindparam('b_limit')).offset(ZERO)
+    ),
+    'guild_version': _compile(select(func.coalesce(func.sum(_versions.c.version), ZERO)).where(_versions.c.guild_id == bindparam('b_guild'))),
+    'leaderboard': _compile(
+        select(_counters.c.group_name, _counters.c.counter_name, _counters.c.value).where(_counters.c.guild_id == bindparam('b_guild'))
+        .order_by(_counters.c.value.desc()).limit(bindparam('b_limit')).offset(ZERO)
+    ),
+    'group_leaderboard': _compile(
+        select(_counters.c.group_name, _counters.c.counter_name, _counters.c.value).where(_in_group(_counters))
+        .order_by(_counters.c.value.desc()).limit(bindparam('b_limit')).offset(ZERO)
+    ),
+    'group_summary': _compile(
+        select(_counters.c.group_name, func.count(), func.sum(_counters.c.value), func.min(_counters.c.value), func.max(_counters.c.value))
+        .where(_counters.c.guild_id == bindparam('b_guild')).group_by(_counters.c.group_name).order_by(_counters.c.group_name)
+    ),
+    'views_for_group': _compile(select(_views.c.message_id, _views.c.channel_id, _views.c.guild_id, _views.c.group_name).where(_in_group(_views))),
+    'insert_event': _compile(insert(CounterEvent.__table__), column_keys=['guild_id', 'group_name', 'counter_name', 'kind', 'increments', 'decrements', 'at']),
+    'upsert_rollup': _compile(ROLLUP_UPSERT, column_keys=['guild_id', 'group_name', 'counter_name', 'resolution', 'bucket_start', 'increments', 'decrements']),
+}
+
+def history_rows(guild_id: int, group_name: str, kind: str, activity: dict[str, list[int]], at: int) -> tuple[list[dict], list[dict]]:
+    """Event rows and minute/hour rollup rows for one batch of activity."""
+    events = [
+        {'guild_id': guild_id, 'group_name': group_name, 'counter_name': name, 'kind': kind, 'increments': ups, 'decrements': downs, 'at': at}
+        for name, (ups, downs) in activity.items()
+    ]
+    rollups = [
+        {'guild_id': guild_id, 'group_name': group_name, 'counter_name': name, 'resolution': resolution, 'bucket_start': at - at % seconds, 'increments': ups, 'decrements': downs}
+        for resolution, seconds in ROLLUP_RESOLUTIONS.items() for name, (ups, downs) in activity.items() if ups or downs
+    ]
+    return events, rollups
+
 class DatabaseManager:
-    def __init__(self, db_file_path: str):
-        self.db_file_path = db_file_path; self.engine = create_engine(f'sqlite:///{self.db_file_path}', echo=False); self.Session = sessionmaker(bind=self.engine)
+    def __init__(self, db_file_path: str, cache_budget_bytes: int = 8 * 1024 * 1024, cache_verify: bool = False, pool_size: int = 4, aggregate_cache_entries: int = 1024):
+        self.db_file_path = db_file_path
+        # Bounded pool shared by the async layer's worker threads; the busy timeout lets concurrent writers queue up on SQLite's lock.
+        self.engine = create_engine(f'sqlite:///{self.db_file_path}', echo=False, pool_size=pool_size, max_overflow=0, connect_args={'timeout': 30, 'check_same_thread': False})
+        event.listen(self.engine, 'connect', apply_sqlite_pragmas)
+        self.Session = sessionmaker(bind=self.engine)
+        self.cache = CounterCache(memory_budget_bytes=cache_budget_bytes, verify=cache_verify)
+        self.aggregates = AggregateCache(max_entries=aggregate_cache_entries)
+        self._group_versions: dict[tuple, int] = {}
+        self._versions_lock = threading.Lock()
+        # Serializes mutations with their journal append, so a snapshot always matches an exact journal sequence.
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._fast_connections: list[sqlite3.Connection] = []
+        self._fast_lock = threading.Lock()
+        self.journal = None # MutationJournal, attached by the bot when incremental sync is enabled
         log.info(f"DatabaseManager initialized for file: {db_file_path}")
 
     def initialize_database(self):
-        try: Base.metadata.create_all(self.engine); log.info("Database schema verified.")
+        try:
+            Base.metadata.create_all(self.engine)
+            # create_all skips tables that already exist, so indexes added since a database was created are made here.
+            for index in Counter.__table__.indexes: index.create(self.engine, checkfirst=True)
+            log.info("Database schema verified.")
         except Exception as e: log.critical(f"Failed to initialize database schema: {e}", exc_info=True); raise
 
     def _execute_transaction(self, func):
+        # Transactions are closures defined inside the public method, so the qualname names the method for the metrics.
+        method = func.__qualname__.split('.<locals>')[0].rsplit('.', 1)[-1]
+        started = time.perf_counter()
         session = self.Session()
         try: result = func(session); session.commit(); return result
-        except Exception as e: session.rollback(); log.error(f"Database transaction failed: {e}", exc_info=True); raise
-        finally: session.close()
+        except Exception as e:
+            session.rollback(); DB_TRANSACTION_FAILURES.inc(method=method)
+            log.error(f"Database transaction failed: {e}", exc_info=True); raise
+        finally: session.close(); DB_TRANSACTION_SECONDS.observe(time.perf_counter() - started, method=method)
+
+    def _fast_connection(self) -> sqlite3.Connection:
+        """This thread's persistent connection for the fast path, in autocommit mode so transactions are explicit."""
+        connection = getattr(self._local, 'fast_connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file_path, timeout=30, isolation_level=None, check_same_thread=False, cached_statements=256)
+            apply_sqlite_pragmas(connection)
+            self._local.fast_connection = connection
+            with self._fast_lock: self._fast_connections.append(connection)
+        return connection
+
+    def _execute_fast(self, func, mode: str = 'read'):
+        """
+        Runs `func(connection)` with precompiled FAST_SQL on the thread's persistent sqlite3 connection.
+        `mode` is 'read' (one statement, autocommit), 'snapshot' (several reads, one consistent view)
+        or 'write' (BEGIN IMMEDIATE, so the write lock is taken up front instead of on upgrade).
+        """
+        method = func.__qualname__.split('.<locals>')[0].rsplit('.', 1)[-1]
+        started = time.perf_counter()
+        connection = self._fast_connection()
+        try:
+            if mode != 'read': connection.execute('BEGIN IMMEDIATE' if mode == 'write' else 'BEGIN')
+            result = func(connection)
+            if mode != 'read': connection.execute('COMMIT')
+            return result
+        except Exception as e:
+            if connection.in_transaction: connection.execute('ROLLBACK')
+            DB_TRANSACTION_FAILURES.inc(method=method)
+            log.error(f"Database transaction failed: {e}", exc_info=True); raise
+        finally: DB_TRANSACTION_SECONDS.observe(time.perf_counter() - started, method=method)
+
+    def close_fast_connections(self):
+        with self._fast_lock: connections, self._fast_connections = self._fast_connections, []
+        for connection in connections: connection.close()
+
+    @contextmanager
+    def _mutation(self):
+        with self._write_lock, self.cache.write_guard(): yield
+
+    def _record(self, op: str, **args):
+        """Appends a committed mutation to the journal (skipped while replaying one)."""
+        if self.journal is not None and not getattr(self._local, 'replaying', False): self.journal.append(op, args)
+
+    def apply_journal_record(self, record: dict):
+        """Re-applies a journaled mutation during restore."""
+        handlers = {
+            'create_counter': self.create_counter, 'create_counters': self.create_counters, 'apply_counter_deltas': self.apply_counter_deltas,
+            'delete_counter': self.delete_counter, 'delete_group': self.delete_group,
+            'add_active_view': self.add_active_view, 'remove_active_view': self.remove_active_view,
+            'remove_active_views': self.remove_active_views, 'set_meta': self.set_meta,
+            'save_payload_hashes': self.save_payload_hashes, 'prune_history': self.prune_history,
+            'import_counters': self.import_counters
+        }
+        if record['op'] not in handlers: raise ValueError(f"Unknown journal operation '{record['op']}' at seq {record['seq']}.")
+        self._local.replaying = True
+        try: handlers[record['op']](**record['args'])
+        finally: self._local.replaying = False
+
+    def snapshot_to(self, target_path: str) -> int:
+        """Copies a consistent image of the database with SQLite's online backup API. Returns the journal sequence it covers."""
+        with self._write_lock:
+            seq = self.journal.seq if self.journal is not None else 0
+            source = self.engine.raw_connection()
+            try:
+                target = sqlite3.connect(target_path)
+                try: source.driver_connection.backup(target)
+                finally: target.close()
+            finally: source.close()
+        return seq
+
+    def _bump_group_version(self, session, guild_id: int, group_name: str) -> int:
+        """Increments the group's version inside the caller's transaction. Every mutation of a group calls this."""
+        stmt = sqlite_insert(GroupVersion).values(guild_id=guild_id, group_name=group_name, version=1)
+        session.execute(stmt.on_conflict_do_update(index_elements=['guild_id', 'group_name'], set_={'version': GroupVersion.version + 1}))
+        return session.query(GroupVersion.version).filter_by(guild_id=guild_id, group_name=group_name).scalar()
+
+    def _note_group_version(self, guild_id: int, group_name: str, version: int):
+        # Versions only move forward, so a slow reader can never roll back a newer value written by another thread.
+        with self._versions_lock:
+            key = (guild_id, group_name)
+            self._group_versions[key] = max(self._group_versions.get(key, 0), version or 0)
+
+    def _write_history(self, session, guild_id: int, group_name: str, kind: str, activity: dict[str, list[int]], at: int):
+        """Appends events and folds them into the minute/hour rollups inside the caller's transaction."""
+        if not activity: return
+        events, rollups = history_rows(guild_id, group_name, kind, activity, at)
+        session.connection().execute(insert(CounterEvent.__table__), events)
+        if rollups: session.connection().execute(ROLLUP_UPSERT, rollups)
+
+    def get_group_version(self, guild_id: int, group_name: str) -> int:
+        """Returns the group's current version. Renders carry it so stale edits can be discarded."""
+        key = (guild_id, group_name)
+        if key not in self._group_versions:
+            def query(connection):
+                row = connection.execute(FAST_SQL['group_version'], {'b_guild': guild_id, 'b_group': group_name}).fetchone()
+                return row[0] if row else 0
+            self._note_group_version(guild_id, group_name, self._execute_fast(query))
+        return self._group_versions[key]
+
+    def get_group_page(self, guild_id: int, group_name: str, page: int, per_page: int) -> dict:
+        """
+        Returns one page of a group for a render: {'version', 'page', 'total_pages', 'total', 'items'}.
+        `page` is clamped to the existing pages. A cached group is sliced in memory. On a miss, a group of up to
+        GROUP_CACHE_FILL_LIMIT counters is read whole and cached, so the following renders and clicks are served
+        from memory; a larger one is read a page at a time, with COUNT and LIMIT/OFFSET over the
+        (guild_id, group_name, counter_name) unique index. The version is read first, so it is never newer than the data.
+        """
+        version = self.get_group_version(guild_id, group_name)
+        def query(connection):
+            params = {'b_guild': guild_id, 'b_group': group_name}
+            total = connection.execute(FAST_SQL['group_count'], params).fetchone()[0]
+            if total <= GROUP_CACHE_FILL_LIMIT: return total, None, connection.execute(FAST_SQL['group_all'], params).fetchall()
+            current = max(1, min(page, math.ceil(total / per_page) or 1))
+            return total, current, connection.execute(FAST_SQL['group_page'], {**params, 'b_limit': per_page, 'b_offset': (current - 1) * per_page}).fetchall()
+        cached = None if self.cache.verify else self.cache.get_group_page(guild_id, group_name, page, per_page)
+        if cached is not None: total, current, items = cached
+        else:
+            generation = self.cache.generation
+            total, current, rows = self._execute_fast(query, mode='snapshot')
+            items = [{'name': name, 'value': value} for name, value in rows]
+            if current is None: # The whole group was read: keep it, then slice the page out of it
+                if not self.cache.verify: self.cache.put_group(guild_id, group_name, items, generation=generation)
+                current = max(1, min(page, math.ceil(total / per_page) or 1))
+                items = items[(current - 1) * per_page:current * per_page]
+        return {'version': version, 'page': current, 'total_pages': math.ceil(total / per_page) or 1, 'total': total, 'items': items}
     
     def create_counter(self, guild_id: int, group_name: str, counter_name: str):
         def transaction(session):
             if session.query(Counter).filter_by(guild_id=guild_id, group_name=group_name, counter_name=counter_name).first():
-                return f"A counter named `{counter_name}` already exists in group `{group_name}`."
+                return f"A counter named `{counter_name}` already exists in group `{group_name}`.", None
             session.add(Counter(guild_id=guild_id, group_name=group_name, counter_name=counter_name, value=0))
-        return self._execute_transaction(transaction)
+            return None, self._bump_group_version(session, guild_id, group_name)
+        with self._mutation():
+            error, version = self._execute_transaction(transaction)
+            if not error:
+                self.cache.on_counter_created(guild_id, group_name, counter_name); self._note_group_version(guild_id, group_name, version)
+                self._record('create_counter', guild_id=guild_id, group_name=group_name, counter_name=counter_name)
+        return error
 
-    def update_counter(self, guild_id: int, group_name: str, counter_name: str, action: str):
+    def create_counters(self, guild_id: int, group_name: str, counter_names: list[str]) -> dict:
+        """Creates many counters in one transaction with a multi-row INSERT. Returns {'created': [...], 'duplicates': [...]}."""
+        unique_names = list(dict.fromkeys(counter_names))
         def transaction(session):
-            counter = session.query(Counter).filter_by(guild_id=guild_id, group_name=group_name, counter_name=counter_name).first()
-            if counter:
-                if action == 'inc': counter.value += 1
-                elif action == 'dec': counter.value -= 1
-        self._execute_transaction(transaction)
+            existing = {row[0] for row in session.query(Counter.counter_name).filter(Counter.guild_id == guild_id, Counter.group_name == group_name, Counter.counter_name.in_(unique_names)).all()}
+            created = [name for name in unique_names if name not in existing]
+            if not created: return created, None
+            session.execute(insert(Counter), [{'guild_id': guild_id, 'group_name': group_name, 'counter_name': name, 'value': 0} for name in created])
+            return created, self._bump_group_version(session, guild_id, group_name)
+        with self._mutation():
+            created, version = self._execute_transaction(transaction)
+            if created:
+                for name in created: self.cache.on_counter_created(guild_id, group_name, name)
+                self._note_group_version(guild_id, group_name, version)
+                self._record('create_counters', guild_id=guild_id, group_name=group_name, counter_names=created)
+        # Names repeated in the request count as duplicates too.
+        pending, duplicates = set(created), []
+        for name in counter_names:
+            if name in pending: pending.discard(name)
+            else: duplicates.append(name)
+        return {'created': created, 'duplicates': duplicates}
 
-    def delete_counter(self, guild_id: int, group_name: str, counter_name: str):
+    def adjust_counters(self, guild_id: int, group_name: str, deltas: dict[str, int]) -> dict:
+        """
+        Applies explicit per-counter adjustments in one transaction with a single executemany UPDATE.
+        Returns {'adjusted': {name: new_value}, 'missing': [...]}; unknown counters are reported, not created.
+        """
+        at = int(time.time())
+        def transaction(session):
+            existing = {row[0] for row in session.query(Counter.counter_name).filter(Counter.guild_id == guild_id, Counter.group_name == group_name, Counter.counter_name.in_(list(deltas))).all()}
+            applied = {name: delta for name, delta in deltas.items() if name in existing and delta}
+            if applied:
+                stmt = (update(Counter.__table__)
+                        .where(Counter.guild_id == guild_id, Counter.group_name == group_name, Counter.counter_name == bindparam('b_name'))
+                        .values(value=Counter.value + bindparam('b_delta')))
+                session.connection().execute(stmt, [{'b_name': name, 'b_delta': delta} for name, delta in applied.items()])
+                self._write_history(session, guild_id, group_name, 'adjust', {name: [max(delta, 0), max(-delta, 0)] for name, delta in applied.items()}, at)
+            values = dict(session.query(Counter.counter_name, Counter.value).filter(Counter.guild_id == guild_id, Counter.group_name == group_name, Counter.counter_name.in_(list(existing))).all())
+            return applied, values, self._bump_group_version(session, guild_id, group_name) if applied else None
+        with self._mutation():
+            applied, values, version = self._execute_transaction(transaction)
+            if applied:
+                self._note_group_version(guild_id, group_name, version)
+                self.cache.on_counter_deltas(guild_id, group_name, applied)
+                self._record('apply_counter_deltas', guild_id=guild_id, group_name=group_name, deltas=applied, at=at)
+        return {'adjusted': {name: values[name] for name in deltas if name in values}, 'missing': [name for name in deltas if name not in values]}
+
+    def update_counter(self, guild_id: int, group_name: str, counter_name: str, action: str):
+        delta = {'inc': 1, 'dec': -1}.get(action)
+        if delta: self.apply_counter_deltas(guild_id, group_name, {counter_name: delta})
+
+    def apply_counter_deltas(self, guild_id: int, group_name: str, deltas: dict[str, int], activity: dict[str, list[int]] = None, at: int = None):
+        """
+        Applies a batch of coalesced deltas in one transaction, using SQL-level increments. The batch's
+        history (`activity`: {name: [increments, decrements]}, derived from the deltas if omitted) is
+        written in the same transaction, so the click path gains no extra commit. Counters deleted before
+        the batch ran are skipped: they get no history, and a batch that matched nothing leaves the group version alone.
+        """
+        at = at or int(time.time())
+        if activity is None: activity = {name: [max(delta, 0), max(-delta, 0)] for name, delta in deltas.items() if delta}
+        def transaction(connection):
+            params = {'b_guild': guild_id, 'b_group': group_name}
+            # Names whose clicks cancelled out still run the (no-op) increment; its rowcount tells whether the counter exists.
+            names = [name for name, delta in deltas.items() if delta] + [name for name in activity if not deltas.get(name)]
+            updated = {name for name in names if connection.execute(FAST_SQL['increment'], {**params, 'b_name': name, 'b_delta': deltas.get(name, 0)}).rowcount}
+            if not updated: return updated, None
+            if applied_activity := {name: counts for name, counts in activity.items() if name in updated}:
+                events, rollups = history_rows(guild_id, group_name, 'adjust', applied_activity, at)
+                connection.executemany(FAST_SQL['insert_event'], events)
+                if rollups: connection.executemany(FAST_SQL['upsert_rollup'], rollups)
+            connection.execute(FAST_SQL['bump_version'], params)
+            return updated, connection.execute(FAST_SQL['group_version'], params).fetchone()[0]
+        with self._mutation():
+            updated, version = self._execute_fast(transaction, mode='write')
+            if not updated: return
+            deltas = {name: delta for name, delta in deltas.items() if name in updated}
+            activity = {name: counts for name, counts in activity.items() if name in updated}
+            self._note_group_version(guild_id, group_name, version)
+            self.cache.on_counter_deltas(guild_id, group_name, deltas)
+            self._record('apply_counter_deltas', guild_id=guild_id, group_name=group_name, deltas=deltas, activity=activity, at=at)
+
+    def delete_counter(self, guild_id: int, group_name: str, counter_name: str, at: int = None):
+        at = at or int(time.time())
         def transaction(session):
             counter = session.query(Counter).filter_by(guild_id=guild_id, group_name=group_name, counter_name=counter_name).first()
-            if counter: session.delete(counter)
-        self._execute_transaction(transaction)
+            if counter: session.delete(counter); self._write_history(session, guild_id, group_name, 'delete', {counter_name: [0, 0]}, at)
+            return self._bump_group_version(session, guild_id, group_name)
+        with self._mutation():
+            self._note_group_version(guild_id, group_name, self._execute_transaction(transaction))
+            self.cache.on_counter_deleted(guild_id, group_name, counter_name)
+            self._record('delete_counter', guild_id=guild_id, group_name=group_name, counter_name=counter_name, at=at)
 
-    def delete_group(self, guild_id: int, group_name: str):
+    def delete_group(self, guild_id: int, group_name: str, at: int = None):
+        at = at or int(time.time())
         def transaction(session):
+            names = [row[0] for row in session.query(Counter.counter_name).filter_by(guild_id=guild_id, group_name=group_name).all()]
+            self._write_history(session, guild_id, group_name, 'delete', {name: [0, 0] for name in names}, at)
             session.query(Counter).filter_by(guild_id=guild_id, group_name=group_name).delete()
+            message_ids = [row[0] for row in session.query(ActiveView.message_id).filter_by(guild_id=guild_id, group_name=group_name).all()]
+            if message_ids: session.query(RenderedPayload).filter(RenderedPayload.message_id.in_(message_ids)).delete(synchronize_session=False)
             session.query(ActiveView).filter_by(guild_id=guild_id, group_name=group_name).delete()
             log.info(f"Queued full deletion for group '{group_name}' in guild '{guild_id}'.")
-        self._execute_transaction(transaction)
+            # The version row is kept so a re-created group never reuses an old version number.
+            return self._bump_group_version(session, guild_id, group_name)
+        with self._mutation():
+            self._note_group_version(guild_id, group_name, self._execute_transaction(transaction))
+            self.cache.on_group_deleted(guild_id, group_name)
+            self._record('delete_group', guild_id=guild_id, group_name=group_name, at=at)
 
     def get_counters_in_group(self, guild_id: int, group_name: str) -> list[dict]:
         def query(session):
             counters = session.query(Counter).filter_by(guild_id=guild_id, group_name=group_name).order_by(Counter.counter_name).all()
             return [{'name': c.counter_name, 'value': c.value} for c in counters]
-        return self._execute_transaction(query)
+        cached = self.cache.get_group(guild_id, group_name)
+        if cached is not None:
+            if self.cache.verify: self.cache.check(cached, self._execute_transaction(query), f"group '{group_name}'")
+            return cached
+        generation = self.cache.generation
+        items = self._execute_transaction(query)
+        self.cache.put_group(guild_id, group_name, items, generation=generation)
+        return items
     
     def get_all_groups(self, guild_id: int, group_filter: str = None) -> list[str]:
         def query(session):
-            q = session.query(Counter.group_name).filter_by(guild_id=guild_id)
-            if group_filter: q = q.filter_by(group_name=group_filter)
-            return [row[0] for row in q.distinct().all()]
-        return self._execute_transaction(query)
+            return sorted(row[0] for row in session.query(Counter.group_name).filter_by(guild_id=guild_id).distinct().all())
+        groups = self.cache.get_groups(guild_id)
+        if groups is None:
+            generation = self.cache.generation
+            groups = self._execute_transaction(query); self.cache.put_groups(guild_id, groups, generation=generation)
+        elif self.cache.verify: self.cache.check(groups, self._execute_transaction(query), f"groups of guild '{guild_id}'")
+        if group_filter: return [g for g in groups if g == group_filter]
+        return groups
         
+    def get_guild_version(self, guild_id: int) -> int:
+        """The sum of the guild's group versions. Version rows are never deleted, so it grows with every mutation in the guild."""
+        def query(connection): return connection.execute(FAST_SQL['guild_version'], {'b_guild': guild_id}).fetchone()[0]
+        return self._execute_fast(query)
+
+    def _guild_aggregate(self, guild_id: int, key: tuple, compute):
+        """
+        Serves `compute(connection)` from the aggregate cache while the guild's version is unchanged. On a miss the
+        version and the result are read in one snapshot, so a result is never filed under a version it predates.
+        """
+        cached = self.aggregates.get((guild_id, *key), self.get_guild_version(guild_id))
+        if cached is not None and not self.cache.verify: return cached
+        def query(connection): return connection.execute(FAST_SQL['guild_version'], {'b_guild': guild_id}).fetchone()[0], compute(connection)
+        version, result = self._execute_fast(query, mode='snapshot')
+        if cached is not None: self.cache.check(cached, result, f"{key[0]} of guild '{guild_id}'")
+        self.aggregates.put((guild_id, *key), version, result)
+        return result
+
+    def get_leaderboard(self, guild_id: int, limit: int = 10, group_name: str = None) -> list[dict]:
+        """The guild's (or one group's) highest counters as [{'group', 'name', 'value'}], read in index order."""
+        def compute(connection):
+            if group_name is None: rows = connection.execute(FAST_SQL['leaderboard'], {'b_guild': guild_id, 'b_limit': limit})
+            else: rows = connection.execute(FAST_SQL['group_leaderboard'], {'b_guild': guild_id, 'b_group': group_name, 'b_limit': limit})
+            return [{'group': group, 'name': name, 'value': value} for group, name, value in rows.fetchall()]
+        return self._guild_aggregate(guild_id, ('leaderboard', group_name, limit), compute)
+
+    def get_group_summary(self, guild_id: int) -> list[dict]:
+        """Per-group totals as [{'group', 'counters', 'total', 'min', 'max'}], aggregated in SQL over a covering index."""
+        def compute(connection):
+            rows = connection.execute(FAST_SQL['group_summary'], {'b_guild': guild_id}).fetchall()
+            return [{'group': group, 'counters': count, 'total': total, 'min': low, 'max': high} for group, count, total, low, high in rows]
+        return self._guild_aggregate(guild_id, ('group_summary',), compute)
+
+    def get_counter_names(self, guild_id: int) -> list[tuple[str, str]]:
+        """
+        Every (group_name, counter_name) pair of a guild, plus (group_name, None) for each group with a posted
+        list, for the autocomplete index. The latter keep the lists of groups without counters routable.
+        """
+        def query(session):
+            pairs = [tuple(row) for row in session.query(Counter.group_name, Counter.counter_name).filter_by(guild_id=guild_id).all()]
+            return pairs + [(row[0], None) for row in session.query(ActiveView.group_name).filter_by(guild_id=guild_id).distinct().all()]
+        return self._execute_transaction(query)
+
+    def get_counter_batch(self, guild_id: int, after: list[str] = None, limit: int = 1000) -> list[list]:
+        """
+        The guild's next `limit` counters as [group, counter, value], ordered by (group, counter) and starting
+        after the `after` [group, counter] key. Keyset pagination over the unique index: every batch is one
+        short read, whatever the guild's size, and no transaction stays open between batches.
+        """
+        def query(connection):
+            if after is None: return connection.execute(FAST_SQL['export_first'], {'b_guild': guild_id, 'b_limit': limit}).fetchall()
+            return connection.execute(FAST_SQL['export_after'], {'b_guild': guild_id, 'b_group': after[0], 'b_name': after[1], 'b_limit': limit}).fetchall()
+        return [list(row) for row in self._execute_fast(query)]
+
+    def iter_counters(self, guild_id: int, batch_size: int = 1000):
+        """Yields every counter of the guild as [group, counter, value], holding one batch in memory at a time."""
+        after = None
+        while batch := self.get_counter_batch(guild_id, after, batch_size):
+            yield from batch
+            after = batch[-1][:2]
+
+    def import_counters(self, guild_id: int, group_name: str, rows: list[list], at: int = None) -> int:
+        """
+        Upserts [counter, value] rows of one group in one transaction: missing counters are created and existing
+        ones take the imported value. Every value change is written to the history as an 'import' event, and the
+        group's version is bumped once. Returns the number of rows applied.
+        """
+        at = at or int(time.time())
+        def transaction(session):
+            values = dict(session.query(Counter.counter_name, Counter.value).filter(Counter.guild_id == guild_id, Counter.group_name == group_name, Counter.counter_name.in_({row[0] for row in rows})).all())
+            activity = {}
+            for counter_name, value in rows:
+                previous = values.get(counter_name)
+                if previous != value:
+                    counts, delta = activity.setdefault(counter_name, [0, 0]), value - (previous or 0)
+                    counts[0] += max(delta, 0); counts[1] += max(-delta, 0)
+                values[counter_name] = value
+            stmt = sqlite_insert(Counter.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=['guild_id', 'group_name', 'counter_name'], set_={'value': stmt.excluded.value})
+            session.connection().execute(stmt, [{'guild_id': guild_id, 'group_name': group_name, 'counter_name': counter_name, 'value': value} for counter_name, value in rows])
+            self._write_history(session, guild_id, group_name, 'import', activity, at)
+            return self._bump_group_version(session, guild_id, group_name)
+        if not rows: return 0
+        with self._mutation():
+            version = self._execute_transaction(transaction)
+            self.cache.invalidate(guild_id, group_name); self._note_group_version(guild_id, group_name, version)
+            self._record('import_counters', guild_id=guild_id, group_name=group_name, rows=[list(row) for row in rows], at=at)
+        return len(rows)
+
     def add_active_view(self, message_id: int, channel_id: int, guild_id: int, group_name: str):
         def transaction(session): session.merge(ActiveView(message_id=message_id, channel_id=channel_id, guild_id=guild_id, group_name=group_name))
-        self._execute_transaction(transaction)
+        with self._mutation():
+            self._execute_transaction(transaction)
+            self._record('add_active_view', message_id=message_id, channel_id=channel_id, guild_id=guild_id, group_name=group_name)
 
     def remove_active_view(self, message_id: int):
         def transaction(session):
             view = session.get(ActiveView, message_id)
             if view: session.delete(view)
-        self._execute_transaction(transaction)
+            session.query(RenderedPayload).filter_by(message_id=message_id).delete()
+        with self._mutation():
+            self._execute_transaction(transaction)
+            self._record('remove_active_view', message_id=message_id)
 
-    def get_views_for_group(self, guild_id: int, group_name: str) -> list[dict]:
+    def remove_active_views(self, message_ids: list[int]):
+        """Removes many stale views in a single transaction."""
+        if not message_ids: return
+        def transaction(session):
+            session.query(ActiveView).filter(ActiveView.message_id.in_(message_ids)).delete(synchronize_session=False)
+            session.query(RenderedPayload).filter(RenderedPayload.message_id.in_(message_ids)).delete(synchronize_session=False)
+        with self._mutation():
+            self._execute_transaction(transaction)
+            self._record('remove_active_views', message_ids=list(message_ids))
+
+    def get_meta(self, key: str) -> str | None:
         def query(session):
-            records = session.query(ActiveView).filter_by(guild_id=guild_id, group_name=group_name).all()
-            return [{"message_id": r.message_id, "channel_id": r.channel_id, "guild_id": r.guild_id, "group_name": r.group_name} for r in records]
+            row = session.get(BotMeta, key)
+            return row.value if row else None
         return self._execute_transaction(query)
 
+    def set_meta(self, key: str, value: str):
+        def transaction(session): session.merge(BotMeta(key=key, value=value))
+        with self._mutation():
+            self._execute_transaction(transaction)
+            self._record('set_meta', key=key, value=value)
+
+    def prune_history(self, at: int = None):
+        """Drops events and rollups past their retention. Minute detail expires first; hour rollups keep the long view."""
+        at = at or int(time.time())
+        def transaction(session):
+            removed = session.query(CounterEvent).filter(CounterEvent.at < at - HISTORY_RETENTION_SECONDS['events']).delete(synchronize_session=False)
+            for resolution in ROLLUP_RESOLUTIONS:
+                removed += session.query(CounterRollup).filter(CounterRollup.resolution == resolution, CounterRollup.bucket_start < at - HISTORY_RETENTION_SECONDS[resolution]).delete(synchronize_session=False)
+            return removed
+        with self._mutation():
+            removed = self._execute_transaction(transaction)
+            self._record('prune_history', at=at)
+        if removed: log.info(f"Pruned {removed} expired history rows.")
+        return removed
+
+    def get_counter_stats(self, guild_id: int, group_name: str, counter_name: str = None, at: int = None) -> dict:
+        """
+        Summarizes activity from the rollups only: totals for the last hour (minute buckets) and the
+        last day and week (hour buckets), the busiest hour of the week, and the most active counters.
+        """
+        at = at or int(time.time())
+        windows = {'last_hour': ('minute', 3600), 'last_24h': ('hour', 86400), 'last_7d': ('hour', 7 * 86400)}
+        def query(session):
+            def scoped(*columns):
+                q = session.query(*columns).filter(CounterRollup.guild_id == guild_id, CounterRollup.group_name == group_name)
+                return q.filter(CounterRollup.counter_name == counter_name) if counter_name else q
+            totals = {}
+            for label, (resolution, span) in windows.items():
+                ups, downs = scoped(func.coalesce(func.sum(CounterRollup.increments), 0), func.coalesce(func.sum(CounterRollup.decrements), 0)) \
+                    .filter(CounterRollup.resolution == resolution, CounterRollup.bucket_start > at - span).one()
+                totals[label] = {'increments': ups, 'decrements': downs, 'net': ups - downs}
+            activity = func.sum(CounterRollup.increments + CounterRollup.decrements)
+            peak = scoped(CounterRollup.bucket_start, activity).filter(CounterRollup.resolution == 'hour', CounterRollup.bucket_start > at - 7 * 86400) \
+                .group_by(CounterRollup.bucket_start).order_by(activity.desc()).first()
+            top = [] if counter_name else scoped(CounterRollup.counter_name, func.sum(CounterRollup.increments), func.sum(CounterRollup.decrements)) \
+                .filter(CounterRollup.resolution == 'hour', CounterRollup.bucket_start > at - 86400) \
+                .group_by(CounterRollup.counter_name).order_by(activity.desc()).limit(5).all()
+            return {
+                'windows': totals,
+                'peak_hour': {'bucket_start': peak[0], 'activity': peak[1]} if peak else None,
+                'top_counters': [{'name': name, 'increments': ups, 'decrements': downs} for name, ups, downs in top]
+            }
+        return self._execute_transaction(query)
+
+    def get_payload_hashes(self) -> dict[int, str]:
+        """Hashes of the payloads last sent to each posted message, so unchanged messages are not re-edited after a restart."""
+        def query(session): return dict(session.query(RenderedPayload.message_id, RenderedPayload.payload_hash).all())
+        return self._execute_transaction(query)
+
+    def save_payload_hashes(self, hashes: list[list]):
+        """Upserts [message_id, payload_hash] pairs in one transaction."""
+        if not hashes: return
+        def transaction(session):
+            # Messages removed since the hash was recorded are skipped, so no orphaned rows are left behind.
+            active = {row[0] for row in session.query(ActiveView.message_id).filter(ActiveView.message_id.in_([pair[0] for pair in hashes])).all()}
+            for message_id, payload_hash in hashes:
+                if message_id in active: session.merge(RenderedPayload(message_id=message_id, payload_hash=payload_hash))
+        with self._mutation():
+            self._execute_transaction(transaction)
+            self._record('save_payload_hashes', hashes=[list(pair) for pair in hashes])
+
+    def get_views_for_group(self, guild_id: int, group_name: str) -> list[dict]:
+        def query(connection):
+            rows = connection.execute(FAST_SQL['views_for_group'], {'b_guild': guild_id, 'b_group': group_name}).fetchall()
+            return [{"message_id": message_id, "channel_id": channel_id, "guild_id": guild, "group_name": group} for message_id, channel_id, guild, group in rows]
+        return self._execute_fast(query)
+
     def get_all_active_views(self) -> list[dict]:
         def query(session):
             records = session.query(ActiveView).all()
@@ -122,7 +701,7 @@ class DatabaseManager:
         return self._execute_transaction(query)
 
     def is_group_empty(self, guild_id: int, group_name: str) -> bool:
-        def query(session):
-            count = session.query(func.count(Counter.id)).filter_by(guild_id=guild_id, group_name=group_name).scalar()
-            return count == 0
-        return self._execute_transaction(query)
\ No newline at end of file
+        cached = self.cache.get_group(guild_id, group_name)
+        if cached is not None and not self.cache.verify: return not cached
+        def query(connection): return not connection.execute(FAST_SQL['group_exists'], {'b_guild': guild_id, 'b_group': group_name}).fetchone()[0]
+        return self._execute_fast(query)
\ No newline at end of file
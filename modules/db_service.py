@@ -0,0 +1,224 @@
+# /modules/db_service.py
+
+import os
+import io
+import pickle
+import socket
+import builtins
+import struct
+import asyncio
+import inspect
+import logging
+import itertools
+
+from modules.async_database import AsyncDatabaseManager
+
+log = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I') # Big-endian payload length
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+# Every public coroutine of the async facade can be called remotely; schema setup stays with the service.
+REMOTE_METHODS = frozenset(
+    name for name, member in vars(AsyncDatabaseManager).items()
+    if inspect.iscoroutinefunction(member) and not name.startswith('_') and name != 'initialize_database'
+)
+# Mutations that change what a group's posted messages show. Each success is pushed to the other shards.
+GROUP_MUTATIONS = frozenset({'create_counter', 'create_counters', 'adjust_counters', 'update_counter', 'apply_counter_deltas', 'delete_counter', 'delete_group', 'import_counters'})
+
+# The only globals a frame may reference: built-in exceptions, for error replies. Everything else in a frame is
+# plain data (dicts, lists, tuples, sets, str, bytes, numbers, None), which pickle encodes without any lookup.
+SAFE_GLOBALS = frozenset(name for name, member in vars(builtins).items() if isinstance(member, type) and issubclass(member, BaseException)) | {'set', 'frozenset'}
+
+class FrameUnpickler(pickle.Unpickler):
+    """Refuses every class and function outside SAFE_GLOBALS, so a frame can carry data but never run code."""
+    def find_class(self, module: str, name: str):
+        if module == 'builtins' and name in SAFE_GLOBALS: return getattr(builtins, name)
+        raise pickle.UnpicklingError(f"Frame references the forbidden global '{module}.{name}'.")
+
+def decode_frame(payload: bytes):
+    return FrameUnpickler(io.BytesIO(payload)).load()
+
+async def read_frame(reader: asyncio.StreamReader):
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_BYTES: raise ConnectionError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit.")
+    try: return decode_frame(await reader.readexactly(length))
+    except pickle.UnpicklingError as e: raise ConnectionError(f"Rejected a malformed frame: {e}") from None
+
+def write_frame(writer: asyncio.StreamWriter, message):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(FRAME_HEADER.pack(len(payload)) + payload) # One write per frame, so concurrent replies never interleave
+
+def call_arguments(method: str, args: tuple, kwargs: dict) -> dict:
+    """Binds a remote call's arguments to the facade signature, whether the caller passed them by position or name."""
+    return inspect.signature(getattr(AsyncDatabaseManager, method)).bind(None, *args, **kwargs).arguments
+
+class DatabaseService:
+    """
+    Single-writer database process for sharded deployments.
+
+    Shard processes hold no database of their own. They call the methods of this
+    process's AsyncDatabaseManager over a Unix socket, using length-prefixed
+    pickle frames, and this process owns `counters.db`, the journal and the
+    remote store sync. Requests from one connection are served concurrently. Each
+    shard's JobScheduler already orders the writes of a group. After every
+    successful group mutation, an `invalidate` event with the group's new version
+    is pushed to every other connected shard.
+
+    The socket is bound under a 0077 umask, so it is owner-only from the
+    moment it exists, and all processes must run as the same user. Frames are
+    decoded with FrameUnpickler, which only admits plain data and built-in
+    exceptions. Any other exception is sent back as a RuntimeError carrying
+    its type and message.
+    """
+    def __init__(self, db: AsyncDatabaseManager, socket_path: str):
+        self.db = db
+        self.socket_path = socket_path
+        self._server: asyncio.AbstractServer = None
+        self._clients: set[asyncio.StreamWriter] = set()
+        self.stats = {'calls': 0, 'errors': 0, 'invalidations': 0}
+
+    async def start(self):
+        if os.path.exists(self.socket_path): os.unlink(self.socket_path) # Left behind by a previous run
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o077) # No window in which another user could connect before a chmod
+        try: sock.bind(self.socket_path)
+        finally: os.umask(previous_umask)
+        self._server = await asyncio.start_unix_server(self._serve, sock=sock)
+        log.info(f"Database service listening on {self.socket_path}.")
+
+    async def stop(self):
+        if self._server is None: return
+        self._server.close()
+        for writer in list(self._clients): writer.close()
+        await self._server.wait_closed()
+        if os.path.exists(self.socket_path): os.unlink(self.socket_path)
+        log.info("Database service stopped.")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer); tasks = set()
+        log.info(f"Shard connected to the database service ({len(self._clients)} connected).")
+        try:
+            while True:
+                task = asyncio.create_task(self._handle(await read_frame(reader), writer))
+                tasks.add(task); task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        except Exception as e: log.error(f"Database service connection failed: {e}", exc_info=True)
+        finally:
+            self._clients.discard(writer); writer.close()
+            log.info(f"Shard disconnected from the database service ({len(self._clients)} connected).")
+
+    async def _handle(self, request: dict, writer: asyncio.StreamWriter):
+        method, args, kwargs = request['method'], request.get('args', ()), request.get('kwargs', {})
+        self.stats['calls'] += 1
+        try:
+            if method not in REMOTE_METHODS: raise AttributeError(f"Unknown database method '{method}'.")
+            result = await getattr(self.db, method)(*args, **kwargs)
+            response = {'id': request['id'], 'ok': True, 'result': result}
+        except Exception as e:
+            self.stats['errors'] += 1
+            log.error(f"Remote call '{method}' failed: {e}", exc_info=True)
+            # Shards only accept built-in exceptions; anything else still arrives with its type and message.
+            if type(e).__module__ != 'builtins': e = RuntimeError(f"{type(e).__name__}: {e}")
+            response = {'id': request['id'], 'ok': False, 'error': e}
+        try: write_frame(writer, response)
+        except Exception: # The exception's arguments may not pickle
+            write_frame(writer, {'id': request['id'], 'ok': False, 'error': RuntimeError(f"{type(response.get('error')).__name__}: {response.get('error')}")})
+        if response['ok'] and method in GROUP_MUTATIONS: await self._invalidate(method, call_arguments(method, args, kwargs), origin=writer)
+
+    async def _invalidate(self, method: str, arguments: dict, origin: asyncio.StreamWriter):
+        guild_id, group_name = arguments['guild_id'], arguments['group_name']
+        event = {'event': 'invalidate', 'action': method, 'guild_id': guild_id, 'group_name': group_name, 'version': await self.db.get_group_version(guild_id, group_name)}
+        for writer in list(self._clients):
+            if writer is origin or writer.is_closing(): continue # The originating shard refreshes its own views.
+            write_frame(writer, event); self.stats['invalidations'] += 1
+
+class RemoteDatabaseManager:
+    """
+    Stand-in for AsyncDatabaseManager in shard processes. It exposes the same
+    awaitable methods (`await bot.db.get_group_page(...)`) and forwards them to
+    the DatabaseService. It reconnects on its own after the service restarts.
+    Calls made while disconnected wait up to `call_timeout` for the service
+    to return. Invalidation events go to the callbacks registered with
+    `on_invalidate`. After a reconnect, listeners get a `resync` event instead,
+    because events sent while the shard was disconnected are lost.
+    """
+    def __init__(self, socket_path: str, call_timeout: float = 30.0, reconnect_seconds: float = 1.0):
+        self.socket_path = socket_path
+        self.call_timeout = call_timeout
+        self.reconnect_seconds = reconnect_seconds
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._listeners = []
+        self._writer: asyncio.StreamWriter = None
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task = None
+        self._loop: asyncio.AbstractEventLoop = None
+        self._closing = False
+
+    def on_invalidate(self, callback):
+        self._listeners.append(callback)
+
+    async def connect(self):
+        """Starts the connection loop and waits for the first connection. The service may still be restoring the database."""
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run(), name="db-service-client")
+        await self._connected.wait()
+
+    async def _run(self):
+        connected_before = False; attempts = 0
+        while not self._closing:
+            try: reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                attempts += 1
+                if attempts == 1 or attempts % 30 == 0: log.warning(f"Database service at {self.socket_path} unavailable ({e}); retrying...")
+                await asyncio.sleep(self.reconnect_seconds); continue
+            attempts = 0; self._writer = writer; self._connected.set()
+            log.info(f"Connected to the database service at {self.socket_path}.")
+            if connected_before: self._notify({'event': 'resync'})
+            connected_before = True
+            try:
+                while True: self._dispatch(await read_frame(reader))
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                if not self._closing: log.warning(f"Lost the database service connection: {e!r}")
+            finally:
+                self._connected.clear(); self._writer = None; writer.close()
+                for future in self._pending.values():
+                    if not future.done(): future.set_exception(ConnectionError("Database service connection lost."))
+                self._pending.clear()
+
+    def _dispatch(self, message: dict):
+        if 'event' in message: self._notify(message); return
+        future = self._pending.pop(message['id'], None)
+        if future is None or future.done(): return
+        if message['ok']: future.set_result(message['result'])
+        else: future.set_exception(message['error'])
+
+    def _notify(self, event: dict):
+        for callback in self._listeners:
+            try: callback(event)
+            except Exception as e: log.error(f"Database invalidation listener failed: {e}", exc_info=True)
+
+    async def call(self, method: str, *args, **kwargs):
+        if not self._connected.is_set():
+            try: await asyncio.wait_for(self._connected.wait(), timeout=self.call_timeout)
+            except asyncio.TimeoutError: raise ConnectionError(f"Database service unavailable for {self.call_timeout}s.") from None
+        call_id = next(self._ids)
+        future = self._pending[call_id] = asyncio.get_running_loop().create_future()
+        write_frame(self._writer, {'id': call_id, 'method': method, 'args': args, 'kwargs': kwargs})
+        return await future
+
+    def __getattr__(self, name: str):
+        if name not in REMOTE_METHODS: raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        async def remote(*args, **kwargs): return await self.call(name, *args, **kwargs)
+        remote.__name__ = name
+        return remote
+
+    def shutdown(self):
+        """Closes the connection. Safe to call from any thread, like AsyncDatabaseManager.shutdown."""
+        self._closing = True
+        if self._loop is None or self._loop.is_closed(): return
+        def close():
+            if self._writer: self._writer.close()
+            if self._task: self._task.cancel()
+        self._loop.call_soon_threadsafe(close)
+        log.info("Database service client shut down.")
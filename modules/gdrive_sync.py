@@ -10,6 +10,8 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 from googleapiclient.errors import HttpError
 
+from modules.metrics import SYNC_SECONDS, SYNC_BYTES, SYNC_FAILURES
+
 log = logging.getLogger(__name__)
 
 class GDriveSync:
@@ -23,6 +25,7 @@ class GDriveSync:
         self.gdrive_folder_id = gdrive_folder_id
         self.drive_service = None # This will hold the authenticated service object
         self._file_id_cache = None
+        self._file_ids: dict[str, str] = {} # name -> Drive file ID, trusted until a call returns 404
 
     async def authenticate(self) -> bool:
         """Authenticates with Google using the proven service account method."""
@@ -45,18 +48,8 @@ class GDriveSync:
         return await asyncio.to_thread(blocking_auth)
 
     def _find_remote_file(self):
-        """Finds the database file in Google Drive, caching the ID."""
-        if self._file_id_cache:
-            try:
-                # Test the cache by fetching metadata. If it fails, we'll search again.
-                self.drive_service.files().get(fileId=self._file_id_cache, fields='id').execute()
-                return self._file_id_cache
-            except HttpError as e:
-                if e.resp.status == 404:
-                    log.warning("Cached file ID not found. Searching again.")
-                    self._file_id_cache = None
-                else: raise
-
+        """Finds the database file in Google Drive, caching the ID. A stale ID surfaces as a 404 on use."""
+        if self._file_id_cache: return self._file_id_cache
         query = f"'{self.gdrive_folder_id}' in parents and name = '{self.db_filename}' and trashed = false"
         response = self.drive_service.files().list(q=query, spaces='drive', fields='files(id)').execute()
         files = response.get('files', [])
@@ -88,7 +81,8 @@ class GDriveSync:
             else:
                 log.warning("No database file found on Google Drive. A new one will be created on the first write.")
         
-        await asyncio.to_thread(blocking_download)
+        await self._timed('download_database', blocking_download)
+        if os.path.exists(self.local_db_path): SYNC_BYTES.inc(os.path.getsize(self.local_db_path), direction='download')
 
     async def upload_database(self):
         """Uploads the local database file to Google Drive."""
@@ -110,7 +104,86 @@ class GDriveSync:
                     log.info(f"Updating file ID {file_id} on Google Drive...")
                     self.drive_service.files().update(fileId=file_id, media_body=media).execute()
                     log.info("File updated successfully.")
+            except HttpError as e:
+                if e.resp.status == 404 and file_id:
+                    log.warning("Cached file ID not found. Searching again on the next sync.")
+                    self._file_id_cache = None
+                else: log.error(f"FAILED to upload DB: {e}", exc_info=True)
             except Exception as e:
                 log.error(f"FAILED to upload DB: {e}", exc_info=True)
 
-        await asyncio.to_thread(blocking_upload)
\ No newline at end of file
+        await self._timed('upload_database', blocking_upload)
+        SYNC_BYTES.inc(os.path.getsize(self.local_db_path), direction='upload')
+
+    async def _timed(self, operation: str, func, *args):
+        """Runs a blocking Drive call off the event loop, recording its duration and failures."""
+        started = asyncio.get_running_loop().time()
+        try: return await asyncio.to_thread(func, *args)
+        except Exception: SYNC_FAILURES.inc(operation=operation); raise
+        finally: SYNC_SECONDS.observe(asyncio.get_running_loop().time() - started, operation=operation)
+
+    # --- File-level store API used by the incremental JournalSync ---
+    def _find_file_id(self, name: str):
+        if name in self._file_ids: return self._file_ids[name]
+        query = f"'{self.gdrive_folder_id}' in parents and name = '{name}' and trashed = false"
+        files = self.drive_service.files().list(q=query, spaces='drive', fields='files(id)').execute().get('files', [])
+        if files: self._file_ids[name] = files[0].get('id')
+        return self._file_ids.get(name)
+
+    def _with_file_id(self, name: str, call):
+        """Runs `call(file_id)` with the cached ID, re-resolving once if Drive reports it gone."""
+        try: return call(self._find_file_id(name))
+        except HttpError as e:
+            if e.resp.status != 404 or name not in self._file_ids: raise
+            log.warning(f"Cached file ID for '{name}' not found. Searching again.")
+            del self._file_ids[name]
+            return call(self._find_file_id(name))
+
+    async def list_files(self) -> list[dict]:
+        """Lists every file in the sync folder as {'id', 'name'} dicts."""
+        def blocking_list():
+            files, page_token = [], None
+            query = f"'{self.gdrive_folder_id}' in parents and trashed = false"
+            while True:
+                response = self.drive_service.files().list(q=query, spaces='drive', fields='nextPageToken, files(id, name, appProperties)', pageToken=page_token).execute()
+                for f in response.get('files', []):
+                    self._file_ids[f['name']] = f['id']
+                    files.append({'id': f['id'], 'name': f['name'], 'properties': f.get('appProperties', {})})
+                page_token = response.get('nextPageToken')
+                if not page_token: return files
+        return await self._timed('list_files', blocking_list)
+
+    async def upload_file(self, local_path: str, name: str, properties: dict = None):
+        """Uploads a file into the sync folder, replacing any existing file with the same name. `properties` go to appProperties."""
+        def upload(file_id):
+            media = MediaFileUpload(local_path, mimetype='application/octet-stream', resumable=False)
+            body = {'appProperties': properties} if properties else None
+            if file_id: self.drive_service.files().update(fileId=file_id, body=body, media_body=media).execute()
+            else:
+                created = self.drive_service.files().create(body={'name': name, 'parents': [self.gdrive_folder_id], **(body or {})}, media_body=media, fields='id').execute()
+                self._file_ids[name] = created.get('id')
+        await self._timed('upload_file', self._with_file_id, name, upload)
+        SYNC_BYTES.inc(os.path.getsize(local_path), direction='upload')
+
+    async def download_file(self, name: str, local_path: str):
+        def download(file_id):
+            if not file_id: raise FileNotFoundError(f"'{name}' not found on Google Drive.")
+            with io.FileIO(local_path, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, self.drive_service.files().get_media(fileId=file_id))
+                done = False
+                while not done: _, done = downloader.next_chunk()
+        await self._timed('download_file', self._with_file_id, name, download)
+        SYNC_BYTES.inc(os.path.getsize(local_path), direction='download')
+
+    async def rename_file(self, name: str, new_name: str):
+        """Metadata-only rename; no content is transferred."""
+        def rename(file_id):
+            if not file_id: raise FileNotFoundError(f"'{name}' not found on Google Drive.")
+            self.drive_service.files().update(fileId=file_id, body={'name': new_name}).execute()
+            self._file_ids.pop(name, None); self._file_ids[new_name] = file_id
+        await self._timed('rename_file', self._with_file_id, name, rename)
+
+    async def delete_file(self, name: str):
+        def delete(file_id):
+            if file_id: self.drive_service.files().delete(fileId=file_id).execute(); self._file_ids.pop(name, None)
+        await self._timed('delete_file', self._with_file_id, name, delete)
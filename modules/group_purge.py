@@ -0,0 +1,70 @@
+# /modules/group_purge.py
+
+import time
+import asyncio
+import logging
+import discord
+from datetime import datetime, timedelta, timezone
+
+log = logging.getLogger(__name__)
+
+BULK_DELETE_LIMIT = 100 # Discord's maximum per bulk-delete request
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=10) # Bulk delete rejects older messages; keep a safety margin
+MAX_REPORTED_ERRORS = 5
+
+class GroupPurger:
+    """
+    Deletes the posted messages of a group without fetching any of them.
+
+    Message IDs are grouped per channel. Messages young enough for Discord's bulk
+    delete are removed 100 per request, and the rest are deleted one by one through
+    partial messages. Channels are purged concurrently, bounded by `concurrency`.
+    Messages that are already gone count as `missing`, not as failures. Every
+    other error is collected into the returned summary, so the caller can report it.
+    """
+    def __init__(self, bot, concurrency: int = 4):
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def purge(self, records: list[dict]) -> dict:
+        summary = {'messages': len(records), 'deleted': 0, 'missing': 0, 'failed': 0, 'errors': [], 'elapsed': 0.0}
+        by_channel: dict[int, list[int]] = {}
+        for record in records: by_channel.setdefault(record['channel_id'], []).append(record['message_id'])
+        started = time.perf_counter()
+        await asyncio.gather(*(self._purge_channel(channel_id, message_ids, summary) for channel_id, message_ids in by_channel.items()))
+        summary['elapsed'] = round(time.perf_counter() - started, 2)
+        return summary
+
+    def _fail(self, summary: dict, count: int, channel_id: int, error: Exception):
+        summary['failed'] += count
+        if len(summary['errors']) < MAX_REPORTED_ERRORS: summary['errors'].append(f"channel {channel_id}: {error}")
+
+    async def _purge_channel(self, channel_id: int, message_ids: list[int], summary: dict):
+        async with self._semaphore:
+            channel = self.bot.get_channel(channel_id) or self.bot.get_partial_messageable(channel_id)
+            cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+            recent = [m for m in message_ids if discord.utils.snowflake_time(m) > cutoff]
+            singles = [m for m in message_ids if discord.utils.snowflake_time(m) <= cutoff]
+            if len(recent) >= 2 and hasattr(channel, 'delete_messages'):
+                for i in range(0, len(recent), BULK_DELETE_LIMIT):
+                    chunk = recent[i:i + BULK_DELETE_LIMIT]
+                    try:
+                        await channel.delete_messages([discord.Object(id=m) for m in chunk], reason="Counter group deleted")
+                        summary['deleted'] += len(chunk) # Bulk delete silently skips IDs that no longer exist.
+                    except discord.Forbidden:
+                        # Bulk delete needs Manage Messages; the bot can always delete its own messages one by one.
+                        singles.extend(recent[i:]); break
+                    except discord.HTTPException as e:
+                        log.warning(f"Bulk delete in channel {channel_id} failed ({e}); deleting individually.")
+                        singles.extend(chunk)
+            else: singles.extend(recent)
+            for message_id in singles:
+                try: await channel.get_partial_message(message_id).delete(); summary['deleted'] += 1
+                except discord.NotFound: summary['missing'] += 1
+                except discord.HTTPException as e: self._fail(summary, 1, channel_id, e)
+                except Exception as e: self._fail(summary, 1, channel_id, e); log.error(f"Failed to delete message {message_id}: {e}", exc_info=True)
+
+def describe_purge_failures(job: dict) -> str:
+    """User-facing suffix for a finished delete_group job whose message purge partly failed."""
+    failed = job.get('purge', {}).get('failed', 0)
+    return f"\n⚠️ {failed} posted message(s) could not be deleted from Discord and must be removed manually." if failed else ""
@@ -0,0 +1,64 @@
+# /modules/local_sync.py
+
+import os
+import json
+import shutil
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+class LocalDirectorySync:
+    """
+    Drop-in stand-in for GDriveSync that keeps the remote copies in a local
+    directory. Used for development, tests and single-box deployments. File
+    properties (Drive's appProperties) live in a `<name>.meta.json` sidecar.
+    """
+    def __init__(self, local_db_path: str, remote_dir: str):
+        self.local_db_path = local_db_path
+        self.db_filename = os.path.basename(local_db_path)
+        self.remote_dir = remote_dir
+
+    async def authenticate(self) -> bool:
+        os.makedirs(self.remote_dir, exist_ok=True)
+        log.info(f"✅ Using local directory '{self.remote_dir}' as the sync store.")
+        return True
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.remote_dir, name)
+
+    def _read_properties(self, name: str) -> dict:
+        try:
+            with open(self._path(name) + '.meta.json', encoding='utf-8') as f: return json.load(f)
+        except FileNotFoundError: return {}
+
+    async def download_database(self):
+        if os.path.exists(self._path(self.db_filename)): await self.download_file(self.db_filename, self.local_db_path)
+        else: log.warning("No database file found in the sync directory. A new one will be created on the first write.")
+
+    async def upload_database(self):
+        await self.upload_file(self.local_db_path, self.db_filename)
+
+    async def list_files(self) -> list[dict]:
+        names = [n for n in sorted(os.listdir(self.remote_dir)) if not n.endswith(('.tmp', '.meta.json'))]
+        return [{'id': name, 'name': name, 'properties': self._read_properties(name)} for name in names]
+
+    async def upload_file(self, local_path: str, name: str, properties: dict = None):
+        def blocking_copy():
+            # Copy then rename, so a reader never sees a half-written file.
+            shutil.copyfile(local_path, self._path(name) + '.tmp'); os.replace(self._path(name) + '.tmp', self._path(name))
+            if properties:
+                with open(self._path(name) + '.meta.json', 'w', encoding='utf-8') as f: json.dump(properties, f)
+        await asyncio.to_thread(blocking_copy)
+
+    async def rename_file(self, name: str, new_name: str):
+        os.replace(self._path(name), self._path(new_name))
+        if os.path.exists(self._path(name) + '.meta.json'): os.replace(self._path(name) + '.meta.json', self._path(new_name) + '.meta.json')
+
+    async def download_file(self, name: str, local_path: str):
+        if not os.path.exists(self._path(name)): raise FileNotFoundError(f"'{name}' not found in '{self.remote_dir}'.")
+        await asyncio.to_thread(shutil.copyfile, self._path(name), local_path)
+
+    async def delete_file(self, name: str):
+        for path in (self._path(name), self._path(name) + '.meta.json'):
+            if os.path.exists(path): await asyncio.to_thread(os.remove, path)
@@ -0,0 +1,85 @@
+# /modules/loop_watchdog.py
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+
+from modules.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+log = logging.getLogger(__name__)
+
+class LoopWatchdog:
+    """
+    Opt-in event-loop stall detector.
+
+    A heartbeat task sleeps for `interval_seconds` in a loop; how late each wake-up
+    is (the loop lag) is recorded for percentiles. A separate monitor thread
+    watches the heartbeat: once it is more than `threshold_seconds` overdue, the
+    loop is blocked right now, so the monitor grabs the loop thread's current
+    stack with `sys._current_frames()` and logs it. The logged stack names the
+    blocking call (a synchronous DatabaseManager method, an `input()` prompt, ...)
+    while it is still running. Each stall is reported once.
+    """
+    def __init__(self, threshold_seconds: float = 0.25, interval_seconds: float = 0.05, sample_size: int = 2048, stack_limit: int = 25):
+        self.threshold_seconds = threshold_seconds
+        self.interval_seconds = interval_seconds
+        self.stack_limit = stack_limit
+        self._samples: deque[float] = deque(maxlen=sample_size)
+        self._last_beat = 0.0
+        self._reported_beat = None
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_stall: dict | None = None
+
+    def start(self):
+        """Starts watching the running loop. Must be called from the loop's thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="loop-watchdog")
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+        log.info(f"Event loop watchdog started (threshold {self.threshold_seconds * 1000:.0f}ms).")
+
+    def stop(self):
+        self._stop.set()
+        if self._task: self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            now = time.monotonic(); lag = max(0.0, now - expected)
+            self._last_beat = now
+            self._samples.append(lag); self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _monitor(self):
+        while not self._stop.wait(self.interval_seconds):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval_seconds
+            if overdue < self.threshold_seconds or self._reported_beat == beat: continue
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame, limit=self.stack_limit)) if frame else '<loop thread not found>'
+            self.stalls += 1; LOOP_STALLS.inc()
+            self.last_stall = {'at': time.time(), 'overdue_ms': round(overdue * 1000, 1), 'stack': stack}
+            log.warning(f"[Loop Watchdog] Event loop blocked for {overdue * 1000:.0f}ms+. Loop thread stack:\n{stack}")
+
+    def percentiles(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples: return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+        pick = lambda fraction: round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 2)
+        return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+    def stats(self) -> dict:
+        return {
+            'enabled': True, 'threshold_ms': self.threshold_seconds * 1000, 'samples': len(self._samples), **self.percentiles(),
+            'max_ms': round(self.max_lag * 1000, 2), 'stalls': self.stalls,
+            'last_stall': {k: v for k, v in self.last_stall.items() if k != 'stack'} if self.last_stall else None
+        }
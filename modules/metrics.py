@@ -0,0 +1,157 @@
+# /modules/metrics.py
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    kind = ''
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names): raise ValueError(f"Metric '{self.name}' expects labels {self.label_names}, got {tuple(labels)}.")
+        return tuple(labels[name] for name in self.label_names)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonically increasing value, per label combination."""
+    kind = 'counter'
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock: values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in values]
+
+class Gauge(_Metric):
+    """Value read at scrape time from `func`, which returns a number or a {label value(s): number} dict."""
+    kind = 'gauge'
+    def __init__(self, name: str, documentation: str, func, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self.func = func
+
+    def collect(self) -> list[str]:
+        result = self.func()
+        if not isinstance(result, dict): result = {(): result}
+        lines = self.header()
+        for key, v in result.items():
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}")
+        return lines
+
+class Histogram(_Metric):
+    """Cumulative-bucket distribution of observed values, per label combination."""
+    kind = 'histogram'
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {} # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None: series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1; series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def collect(self) -> list[str]:
+        with self._lock: snapshot = [(key, list(series)) for key, series in self._series.items()]
+        lines = self.header()
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += hits
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Dependency-free stand-in for a Prometheus client registry. Recording is a
+    dict update under a per-metric lock, cheap enough to leave on in production;
+    formatting only happens when `/metrics` is scraped.
+    """
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics: raise ValueError(f"Metric '{metric.name}' is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter: return self.register(Counter(name, documentation, labels))
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram: return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, func, labels: tuple = ()) -> Gauge:
+        """Registers a gauge, replacing one of the same name (gauges are bound to live objects, e.g. a new bot instance)."""
+        with self._lock: self._metrics.pop(name, None)
+        return self.register(Gauge(name, documentation, func, labels))
+
+    def exposition(self) -> str:
+        """Renders every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock: metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try: lines.extend(metric.collect())
+            except Exception as e: lines.append(f"# {metric.name} collection failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# --- Metrics recorded by the instrumented modules ---
+JOB_SECONDS = REGISTRY.histogram('counterbot_job_seconds', "Time the db_worker spent on a job, by action.", labels=('action',))
+JOBS_TOTAL = REGISTRY.counter('counterbot_jobs_total', "Jobs processed by the db_worker, by action and outcome.", labels=('action', 'outcome'))
+DB_TRANSACTION_SECONDS = REGISTRY.histogram('counterbot_db_transaction_seconds', "SQLite transaction time, by DatabaseManager method.", labels=('method',))
+DB_TRANSACTION_FAILURES = REGISTRY.counter('counterbot_db_transaction_failures_total', "Rolled-back SQLite transactions, by DatabaseManager method.", labels=('method',))
+SYNC_SECONDS = REGISTRY.histogram('counterbot_sync_seconds', "Remote store transfer time, by operation.", labels=('operation',), buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+SYNC_BYTES = REGISTRY.counter('counterbot_sync_bytes_total', "Bytes transferred to or from the remote store.", labels=('direction',))
+SYNC_FAILURES = REGISTRY.counter('counterbot_sync_failures_total', "Failed remote store operations, by operation.", labels=('operation',))
+RENDER_SECONDS = REGISTRY.histogram('counterbot_render_seconds', "Time to rebuild a counter list view from the database.")
+MESSAGE_EDITS = REGISTRY.counter('counterbot_message_edits_total', "Counter list message edits, by outcome.", labels=('outcome',))
+LOOP_LAG_SECONDS = REGISTRY.histogram('counterbot_loop_lag_seconds', "Event loop wake-up lag measured by the watchdog heartbeat.")
+ADMISSION_DECISIONS = REGISTRY.counter('counterbot_admission_decisions_total', "Admission decisions for clicks and queued work (admitted, shed_*, merged_*, refresh_deduplicated).", labels=('decision',))
+LOOP_STALLS = REGISTRY.counter('counterbot_loop_stalls_total', "Event loop stalls longer than the watchdog threshold.")
@@ -0,0 +1,57 @@
+# /modules/render_cache.py
+
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+PAYLOAD_FORMAT = 2 # Bump when the components' layout or custom_ids change, so every posted message is re-edited once.
+
+def payload_hash(content: str, page: int, total_pages: int, items: list[dict], locked: bool) -> str:
+    """Fingerprint of everything a counter list message shows. Equal hashes mean an edit would change nothing."""
+    payload = json.dumps([PAYLOAD_FORMAT, content, page, total_pages, [(item['name'], item['value']) for item in items], locked], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RenderCache:
+    """
+    Rendered counter list pages keyed by (guild_id, group_name, version, page, locked).
+
+    Group versions are bumped by every mutation, so an entry never needs to be
+    invalidated. A newer version simply gets a new key, and the entries of older
+    versions of the same group are dropped as soon as it is stored. All messages
+    of a group share one render per version instead of each querying the database.
+    """
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._group_keys: dict[tuple, set[tuple]] = {} # (guild_id, group_name) -> keys stored for it
+        self._latest: dict[tuple, int] = {} # (guild_id, group_name) -> newest version stored
+        self.hits = 0; self.misses = 0
+
+    def get(self, guild_id: int, group_name: str, version: int, page: int, locked: bool) -> dict | None:
+        key = (guild_id, group_name, version, page, locked)
+        rendered = self._entries.get(key)
+        if rendered is None: self.misses += 1; return None
+        self._entries.move_to_end(key); self.hits += 1
+        return rendered
+
+    def put(self, guild_id: int, group_name: str, version: int, page: int, locked: bool, rendered: dict):
+        group = (guild_id, group_name)
+        if version < self._latest.get(group, 0): return
+        if version > self._latest.get(group, 0):
+            for key in [k for k in self._group_keys.get(group, ()) if k[2] < version]: self._drop(key)
+            self._latest[group] = version
+        key = (guild_id, group_name, version, page, locked)
+        self._entries[key] = rendered; self._entries.move_to_end(key)
+        self._group_keys.setdefault(group, set()).add(key)
+        while len(self._entries) > self.max_entries: self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: tuple):
+        del self._entries[key]
+        keys = self._group_keys[key[:2]]; keys.discard(key)
+        if not keys: del self._group_keys[key[:2]]; self._latest.pop(key[:2], None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'hit_ratio': round(self.hits / total, 4) if total else 0.0}
@@ -0,0 +1,94 @@
+# /modules/render_scheduler.py
+
+import asyncio
+import logging
+import discord
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+class RateLimitLogCounter(logging.Handler):
+    """Counts the 429 responses discord.py handles internally, which it only reports through its logger."""
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        message = str(record.msg)
+        if message.startswith('We are being rate limited') or message.startswith('Global rate limit'): self.count += 1
+
+class RenderScheduler:
+    """
+    Debounced, rate-limit-aware scheduler for counter list message edits.
+
+    Pending edits are kept per channel (Discord buckets message edits per channel)
+    and collapsed per message so only the latest requested state is ever sent.
+    Channels drain concurrently, bounded by `max_concurrent_edits`. Locked
+    ("Processing...") edits are held back for `transient_delay_seconds`; if the
+    final unlocked state is requested in the meantime, the transient edit is skipped.
+    """
+    def __init__(self, edit_func, max_concurrent_edits: int = 8, transient_delay_seconds: float = 0.3):
+        self.edit_func = edit_func  # async edit_func(record: dict, locked: bool)
+        self.transient_delay_seconds = transient_delay_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent_edits)
+        self._pending: dict[int, OrderedDict] = {}
+        self._active_channels: set[int] = set()
+        self.rate_limit_counter = RateLimitLogCounter()
+        logging.getLogger('discord.http').addHandler(self.rate_limit_counter)
+        self.edits_sent = 0; self.edits_collapsed = 0; self.transient_skipped = 0; self.edits_failed = 0; self.rate_limited = 0
+
+    def schedule(self, record: dict, locked: bool = False):
+        """Requests that the message in `record` be re-rendered in the given state."""
+        channel_id, message_id = record['channel_id'], record['message_id']
+        pending = self._pending.setdefault(channel_id, OrderedDict())
+        if message_id in pending:
+            self.edits_collapsed += 1
+            if pending[message_id][1] and not locked: self.transient_skipped += 1
+        ready_at = asyncio.get_running_loop().time() + self.transient_delay_seconds if locked else 0.0
+        pending[message_id] = (record, locked, ready_at)
+        if channel_id not in self._active_channels:
+            self._active_channels.add(channel_id)
+            asyncio.create_task(self._drain(channel_id))
+
+    async def _drain(self, channel_id: int):
+        loop = asyncio.get_running_loop()
+        try:
+            while pending := self._pending.get(channel_id):
+                message_id, (record, locked, ready_at) = next(iter(pending.items()))
+                if ready_at > loop.time():
+                    # Give the final state a chance to supersede this transient edit.
+                    await asyncio.sleep(ready_at - loop.time()); continue
+                del pending[message_id]
+                async with self._semaphore:
+                    try:
+                        await self.edit_func(record, locked); self.edits_sent += 1
+                    except discord.RateLimited as e:
+                        self.rate_limited += 1; pending.setdefault(message_id, (record, locked, 0.0))
+                        await asyncio.sleep(e.retry_after)
+                    except discord.HTTPException as e:
+                        if e.status == 429:
+                            self.rate_limited += 1; pending.setdefault(message_id, (record, locked, 0.0))
+                            await asyncio.sleep(1.0)
+                        else: self.edits_failed += 1; log.error(f"Failed to edit message {message_id}: {e}")
+                    except Exception as e: self.edits_failed += 1; log.error(f"Failed to edit message {message_id}: {e}", exc_info=True)
+        finally:
+            self._active_channels.discard(channel_id)
+            if not self._pending.get(channel_id): self._pending.pop(channel_id, None)
+
+    def cancel_group(self, guild_id: int, group_name: str) -> int:
+        """Drops every pending edit of a group's messages, e.g. before they are deleted. Returns how many were dropped."""
+        dropped = 0
+        for pending in self._pending.values():
+            for message_id in [m for m, (record, _, _) in pending.items() if record['guild_id'] == guild_id and record['group_name'] == group_name]:
+                del pending[message_id]; dropped += 1
+        return dropped
+
+    def backlog(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self.backlog(), "active_channels": len(self._active_channels),
+            "edits_sent": self.edits_sent, "edits_collapsed": self.edits_collapsed, "transient_skipped": self.transient_skipped,
+            "edits_failed": self.edits_failed, "rate_limited": self.rate_limited, "http_429s": self.rate_limit_counter.count
+        }
@@ -0,0 +1,54 @@
+# /modules/startup.py
+
+import time
+import json
+import asyncio
+import hashlib
+import logging
+
+log = logging.getLogger(__name__)
+
+class StartupError(RuntimeError):
+    """Raised by a startup phase that cannot continue (e.g. failed authentication)."""
+
+class StartupOrchestrator:
+    """
+    Runs startup phases as a dependency graph: every phase starts as soon as the
+    phases it depends on have finished, so independent work overlaps. Per-phase
+    wall-clock timings are recorded and logged so cold-start regressions show up.
+    """
+    def __init__(self):
+        self._phases: dict[str, tuple] = {}
+        self.timings: dict[str, float] = {}
+
+    def add(self, name: str, func, depends_on: tuple = ()):
+        for dependency in depends_on:
+            if dependency not in self._phases: raise ValueError(f"Phase '{name}' depends on unknown phase '{dependency}'.")
+        self._phases[name] = (func, tuple(depends_on))
+
+    async def run(self) -> dict[str, float]:
+        tasks: dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        async def run_phase(name: str):
+            func, depends_on = self._phases[name]
+            if depends_on: await asyncio.gather(*(tasks[d] for d in depends_on))
+            phase_started = time.perf_counter()
+            await func()
+            self.timings[name] = round(time.perf_counter() - phase_started, 3)
+            log.info(f"[Startup] Phase '{name}' finished in {self.timings[name]}s.")
+
+        for name in self._phases: tasks[name] = asyncio.create_task(run_phase(name), name=f"startup-{name}")
+        try: await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values(): task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        self.timings['total'] = round(time.perf_counter() - started, 3)
+        log.info("[Startup] Timings: " + ", ".join(f"{name}={seconds}s" for name, seconds in self.timings.items()))
+        return self.timings
+
+def command_tree_fingerprint(tree, application_id: int) -> str:
+    """Hashes the payload `tree.sync()` would upload, so unchanged command trees can skip the sync."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: (c.get('type', 1), c['name']))
+    return hashlib.sha256(json.dumps({'application_id': application_id, 'commands': payload}, sort_keys=True, default=str).encode()).hexdigest()
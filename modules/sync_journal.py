@@ -0,0 +1,277 @@
+# /modules/sync_journal.py
+
+import os
+import re
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+
+from modules.metrics import SYNC_SECONDS
+
+log = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r'^journal-(\d{12})-(\d{12})\.jsonl$')
+SNAPSHOT_PATTERN = re.compile(r'^snapshot-(\d{12})\.db(\.gz)?$')
+CHUNK_SIZE = 1024 * 1024
+
+def segment_name(first_seq: int, last_seq: int) -> str: return f"journal-{first_seq:012d}-{last_seq:012d}.jsonl"
+def snapshot_name(seq: int) -> str: return f"snapshot-{seq:012d}.db.gz"
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE): digest.update(chunk)
+    return digest.hexdigest()
+
+def compress_snapshot(raw_path: str, gz_path: str) -> dict:
+    """Gzips a snapshot and returns the properties stored alongside it on the remote."""
+    raw_digest = hashlib.sha256()
+    with open(raw_path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+        while chunk := src.read(CHUNK_SIZE): raw_digest.update(chunk); dst.write(chunk)
+    return {'raw_sha256': raw_digest.hexdigest(), 'sha256': file_sha256(gz_path), 'raw_size': str(os.path.getsize(raw_path))}
+
+def has_sqlite_sidecars(db_path: str) -> bool:
+    return any(os.path.exists(db_path + suffix) for suffix in ('-wal', '-shm'))
+
+def clean_marker_path(db_path: str) -> str: return db_path + '.clean.json'
+
+def remove_sqlite_sidecars(db_path: str):
+    """Deletes the -wal/-shm files of a database about to be replaced; SQLite would otherwise replay a stale WAL onto the new file."""
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix): os.remove(db_path + suffix)
+
+def decompress_snapshot(gz_path: str, raw_path: str):
+    # Write beside the target and swap in atomically, so a failed restore never leaves a truncated database.
+    with gzip.open(gz_path, 'rb') as src, open(raw_path + '.tmp', 'wb') as dst: shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    remove_sqlite_sidecars(raw_path); os.replace(raw_path + '.tmp', raw_path)
+
+class MutationJournal:
+    """
+    Append-only log of committed DatabaseManager mutations. Records are written
+    to `current.jsonl` and rolled into immutable, sequence-numbered segment files
+    that the JournalSync ships to the remote store.
+    """
+    def __init__(self, journal_dir: str):
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current_path = os.path.join(journal_dir, 'current.jsonl')
+        self._first_seq = None
+        self.seq = 0
+        self._recover()
+        self._file = open(self._current_path, 'a', encoding='utf-8')
+
+    def _recover(self):
+        """Picks up sequence numbers from files left behind by a previous run."""
+        for name in os.listdir(self.journal_dir):
+            if match := SEGMENT_PATTERN.match(name): self.seq = max(self.seq, int(match.group(2)))
+        for record in self.read_records(self._current_path):
+            if self._first_seq is None: self._first_seq = record['seq']
+            self.seq = max(self.seq, record['seq'])
+
+    @staticmethod
+    def read_records(path: str):
+        if not os.path.exists(path): return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try: yield json.loads(line)
+                except json.JSONDecodeError: log.warning(f"Skipping torn journal line in {os.path.basename(path)}.")
+
+    def append(self, op: str, args: dict) -> int:
+        with self._lock:
+            self.seq += 1
+            if self._first_seq is None: self._first_seq = self.seq
+            self._file.write(json.dumps({'seq': self.seq, 'op': op, 'args': args}, separators=(',', ':')) + '\n')
+            self._file.flush()
+            return self.seq
+
+    def has_pending(self) -> bool:
+        return self._first_seq is not None or bool(self.closed_segments())
+
+    def roll_segment(self) -> str | None:
+        """Closes the current file as an immutable segment. Returns its path, or None if it was empty."""
+        with self._lock:
+            if self._first_seq is None: return None
+            self._file.close()
+            path = os.path.join(self.journal_dir, segment_name(self._first_seq, self.seq))
+            os.replace(self._current_path, path)
+            self._file = open(self._current_path, 'a', encoding='utf-8'); self._first_seq = None
+            return path
+
+    def closed_segments(self) -> list[str]:
+        return sorted(os.path.join(self.journal_dir, n) for n in os.listdir(self.journal_dir) if SEGMENT_PATTERN.match(n))
+
+    def reset(self, seq: int):
+        """Discards local state after a restore and continues numbering from `seq`."""
+        with self._lock:
+            self._file.close()
+            for path in [self._current_path] + self.closed_segments(): os.remove(path)
+            self._file = open(self._current_path, 'a', encoding='utf-8'); self._first_seq = None
+            self.seq = seq
+
+    def close(self):
+        with self._lock: self._file.close()
+
+class JournalSync:
+    """
+    Incremental replication of the database to a remote store (Google Drive or a
+    local-directory stand-in). Each sync ships only the newly rolled journal
+    segments; every `snapshot_every` segments a compacted snapshot is taken with
+    SQLite's online backup API and the segments it covers are pruned remotely.
+    Startup restores the latest snapshot and replays the newer segments.
+
+    Snapshots are gzip-compressed and content-addressed: the raw and compressed
+    SHA-256 are stored as remote file properties, and an unchanged snapshot is never
+    re-uploaded. A clean shutdown records the journal sequence and SHA-256 of the
+    closed database file (`mark_clean_shutdown`). If the file is still exactly that
+    on the next start and is at least as new as the remote snapshot, startup
+    skips the download and only replays the newer segments.
+
+    The store must provide async `list_files()` (returning 'name' and 'properties'),
+    `upload_file(local_path, name, properties)`, `download_file(name, local_path)`,
+    `rename_file(name, new_name)` and `delete_file(name)`.
+    """
+    def __init__(self, db_manager, store, journal: MutationJournal, snapshot_every: int = 30):
+        self.db_manager = db_manager
+        self.store = store
+        self.journal = journal
+        self.snapshot_every = snapshot_every
+        self._segments_since_snapshot = 0
+        self._lock = asyncio.Lock()
+        self.stats = {'snapshots_uploaded': 0, 'snapshots_skipped': 0, 'downloads_skipped': 0, 'bytes_uploaded': 0, 'bytes_saved': 0}
+
+    def _account(self, uploaded: int, saved: int, started: float, what: str):
+        self.stats['bytes_uploaded'] += uploaded; self.stats['bytes_saved'] += saved
+        log.info(f"[Sync metrics] {what}: uploaded={uploaded}B saved={saved}B took={time.perf_counter() - started:.3f}s")
+
+    @staticmethod
+    def _parse_remote(files: list[dict]):
+        snapshots, segments = [], []
+        for f in files:
+            if match := SNAPSHOT_PATTERN.match(f['name']): snapshots.append((int(match.group(1)), f['name'], f.get('properties') or {}))
+            elif match := SEGMENT_PATTERN.match(f['name']): segments.append((int(match.group(1)), int(match.group(2)), f['name']))
+        return sorted(snapshots), sorted(segments)
+
+    async def restore(self):
+        """Rebuilds the local database from the remote snapshot plus newer segments, then initializes the schema."""
+        async with self._lock:
+            # Ship anything a previous run left behind locally, so it is part of what we restore.
+            self.journal.roll_segment()
+            for path in self.journal.closed_segments():
+                await self.store.upload_file(path, os.path.basename(path)); os.remove(path)
+
+            clean_seq = await asyncio.to_thread(self._take_clean_marker)
+            snapshots, segments = self._parse_remote(await self.store.list_files())
+            applied_seq = 0
+            if clean_seq is not None and clean_seq >= (snapshots[-1][0] if snapshots else 0):
+                applied_seq = clean_seq; self.stats['downloads_skipped'] += 1
+                self._account(0, int(snapshots[-1][2].get('raw_size', 0)) if snapshots else 0, time.perf_counter(), f"local database was closed cleanly at sequence {clean_seq}, download skipped")
+            elif snapshots:
+                applied_seq, name, properties = snapshots[-1]
+                await self._restore_snapshot(name, properties)
+            elif hasattr(self.store, 'download_database'):
+                # First run after switching to the journal: fall back to the legacy whole-file copy.
+                remove_sqlite_sidecars(self.db_manager.db_file_path); await self.store.download_database()
+            await asyncio.to_thread(self.db_manager.initialize_database)
+
+            replayed = 0
+            for first_seq, last_seq, name in segments:
+                if last_seq <= applied_seq: continue
+                with tempfile.TemporaryDirectory() as tmp:
+                    local_path = os.path.join(tmp, name)
+                    await self.store.download_file(name, local_path)
+                    for record in MutationJournal.read_records(local_path):
+                        if record['seq'] <= applied_seq: continue
+                        await asyncio.to_thread(self.db_manager.apply_journal_record, record)
+                        applied_seq = record['seq']; replayed += 1
+                self._segments_since_snapshot += 1
+            self.journal.reset(applied_seq)
+            log.info(f"Database restored to journal sequence {applied_seq} ({replayed} records replayed).")
+            # Segments are only meaningful on top of a snapshot, so make sure one exists from the start.
+            if not snapshots: await self._snapshot()
+
+    async def sync(self):
+        """Ships newly rolled journal segments and compacts into a snapshot when due."""
+        async with self._lock:
+            self.journal.roll_segment()
+            for path in self.journal.closed_segments():
+                started = time.perf_counter()
+                await self.store.upload_file(path, os.path.basename(path))
+                self._account(os.path.getsize(path), 0, started, f"journal segment '{os.path.basename(path)}' shipped")
+                os.remove(path); self._segments_since_snapshot += 1
+            if self._segments_since_snapshot >= self.snapshot_every: await self._snapshot()
+
+    def mark_clean_shutdown(self):
+        """
+        Records the journal sequence and SHA-256 of the database file. Call it once every connection is closed,
+        when SQLite has checkpointed the WAL into the main file and removed it.
+        """
+        db_path = self.db_manager.db_file_path
+        if not os.path.exists(db_path) or has_sqlite_sidecars(db_path):
+            log.warning("Database still has -wal/-shm files after shutdown; the next start will download the snapshot."); return
+        marker = {'seq': self.journal.seq, 'sha256': file_sha256(db_path)}
+        with open(clean_marker_path(db_path) + '.tmp', 'w', encoding='utf-8') as f: json.dump(marker, f)
+        os.replace(clean_marker_path(db_path) + '.tmp', clean_marker_path(db_path))
+        log.info(f"Recorded a clean shutdown at journal sequence {marker['seq']}.")
+
+    def _take_clean_marker(self) -> int | None:
+        """
+        Consumes the clean-shutdown marker and returns its sequence if the database file is still exactly what was
+        closed. A crash leaves -wal/-shm files or a different file, and any later run has already deleted the marker.
+        """
+        db_path, path = self.db_manager.db_file_path, clean_marker_path(self.db_manager.db_file_path)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, encoding='utf-8') as f: marker = json.load(f)
+        except (OSError, ValueError): marker = None
+        os.remove(path)
+        if not marker or not os.path.exists(db_path) or has_sqlite_sidecars(db_path) or file_sha256(db_path) != marker.get('sha256'): return None
+        return marker['seq']
+
+    async def _restore_snapshot(self, name: str, properties: dict):
+        started = time.perf_counter()
+        db_path = self.db_manager.db_file_path
+        log.info(f"Restoring snapshot '{name}'...")
+        if not name.endswith('.gz'):
+            remove_sqlite_sidecars(db_path); await self.store.download_file(name, db_path); return
+        with tempfile.TemporaryDirectory() as tmp:
+            gz_path = os.path.join(tmp, name)
+            await self.store.download_file(name, gz_path)
+            if properties.get('sha256') and await asyncio.to_thread(file_sha256, gz_path) != properties['sha256']:
+                raise IOError(f"Snapshot '{name}' failed its integrity check.")
+            await asyncio.to_thread(decompress_snapshot, gz_path, db_path)
+        SYNC_SECONDS.observe(time.perf_counter() - started, operation='restore_snapshot')
+        log.info(f"Snapshot '{name}' restored in {time.perf_counter() - started:.3f}s.")
+
+    async def _snapshot(self):
+        started = time.perf_counter()
+        snapshots, _ = self._parse_remote(await self.store.list_files())
+        with tempfile.TemporaryDirectory() as tmp:
+            raw_path, gz_path = os.path.join(tmp, 'snapshot.db'), os.path.join(tmp, 'snapshot.db.gz')
+            seq = await asyncio.to_thread(self.db_manager.snapshot_to, raw_path)
+            properties = await asyncio.to_thread(compress_snapshot, raw_path, gz_path)
+            raw_size, gz_size = int(properties['raw_size']), os.path.getsize(gz_path)
+            name = snapshot_name(seq)
+            latest = snapshots[-1] if snapshots else None
+            if latest and latest[2].get('raw_sha256') == properties['raw_sha256']:
+                # Same content as the newest remote snapshot: only its name (the sequence it covers) changes.
+                if latest[1] != name: await self.store.rename_file(latest[1], name)
+                self.stats['snapshots_skipped'] += 1
+                self._account(0, raw_size, started, f"snapshot '{name}' unchanged, upload skipped")
+            else:
+                await self.store.upload_file(gz_path, name, properties)
+                self.stats['snapshots_uploaded'] += 1
+                self._account(gz_size, raw_size - gz_size, started, f"snapshot '{name}' uploaded ({raw_size}B raw)")
+        self._segments_since_snapshot = 0
+        SYNC_SECONDS.observe(time.perf_counter() - started, operation='snapshot')
+        snapshots, segments = self._parse_remote(await self.store.list_files())
+        for _, last_seq, old_name in segments:
+            if last_seq <= seq: await self.store.delete_file(old_name)
+        for old_seq, old_name, _ in snapshots:
+            if old_seq < seq: await self.store.delete_file(old_name)
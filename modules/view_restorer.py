@@ -0,0 +1,67 @@
+# /modules/view_restorer.py
+
+import time
+import asyncio
+import logging
+import discord
+from collections import OrderedDict, deque
+
+log = logging.getLogger(__name__)
+
+class ViewRestorer:
+    """
+    Restores posted counter lists after a restart as a bounded, concurrent pipeline.
+
+    Records are grouped per channel (edits in one channel share a rate-limit bucket,
+    so a channel is always handled by a single worker) and channels are grouped per
+    guild. `prioritize()` moves a guild to the front of the queue, so guilds that
+    users are interacting with during startup are restored first. Messages that no
+    longer exist are collected and returned for a single batched prune.
+    """
+    def __init__(self, edit_func, concurrency: int = 8, progress_interval_seconds: float = 5.0):
+        self.edit_func = edit_func  # async edit_func(record) -> raises discord.NotFound if the message is gone
+        self.concurrency = concurrency
+        self.progress_interval_seconds = progress_interval_seconds
+        self._guilds: OrderedDict[int, deque] = OrderedDict()
+        self.running = False
+        self.progress = {'total': 0, 'restored': 0, 'stale': 0, 'failed': 0, 'elapsed': 0.0}
+        self.stale_message_ids: list[int] = []
+
+    def prioritize(self, guild_id: int):
+        if guild_id in self._guilds: self._guilds.move_to_end(guild_id, last=False)
+
+    def _next_channel(self):
+        while self._guilds:
+            guild_id, channels = next(iter(self._guilds.items()))
+            if channels: return channels.popleft()
+            del self._guilds[guild_id]
+        return None
+
+    async def _worker(self):
+        while (batch := self._next_channel()) is not None:
+            for record in batch:
+                try: await self.edit_func(record); self.progress['restored'] += 1
+                except discord.NotFound: self.stale_message_ids.append(record['message_id']); self.progress['stale'] += 1
+                except Exception as e: self.progress['failed'] += 1; log.error(f"Failed to refresh view on startup for record {record}: {e}")
+
+    async def _report_progress(self, started: float):
+        while True:
+            await asyncio.sleep(self.progress_interval_seconds)
+            self.progress['elapsed'] = round(time.perf_counter() - started, 1)
+            done = self.progress['restored'] + self.progress['stale'] + self.progress['failed']
+            log.info(f"[View Restore] {done}/{self.progress['total']} processed ({self.progress['restored']} restored, {self.progress['stale']} stale, {self.progress['failed']} failed) after {self.progress['elapsed']}s.")
+
+    async def run(self, records: list[dict]) -> list[int]:
+        """Restores every record and returns the message IDs found to be stale."""
+        by_channel: dict[int, list[dict]] = {}
+        for record in records: by_channel.setdefault(record['channel_id'], []).append(record)
+        for channel_records in by_channel.values():
+            self._guilds.setdefault(channel_records[0]['guild_id'], deque()).append(channel_records)
+        self.progress['total'] = len(records); self.running = True
+        started = time.perf_counter()
+        reporter = asyncio.create_task(self._report_progress(started))
+        try: await asyncio.gather(*(self._worker() for _ in range(min(self.concurrency, len(by_channel)))))
+        finally:
+            reporter.cancel(); self.running = False
+            self.progress['elapsed'] = round(time.perf_counter() - started, 1)
+        return self.stale_message_ids
@@ -1,13 +1,62 @@
 # /modules/views.py
 
+import hashlib
 import logging
 import discord
-from discord.ui import View, Button
-import math
+from discord.ui import View, Button, DynamicItem
 import asyncio
 
+from modules.metrics import RENDER_SECONDS, MESSAGE_EDITS
+from modules.group_purge import describe_purge_failures
+from modules.render_cache import payload_hash
+
 log = logging.getLogger(__name__)
 ITEMS_PER_PAGE = 4
+MAX_CUSTOM_ID_LENGTH = 100 # Discord's limit
+MAX_ROUTED_PAGE = 10**6 # Bounds the page number route_digest allows for, far past any real list
+ACTION_STYLES = {'inc': (discord.ButtonStyle.success, "🔼"), 'dec': (discord.ButtonStyle.danger, "🔽"), 'del': (discord.ButtonStyle.secondary, "❌")}
+SHED_MESSAGES = {
+    'user_rate': "You're clicking too fast. Please slow down.",
+    'guild_rate': "This server is sending too many clicks right now. Please try again in a moment.",
+    'queue_full': "The bot is busy right now. Please try again in a moment."
+}
+PAGE_LABELS = {'prev': ("◀️", None), 'next': ("▶️", None), 'refresh': ("Refresh", "🔄")}
+
+# --- Stateless routing: a button's custom_id carries everything its handler needs ---
+# Format: `cb:{action}:{page}:{group}[:{counter}]`. Names are escaped so they cannot contain ':'.
+# When the names do not fit in a custom_id, a `#digest` of them is sent instead and resolved on click through the
+# bot's AutocompleteIndex, which keeps a digest for every name pair `route_digest` reports as too long.
+def _escape(name: str) -> str:
+    return name.replace('%', '%25').replace(':', '%3A').replace('#', '%23')
+
+def _unescape(text: str) -> str:
+    return text.replace('%23', '#').replace('%3A', ':').replace('%25', '%')
+
+def _name_digest(group_name: str, counter_name: str | None) -> str:
+    return hashlib.sha1(f"{group_name}\0{counter_name or ''}".encode()).hexdigest()[:16]
+
+def _route_names(group_name: str, counter_name: str | None) -> str:
+    return ':'.join(_escape(name) for name in ([group_name] if counter_name is None else [group_name, counter_name]))
+
+def route_id(action: str, page: int, group_name: str, counter_name: str = None) -> str:
+    custom_id = f"cb:{action}:{page}:" + _route_names(group_name, counter_name)
+    if len(custom_id) <= MAX_CUSTOM_ID_LENGTH: return custom_id
+    return f"cb:{action}:{page}:#{_name_digest(group_name, counter_name)}"
+
+def route_digest(group_name: str, counter_name: str = None) -> str | None:
+    """The digest buttons for these names may carry, or None if the names fit in any custom_id up to page MAX_ROUTED_PAGE."""
+    if len(f"cb:refresh:{MAX_ROUTED_PAGE}:" + _route_names(group_name, counter_name)) <= MAX_CUSTOM_ID_LENGTH: return None
+    return _name_digest(group_name, counter_name)
+
+async def resolve_route(bot, guild_id: int, ref: str, with_counter: bool) -> tuple[str, str | None] | None:
+    """Turns the names part of a custom_id back into (group, counter). Returns None if they no longer exist."""
+    if not ref.startswith('#'):
+        names = [_unescape(part) for part in ref.split(':')]
+        if len(names) != (2 if with_counter else 1): return None
+        return names[0], names[1] if with_counter else None
+    route = await bot.autocomplete_index.resolve_route(guild_id, ref[1:], bot.db.get_counter_names)
+    if route is None or (route[1] is not None) != with_counter: return None
+    return route
 
 class CounterView(View):
     def __init__(self, bot, guild_id: int, group_name: str, page: int = 1):
@@ -15,118 +64,170 @@ class CounterView(View):
         self.bot = bot
         self.guild_id = guild_id
         self.group_name = group_name
-        self.db_manager = bot.db_manager
+        self.db = bot.db
         self.db_queue = bot.db_queue
         self.page = page
+        self.version = 0
+        self._items: list[dict] = [] # Counters on the current page only
+        self._total = 0
+        self.payload_hash = None
         self.message: discord.Message = None
 
+    @property
+    def group_key(self) -> tuple:
+        return (self.guild_id, self.group_name)
+
     def _get_content(self, locked: bool = False) -> str:
+        """Builds the message text from the state loaded by the last `_rebuild_ui` call."""
         if locked: return f"**⏳ Processing...**\n*This message will update automatically.*"
-        all_items = self.db_manager.get_counters_in_group(self.guild_id, self.group_name)
         title = f"**Counters in Group: `{self.group_name.capitalize()}`**\n"
-        if not all_items: return title + "This group has no counters. Use `/createcounter` to add one!"
+        if not self._total: return title + "This group has no counters. Use `/createcounter` to add one!"
         return title + "*This is an interactive message.*"
 
-    def _rebuild_ui(self, locked: bool = False):
+    async def _load_page(self, locked: bool) -> dict:
+        """Returns the rendered page from the bot's render cache, querying and caching it on a miss."""
+        cache = self.bot.render_cache
+        version = await self.db.get_group_version(self.guild_id, self.group_name)
+        rendered = cache.get(self.guild_id, self.group_name, version, self.page, locked)
+        if rendered is not None: return rendered
+        state = await self.db.get_group_page(self.guild_id, self.group_name, self.page, ITEMS_PER_PAGE)
+        self._total = state['total']
+        content = self._get_content(locked)
+        rendered = {**state, 'content': content, 'hash': payload_hash(content, state['page'], state['total_pages'], state['items'], locked)}
+        # Stored under the clamped page and, if it differs (e.g. past the last page), the requested one too.
+        for page in {state['page'], self.page}: cache.put(self.guild_id, self.group_name, state['version'], page, locked, rendered)
+        return rendered
+
+    async def _rebuild_ui(self, locked: bool = False):
         self.clear_items()
-        all_items = self.db_manager.get_counters_in_group(self.guild_id, self.group_name)
-        total_pages = math.ceil(len(all_items) / ITEMS_PER_PAGE) if all_items else 1
-        self.page = max(1, min(self.page, total_pages))
-        start_index = (self.page - 1) * ITEMS_PER_PAGE
-        end_index = start_index + ITEMS_PER_PAGE
-        items_on_page = all_items[start_index:end_index]
-        for i, item in enumerate(items_on_page):
+        rendered = await self._load_page(locked)
+        self.version, self.page, self._total, self._items = rendered['version'], rendered['page'], rendered['total'], rendered['items']
+        self.payload_hash = rendered['hash']
+        total_pages = rendered['total_pages']
+        for i, item in enumerate(self._items):
             name, value = item['name'], item['value']
-            self.add_item(Button(label=f"{name.capitalize()}: {value}", style=discord.ButtonStyle.secondary, disabled=True, row=i))
-            self.add_item(self.ActionButton(style=discord.ButtonStyle.success, emoji="🔼", custom_id=f"inc:{name}", row=i, disabled=locked))
-            self.add_item(self.ActionButton(style=discord.ButtonStyle.danger, emoji="🔽", custom_id=f"dec:{name}", row=i, disabled=locked))
-            self.add_item(self.ActionButton(style=discord.ButtonStyle.secondary, emoji="❌", custom_id=f"del:{name}", row=i, disabled=locked))
-        self.add_item(self.PaginationButton(label="◀️", custom_id="prev", row=4, disabled=locked or self.page <= 1))
-        self.add_item(Button(label=f"Page {self.page}/{total_pages}", style=discord.ButtonStyle.secondary, disabled=True, row=4))
-        self.add_item(self.PaginationButton(label="▶️", custom_id="next", row=4, disabled=locked or self.page >= total_pages))
-        self.add_item(self.PaginationButton(label="Refresh", emoji="🔄", custom_id="refresh", row=4, disabled=locked))
+            self.add_item(Button(label=f"{name.capitalize()}: {value}", style=discord.ButtonStyle.secondary, disabled=True, custom_id=f"label:{i}", row=i))
+            for action in ACTION_STYLES: self.add_item(CounterActionButton(action, self.page, self.group_name, name, row=i, disabled=locked))
+        self.add_item(CounterPageButton('prev', self.page - 1, self.group_name, disabled=locked or self.page <= 1))
+        self.add_item(Button(label=f"Page {self.page}/{total_pages}", style=discord.ButtonStyle.secondary, disabled=True, custom_id="page", row=4))
+        self.add_item(CounterPageButton('next', self.page + 1, self.group_name, disabled=locked or self.page >= total_pages))
+        self.add_item(CounterPageButton('refresh', self.page, self.group_name, disabled=locked))
+        # The view is only a component template. Clicks are routed by the dynamic items registered on the bot,
+        # so a stopped view keeps discord.py from storing one View object per posted message.
+        self.stop()
 
     async def send_initial_message(self, interaction: discord.Interaction):
-        self._rebuild_ui()
+        await self._rebuild_ui()
         await interaction.followup.send(content=self._get_content(), view=self)
         self.message = await interaction.original_response()
-        self.db_manager.add_active_view(message_id=self.message.id, channel_id=self.message.channel.id, guild_id=self.guild_id, group_name=self.group_name)
-        self.bot.db_is_dirty = True
+        await self.db.add_active_view(message_id=self.message.id, channel_id=self.message.channel.id, guild_id=self.guild_id, group_name=self.group_name)
+        self.bot.note_rendered(self.message.id, self.version, self.payload_hash)
 
     async def update_message_by_id(self, channel_id: int, message_id: int, locked: bool = False):
         channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
-        self.message = await channel.fetch_message(message_id)
+        self.message = channel.get_partial_message(message_id)
         await self.update_message(locked)
 
     async def update_message(self, locked: bool = False):
         if self.message:
-            self._rebuild_ui(locked=locked)
-            await self.message.edit(content=self._get_content(locked=locked), view=self)
-
-    class ActionButton(Button):
-        async def callback(self, interaction: discord.Interaction):
-            view: CounterView = self.view
-            if view.group_name in view.bot.locked_groups:
-                await interaction.response.send_message("This group is being updated. Please wait...", ephemeral=True, delete_after=3); return
-
-            action, counter_name = self.custom_id.split(':')
-            
-            # --- Deletion now has special logic ---
-            if action == 'del':
-                view.bot.locked_groups.add(view.group_name)
-                await interaction.response.defer()
-                try:
-                    await view.bot.proactive_group_refresh(view.guild_id, view.group_name, locked=True)
-                    
-                    job_event_del = asyncio.Event()
-                    job_del = {'action': 'delete_counter', 'payload': {'guild_id': view.guild_id, 'group_name': view.group_name, 'counter_name': counter_name}, 'event': job_event_del}
-                    await view.db_queue.put(job_del)
-                    await job_event_del.wait()
-                    
-                    # Proactive refresh will be called by the worker, no need to call it here.
-                    
-                    if view.db_manager.is_group_empty(view.guild_id, view.group_name):
-                        confirm_view = ConfirmationView(author=interaction.user, confirmation_text=f"The group **`{view.group_name.capitalize()}`** is now empty. Would you like to delete the group and all of its counter lists as well?")
-                        await interaction.followup.send(confirm_view.confirmation_text, view=confirm_view, ephemeral=True)
-                        message = await interaction.original_response()
-                        confirm_view.message = message
-                        await confirm_view.wait()
-                        
-                        if confirm_view.value is True:
-                            job_event_purge = asyncio.Event()
-                            job_purge = {'action': 'delete_group', 'payload': {'guild_id': view.guild_id, 'group_name': view.group_name}, 'event': job_event_purge}
-                            await view.db_queue.put(job_purge)
-                            await job_event_purge.wait()
-                            await message.edit(content=f"✅ Successfully purged the empty group `{view.group_name}`.", view=None)
-
-                except Exception as e: log.error(f"Error in delete ActionButton: {e}", exc_info=True)
-                finally:
-                    # Final unlock is still handled by the worker, this just releases the initial lock
-                    if view.group_name in view.bot.locked_groups: view.bot.locked_groups.remove(view.group_name)
-                return
-
-            # --- Inc/Dec logic remains the same ---
-            view.bot.locked_groups.add(view.group_name)
+            with RENDER_SECONDS.time(): await self._rebuild_ui(locked=locked)
+            # Optimistic check: never overwrite a message with a render older than the one it already shows.
+            if self.version < self.bot.rendered_versions.get(self.message.id, 0): MESSAGE_EDITS.inc(outcome='stale_skipped'); return
+            if self.payload_hash == self.bot.sent_payload_hashes.get(self.message.id):
+                # The message already shows exactly this, and its buttons route by custom_id alone.
+                MESSAGE_EDITS.inc(outcome='unchanged_skipped')
+                self.bot.rendered_versions[self.message.id] = self.version; return
+            try: self.message = await self.message.edit(content=self._get_content(locked=locked), view=self)
+            except discord.HTTPException as e:
+                MESSAGE_EDITS.inc(outcome='rate_limited' if e.status == 429 else 'failed'); raise
+            except discord.RateLimited: MESSAGE_EDITS.inc(outcome='rate_limited'); raise
+            MESSAGE_EDITS.inc(outcome='sent')
+            self.bot.note_rendered(self.message.id, self.version, self.payload_hash)
+
+class CounterActionButton(DynamicItem[Button], template=r'cb:(?P<action>inc|dec|del):(?P<page>[0-9]+):(?P<ref>.+)'):
+    """🔼/🔽/❌ on a counter row. Registered once on the bot; serves every posted list, including those posted before a restart."""
+    def __init__(self, action: str, page: int, group_name: str, counter_name: str, row: int = None, disabled: bool = False):
+        style, emoji = ACTION_STYLES[action]
+        super().__init__(Button(style=style, emoji=emoji, custom_id=route_id(action, page, group_name, counter_name), row=row, disabled=disabled))
+        self.action, self.page, self.group_name, self.counter_name = action, page, group_name, counter_name
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        route = await resolve_route(interaction.client, interaction.guild_id, match['ref'], with_counter=True)
+        if route is None: return cls(match['action'], int(match['page']), '', None, row=item.row)
+        return cls(match['action'], int(match['page']), *route, row=item.row)
+
+    async def callback(self, interaction: discord.Interaction):
+        bot = interaction.client; guild_id = interaction.guild_id
+        group_key = (guild_id, self.group_name)
+        if self.counter_name is None:
+            await interaction.response.send_message("This counter no longer exists. Use `/listcounters` to post a fresh list.", ephemeral=True, delete_after=5); return
+        if group_key in bot.locked_groups:
+            await interaction.response.send_message("This group is being updated. Please wait...", ephemeral=True, delete_after=3); return
+        if shed := bot.admission.admit_click(interaction.user.id, guild_id, self.group_name, self.action):
+            await interaction.response.send_message(SHED_MESSAGES[shed], ephemeral=True, delete_after=3); return
+
+        # --- Deletion is a structural change, so it is the only action that locks the group ---
+        if self.action == 'del':
+            bot.locked_groups.add(group_key)
             await interaction.response.defer()
             try:
-                await view.bot.proactive_group_refresh(view.guild_id, view.group_name, locked=True)
-                job = {'payload': {'guild_id': view.guild_id, 'group_name': view.group_name, 'counter_name': counter_name}}
-                if action == 'inc': job.update({'action': 'update_counter', 'payload': {**job['payload'], 'action': 'inc'}})
-                elif action == 'dec': job.update({'action': 'update_counter', 'payload': {**job['payload'], 'action': 'dec'}})
-                await view.db_queue.put(job)
-            except Exception as e:
-                log.error(f"Error in ActionButton callback: {e}", exc_info=True)
-                if view.group_name in view.bot.locked_groups: view.bot.locked_groups.remove(view.group_name)
-                await view.bot.proactive_group_refresh(view.guild_id, view.group_name, locked=False)
-
-    class PaginationButton(Button):
-        async def callback(self, interaction: discord.Interaction):
-            view: CounterView = self.view
-            if view.group_name in view.bot.locked_groups: await interaction.response.send_message("This group is being updated. Please wait...", ephemeral=True, delete_after=3); return
-            await interaction.response.defer(); view.message = interaction.message
-            if self.custom_id == "prev": view.page -= 1
-            elif self.custom_id == "next": view.page += 1
-            await view.update_message(locked=False)
+                await bot.proactive_group_refresh(guild_id, self.group_name, locked=True)
+
+                job_event_del = asyncio.Event()
+                job_del = {'action': 'delete_counter', 'payload': {'guild_id': guild_id, 'group_name': self.group_name, 'counter_name': self.counter_name}, 'event': job_event_del}
+                await bot.db_queue.put(job_del)
+                await job_event_del.wait()
+                bot.locked_groups.discard(group_key)
+                # Proactive refresh will be called by the worker, no need to call it here.
+
+                if await bot.db.is_group_empty(guild_id, self.group_name):
+                    confirm_view = ConfirmationView(author=interaction.user, confirmation_text=f"The group **`{self.group_name.capitalize()}`** is now empty. Would you like to delete the group and all of its counter lists as well?")
+                    await interaction.followup.send(confirm_view.confirmation_text, view=confirm_view, ephemeral=True)
+                    message = await interaction.original_response()
+                    confirm_view.message = message
+                    await confirm_view.wait()
+
+                    if confirm_view.value is True:
+                        job_event_purge = asyncio.Event()
+                        job_purge = {'action': 'delete_group', 'payload': {'guild_id': guild_id, 'group_name': self.group_name}, 'event': job_event_purge}
+                        await bot.db_queue.put(job_purge)
+                        await job_event_purge.wait()
+                        await message.edit(content=f"✅ Successfully purged the empty group `{self.group_name}`." + describe_purge_failures(job_purge), view=None)
+
+            except Exception as e: log.error(f"Error in delete CounterActionButton: {e}", exc_info=True)
+            finally:
+                bot.locked_groups.discard(group_key)
+            return
+
+        # --- Inc/Dec are commutative SQL-level increments: no lock, no 'Processing' round-trip ---
+        await interaction.response.defer()
+        try:
+            job = bot.coalescer.add(guild_id, self.group_name, self.counter_name, 1 if self.action == 'inc' else -1)
+            await job['event'].wait()
+            if job.get('error'): await interaction.followup.send("Your click could not be saved. Please try again.", ephemeral=True)
+        except Exception as e: log.error(f"Error in CounterActionButton callback: {e}", exc_info=True)
+
+class CounterPageButton(DynamicItem[Button], template=r'cb:(?P<action>prev|next|refresh):(?P<page>[0-9]+):(?P<ref>.+)'):
+    """◀️/▶️/🔄 on a list. `page` is the page to show after the click; the message is re-rendered from it."""
+    def __init__(self, action: str, page: int, group_name: str, disabled: bool = False):
+        label, emoji = PAGE_LABELS[action]
+        super().__init__(Button(label=label, emoji=emoji, style=discord.ButtonStyle.secondary, custom_id=route_id(action, max(page, 1), group_name), row=4, disabled=disabled))
+        self.action, self.page, self.group_name = action, max(page, 1), group_name
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        route = await resolve_route(interaction.client, interaction.guild_id, match['ref'], with_counter=False)
+        return cls(match['action'], int(match['page']), route[0] if route else '')
+
+    async def callback(self, interaction: discord.Interaction):
+        bot = interaction.client
+        if not self.group_name: await interaction.response.send_message("This list's group no longer exists.", ephemeral=True, delete_after=5); return
+        if (interaction.guild_id, self.group_name) in bot.locked_groups: await interaction.response.send_message("This group is being updated. Please wait...", ephemeral=True, delete_after=3); return
+        await interaction.response.defer()
+        view = CounterView(bot=bot, guild_id=interaction.guild_id, group_name=self.group_name, page=self.page)
+        view.message = interaction.message
+        await view.update_message(locked=False)
 
 class ConfirmationView(View):
     def __init__(self, author: discord.Member, confirmation_text: str):
@@ -0,0 +1,54 @@
+# /modules/write_coalescer.py
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+class DeltaCoalescer:
+    """
+    Merges inc/dec clicks per (guild, group, counter) over a short window and
+    flushes each group's accumulated deltas as a single 'apply_deltas' job.
+    Every click merged into a batch shares that batch's job, so they all learn
+    together when the worker has committed it (its 'event' is set) or failed (its 'error' is set).
+    """
+    def __init__(self, db_queue, window_seconds: float = 0.25):
+        self.db_queue = db_queue
+        self.window_seconds = window_seconds
+        self._pending: dict[tuple, dict] = {}
+        self.clicks_received = 0
+        self.batches_flushed = 0
+
+    def add(self, guild_id: int, group_name: str, counter_name: str, delta: int) -> dict:
+        """Records a delta and returns its batch's job. Await `job['event']`, then check `job.get('error')`."""
+        key = (guild_id, group_name)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = {'deltas': {}, 'activity': {}, 'job': {'action': 'apply_deltas', 'event': asyncio.Event()}, 'clicks': 0}
+            asyncio.get_running_loop().call_later(self.window_seconds, self.flush, key)
+        batch['deltas'][counter_name] = batch['deltas'].get(counter_name, 0) + delta
+        # Clicks that cancel out still count as activity for the counter's history.
+        activity = batch['activity'].setdefault(counter_name, [0, 0])
+        if delta > 0: activity[0] += delta
+        else: activity[1] -= delta
+        batch['clicks'] += 1
+        self.clicks_received += 1
+        return batch['job']
+
+    def has_pending(self, guild_id: int, group_name: str) -> bool:
+        """Whether a click for the group would join a batch that is already waiting, instead of creating a job."""
+        return (guild_id, group_name) in self._pending
+
+    def flush(self, key: tuple):
+        batch = self._pending.pop(key, None)
+        if batch is None: return
+        guild_id, group_name = key
+        deltas = {name: delta for name, delta in batch['deltas'].items() if delta}
+        job = batch['job']
+        job.update(payload={'guild_id': guild_id, 'group_name': group_name, 'deltas': deltas, 'activity': batch['activity']}, clicks=batch['clicks'])
+        self.db_queue.put_nowait(job)
+        self.batches_flushed += 1
+        log.debug(f"Flushed {batch['clicks']} clicks as {len(deltas)} counter deltas for group '{group_name}'.")
+
+    def flush_all(self):
+        for key in list(self._pending): self.flush(key)
@@ -0,0 +1,20 @@
+# /tests/conftest.py
+
+import os
+import sys
+import logging
+
+import pytest
+
+# The bot runs from the repository root (`python main.py`), so the tests import its modules the same way.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.getLogger('modules').setLevel(logging.WARNING)
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh, initialized DatabaseManager over a file in the test's temporary directory."""
+    from modules.database_manager import DatabaseManager
+    manager = DatabaseManager(str(tmp_path / 'counters.db'))
+    manager.initialize_database()
+    yield manager
+    manager.close_fast_connections(); manager.engine.dispose()
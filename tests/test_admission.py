@@ -0,0 +1,49 @@
+# /tests/test_admission.py
+
+import asyncio
+
+from modules.admission import AdmissionController, TokenBucket
+from modules.job_scheduler import JobScheduler
+from modules.write_coalescer import DeltaCoalescer
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, burst=2.0, now=0.0)
+    assert bucket.take(0.0) and bucket.take(0.0) and not bucket.take(0.0)
+    assert bucket.take(0.5) and not bucket.take(0.5)
+    assert bucket.take(10.0) and bucket.take(10.0) and not bucket.take(10.0) # Never more than the burst
+
+def make_controller(**limits):
+    scheduler = JobScheduler(lane_count=1)
+    coalescer = DeltaCoalescer(scheduler, window_seconds=60)
+    return scheduler, coalescer, AdmissionController(scheduler, coalescer, **limits)
+
+def test_user_limit_applies_before_guild_limit():
+    _, _, admission = make_controller(user_rate=0.001, user_burst=2, guild_rate=0.001, guild_burst=3)
+    assert [admission.admit_click(1, 10, 'g', 'inc') for _ in range(3)] == [None, None, 'user_rate']
+    assert admission.admit_click(2, 10, 'g', 'inc') is None
+    assert admission.admit_click(3, 10, 'g', 'inc') == 'guild_rate'
+    assert admission.admit_click(4, 11, 'g', 'inc') is None # Another guild has its own budget
+
+def test_full_queue_only_admits_clicks_that_merge():
+    async def scenario():
+        scheduler, coalescer, admission = make_controller(max_queue_depth=1)
+        scheduler.put_nowait({'action': 'update_counter', 'payload': {'guild_id': 10, 'group_name': 'other'}})
+        shed = admission.admit_click(1, 10, 'g', 'inc')
+        coalescer.add(10, 'g', 'a', 1) # A batch is now waiting for g
+        return shed, admission.admit_click(2, 10, 'g', 'inc'), admission.admit_click(3, 10, 'h', 'inc')
+    assert asyncio.run(scenario()) == ('queue_full', None, 'queue_full')
+
+def test_shed_clicks_spend_no_tokens():
+    _, _, admission = make_controller(user_rate=0.001, user_burst=2, guild_rate=0.001, guild_burst=1)
+    assert admission.admit_click(1, 10, 'g', 'inc') is None
+    # Shed by the guild bucket: user 1 keeps its second token for another guild
+    assert admission.admit_click(1, 10, 'g', 'inc') == 'guild_rate'
+    assert admission.admit_click(1, 11, 'g', 'inc') is None
+
+def test_deletes_never_merge_into_a_full_queue():
+    async def scenario():
+        scheduler, coalescer, admission = make_controller(max_queue_depth=1, user_burst=1)
+        scheduler.put_nowait({'action': 'update_counter', 'payload': {'guild_id': 10, 'group_name': 'other'}})
+        coalescer.add(10, 'g', 'a', 1)
+        return admission.admit_click(1, 10, 'g', 'del'), admission.admit_click(1, 10, 'g', 'dec')
+    assert asyncio.run(scenario()) == ('queue_full', None) # The shed delete left the user's only token for the dec
@@ -0,0 +1,25 @@
+# /tests/test_autocomplete_index.py
+
+from modules.autocomplete_index import NameIndex
+
+def test_ranking_exact_prefix_word_substring_fuzzy():
+    index = NameIndex(['apple', 'apple pie', 'green-apple', 'pineapple', 'apricot', 'banana', 'appel'])
+    assert index.search('apple') == ['apple', 'apple pie', 'green-apple', 'pineapple']
+    assert index.search('app') == ['appel', 'apple', 'apple pie', 'green-apple', 'pineapple'] # Equal ranks: shortest, then alphabetical
+
+def test_fuzzy_matches_need_enough_shared_trigrams():
+    index = NameIndex(['strawberry', 'raspberry', 'blueberry'])
+    assert index.search('strawbery')[0] == 'strawberry'
+    assert 'blueberry' not in index.search('strawbery')
+
+def test_short_queries_fall_back_to_substring_scan():
+    index = NameIndex(['ab', 'cab', 'xyz'])
+    assert index.search('ab') == ['ab', 'cab']
+
+def test_remove_and_limit():
+    index = NameIndex(f"counter{i:02d}" for i in range(40))
+    index.remove('counter00'); index.remove('missing')
+    assert 'counter00' not in index and len(index) == 39
+    assert index.search('counter') == [f"counter{i:02d}" for i in range(1, 26)]
+    assert index.search('', limit=3) == ['counter01', 'counter02', 'counter03']
+    assert 'counter00' not in index.search('counter00')
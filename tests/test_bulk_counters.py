@@ -0,0 +1,24 @@
+# /tests/test_bulk_counters.py
+
+def values(db, group: str = 'g') -> dict:
+    return {c['name']: c['value'] for c in db.get_counters_in_group(1, group)}
+
+def test_create_counters_reports_existing_and_repeated_names(db):
+    db.create_counter(1, 'g', 'a')
+    version = db.get_group_version(1, 'g')
+    assert db.create_counters(1, 'g', ['b', 'a', 'c', 'b', 'b']) == {'created': ['b', 'c'], 'duplicates': ['a', 'b', 'b']}
+    assert values(db) == {'a': 0, 'b': 0, 'c': 0}
+    assert db.get_group_version(1, 'g') == version + 1 # One transaction, one version bump
+    assert db.create_counters(1, 'g', ['a', 'c']) == {'created': [], 'duplicates': ['a', 'c']}
+    assert db.get_group_version(1, 'g') == version + 1 # Nothing created, nothing bumped
+
+def test_adjust_counters_applies_known_names_and_reports_missing_ones(db):
+    db.create_counters(1, 'g', ['a', 'b'])
+    db.create_counter(1, 'other', 'x') # Same name space, different group
+    version = db.get_group_version(1, 'g')
+    result = db.adjust_counters(1, 'g', {'a': 5, 'b': 0, 'x': 2, 'zz': -1})
+    assert result == {'adjusted': {'a': 5, 'b': 0}, 'missing': ['x', 'zz']}
+    assert values(db) == {'a': 5, 'b': 0} and values(db, 'other') == {'x': 0}
+    assert db.get_group_version(1, 'g') == version + 1
+    assert db.adjust_counters(1, 'g', {'zz': 3}) == {'adjusted': {}, 'missing': ['zz']}
+    assert db.get_group_version(1, 'g') == version + 1
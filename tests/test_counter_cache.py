@@ -0,0 +1,52 @@
+# /tests/test_counter_cache.py
+
+import pytest
+
+from modules.counter_cache import CacheInconsistencyError, CounterCache
+from modules.database_manager import DatabaseManager
+
+def items(*pairs) -> list[dict]:
+    return [{'name': name, 'value': value} for name, value in pairs]
+
+def test_hooks_write_through_a_cached_group(db):
+    db.create_counters(1, 'g', ['b', 'd'])
+    assert db.get_counters_in_group(1, 'g') == items(('b', 0), ('d', 0)) # Miss: read and cached
+    db.create_counter(1, 'g', 'c'); db.apply_counter_deltas(1, 'g', {'b': 2, 'c': -1}); db.delete_counter(1, 'g', 'd')
+    assert db.cache.get_group(1, 'g') == items(('b', 2), ('c', -1))
+    misses = db.cache.misses
+    assert db.get_counters_in_group(1, 'g') == items(('b', 2), ('c', -1)) and db.cache.misses == misses
+    db.delete_group(1, 'g')
+    assert db.cache.get_group(1, 'g') is None
+
+def test_verify_mode_checks_every_hit_against_the_database(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'counters.db'), cache_verify=True); db.initialize_database()
+    db.create_counter(1, 'g', 'a')
+    db.get_counters_in_group(1, 'g'); db.apply_counter_deltas(1, 'g', {'a': 3})
+    assert db.get_counters_in_group(1, 'g') == items(('a', 3))
+    db.cache.on_counter_deltas(1, 'g', {'a': 1}) # A hook applied without a matching commit
+    with pytest.raises(CacheInconsistencyError): db.get_counters_in_group(1, 'g')
+    db.close_fast_connections(); db.engine.dispose()
+
+def test_generation_guard_refuses_reads_that_raced_a_write():
+    cache = CounterCache()
+    generation = cache.generation
+    with cache.write_guard():
+        cache.put_group(1, 'g', items(('a', 0)), generation=cache.generation) # A write is still in flight
+        assert cache.get_group(1, 'g') is None
+    cache.put_group(1, 'g', items(('a', 0)), generation=generation) # The read started before that write
+    assert cache.get_group(1, 'g') is None
+    cache.put_group(1, 'g', items(('a', 1)), generation=cache.generation)
+    assert cache.get_group(1, 'g') == items(('a', 1))
+    generation = cache.generation; cache.invalidate(1, 'g')
+    cache.put_group(1, 'g', items(('a', 0)), generation=generation)
+    assert cache.get_group(1, 'g') is None
+
+def test_least_recently_used_groups_are_evicted_over_budget():
+    cache = CounterCache()
+    entry = cache._estimate_size(items(*((f"c{i}", i) for i in range(10))))
+    cache.memory_budget_bytes = entry * 2
+    for group in ('a', 'b'): cache.put_group(1, group, items(*((f"c{i}", i) for i in range(10))))
+    cache.get_group(1, 'a') # 'b' is now the least recently used
+    cache.put_group(1, 'c', items(*((f"c{i}", i) for i in range(10))))
+    assert cache.get_group(1, 'b') is None and cache.get_group(1, 'a') is not None
+    assert cache.evictions == 1 and cache.used_bytes <= cache.memory_budget_bytes
@@ -0,0 +1,59 @@
+# /tests/test_counter_history.py
+
+from modules.database_manager import CounterEvent, CounterRollup, HISTORY_RETENTION_SECONDS, history_rows
+
+AT = 1_700_000_000 - 1_700_000_000 % 3600 + 125 # Two minutes into an hour
+
+def history(db, model):
+    with db.Session() as session: return session.query(model).count()
+
+def test_history_rows_buckets_activity():
+    events, rollups = history_rows(1, 'g', 'adjust', {'a': [3, 1], 'b': [0, 0]}, AT)
+    assert [(e['counter_name'], e['increments'], e['decrements'], e['at']) for e in events] == [('a', 3, 1, AT), ('b', 0, 0, AT)]
+    # Idle counters get an event but no rollup rows
+    assert sorted((r['resolution'], r['bucket_start'], r['counter_name']) for r in rollups) == [('hour', AT - 125, 'a'), ('minute', AT - 5, 'a')]
+
+def test_counter_stats_sum_the_rollups(db):
+    db.create_counters(1, 'g', ['a', 'b'])
+    db.apply_counter_deltas(1, 'g', {'a': 2}, activity={'a': [3, 1]}, at=AT)
+    db.apply_counter_deltas(1, 'g', {'b': -1}, at=AT + 60)
+    db.apply_counter_deltas(1, 'g', {'a': 1}, at=AT - 2 * 3600)
+    stats = db.get_counter_stats(1, 'g', at=AT + 61)
+    assert stats['windows']['last_hour'] == {'increments': 3, 'decrements': 2, 'net': 1}
+    assert stats['windows']['last_24h'] == {'increments': 4, 'decrements': 2, 'net': 2}
+    assert stats['peak_hour'] == {'bucket_start': AT - 125, 'activity': 5}
+    assert stats['top_counters'] == [{'name': 'a', 'increments': 4, 'decrements': 1}, {'name': 'b', 'increments': 0, 'decrements': 1}]
+    assert db.get_counter_stats(1, 'g', 'b', at=AT + 61)['windows']['last_hour']['net'] == -1
+
+def test_prune_history_expires_minutes_before_hours(db):
+    db.create_counter(1, 'g', 'a')
+    db.apply_counter_deltas(1, 'g', {'a': 1}, at=AT)
+    events, rollups = history(db, CounterEvent), history(db, CounterRollup)
+    assert db.prune_history(at=AT + HISTORY_RETENTION_SECONDS['minute'] + 3600) == 1
+    assert history(db, CounterRollup) == rollups - 1 and history(db, CounterEvent) == events
+    db.prune_history(at=AT + HISTORY_RETENTION_SECONDS['hour'] + 3600)
+    assert history(db, CounterRollup) == 0 and history(db, CounterEvent) == 0
+
+def test_deltas_for_deleted_counters_leave_no_history(db):
+    db.create_counters(1, 'g', ['a', 'b'])
+    db.delete_counter(1, 'g', 'b', at=AT)
+    version, events = db.get_group_version(1, 'g'), history(db, CounterEvent)
+    # Clicks coalesced before the delete ran after it: only the surviving counter is applied
+    db.apply_counter_deltas(1, 'g', {'a': 1, 'b': 4}, at=AT)
+    assert history(db, CounterEvent) == events + 1
+    assert db.get_group_version(1, 'g') == version + 1
+    assert [c['value'] for c in db.get_counters_in_group(1, 'g')] == [1]
+    assert db.get_counter_stats(1, 'g', 'b', at=AT + 1)['windows']['last_hour']['increments'] == 0
+    db.delete_group(1, 'g', at=AT)
+    version, events = db.get_group_version(1, 'g'), history(db, CounterEvent)
+    db.apply_counter_deltas(1, 'g', {'a': 1}, activity={'a': [1, 0], 'b': [1, 1]}, at=AT)
+    assert history(db, CounterEvent) == events and db.get_group_version(1, 'g') == version
+
+def test_imports_record_their_changes(db):
+    db.create_counters(1, 'g', ['a', 'b'])
+    db.apply_counter_deltas(1, 'g', {'a': 5}, at=AT)
+    db.import_counters(1, 'g', [['a', 2], ['b', 0], ['c', 4]], at=AT)
+    with db.Session() as session:
+        events = session.query(CounterEvent.counter_name, CounterEvent.increments, CounterEvent.decrements).filter_by(kind='import').order_by(CounterEvent.counter_name).all()
+    assert events == [('a', 0, 3), ('c', 4, 0)] # 'b' kept its value
+    assert db.get_counter_stats(1, 'g', at=AT + 1)['windows']['last_hour'] == {'increments': 9, 'decrements': 3, 'net': 6}
@@ -0,0 +1,56 @@
+# /tests/test_counter_transfer.py
+
+import asyncio
+
+import pytest
+
+from modules.counter_transfer import MAX_NAME_LENGTH, ChunkedExportWriter, clean_row, import_counters, new_import_report, read_import_rows
+
+def test_clean_row_normalizes_names_and_values():
+    assert clean_row('  Fruit ', 'Apple', ' 42 ') == ['fruit', 'apple', 42]
+    assert clean_row('g', 'c', -7) == ['g', 'c', -7]
+
+@pytest.mark.parametrize('row, reason', [
+    (('', 'c', 1), 'missing group name'),
+    (('g', '   ', 1), 'missing counter name'),
+    (('g', None, 1), 'missing counter name'),
+    (('g' * (MAX_NAME_LENGTH + 1), 'c', 1), 'group name is longer'),
+    (('g', 'c', '1.5'), 'not a whole number'),
+    (('g', 'c', 1.0), 'not a whole number'),
+    (('g', 'c', True), 'not a whole number'),
+    (('g', 'c', 2**63), 'out of range'),
+])
+def test_clean_row_rejects(row, reason):
+    with pytest.raises(ValueError, match=reason): clean_row(*row)
+
+def test_read_import_rows_reports_line_numbers(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text("group,counter,value\nfruit,apple,3\n\nfruit,pear\nfruit,plum,x\n", encoding='utf-8')
+    assert list(read_import_rows(str(path), 'csv')) == [
+        (2, ['fruit', 'apple', 3], None), (4, None, 'expected 3 columns, found 2'), (5, None, 'value is not a whole number'),
+    ]
+    path = tmp_path / 'in.jsonl'
+    path.write_text('{"group": "a", "counter": "b", "value": 1}\n[1]\nnope\n', encoding='utf-8')
+    assert [error for _, _, error in read_import_rows(str(path), 'jsonl')] == [None, 'not a JSON object', 'not valid JSON']
+
+def test_export_then_import_round_trip(tmp_path):
+    rows = [[f"g{i % 3}", f"counter,{i}", i - 50] for i in range(300)] # Names with commas must survive CSV quoting
+    for fmt in ('csv', 'jsonl'):
+        writer = ChunkedExportWriter(str(tmp_path), f"export-{fmt}", fmt, chunk_bytes=2000)
+        writer.write_rows(rows); paths = writer.close()
+        assert len(paths) > 1
+        applied = []
+        async def apply_group(group_name, group_rows): applied.extend([group_name, *row] for row in group_rows)
+        report = new_import_report()
+        for path in paths: asyncio.run(import_counters(apply_group, path, fmt, report, batch_rows=40))
+        assert sorted(applied) == sorted(rows)
+        assert report['imported'] == 300 and report['invalid'] == 0 and report['groups'] == {'g0', 'g1', 'g2'}
+
+def test_import_keeps_progress_when_a_group_fails(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text("a,x,1\nb,x,1\na,y,2\nb,y,2\n", encoding='utf-8')
+    async def apply_group(group_name, group_rows):
+        if group_name == 'b' and group_rows[0][0] == 'y': raise RuntimeError("worker failed")
+    report = new_import_report()
+    with pytest.raises(RuntimeError): asyncio.run(import_counters(apply_group, str(path), 'csv', report, batch_rows=2))
+    assert report['groups'] == {'a', 'b'} and report['imported'] == 3
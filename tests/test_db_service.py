@@ -0,0 +1,55 @@
+# /tests/test_db_service.py
+
+import os
+import stat
+import pickle
+import asyncio
+import tempfile
+
+import pytest
+
+from modules.async_database import AsyncDatabaseManager
+from modules.db_service import DatabaseService, RemoteDatabaseManager, decode_frame
+
+class Exploit:
+    def __reduce__(self): return (os.system, ('echo owned',))
+
+class Custom:
+    pass
+
+def test_frames_carry_plain_data_and_builtin_errors():
+    message = {'id': 1, 'ok': False, 'args': (1, 'g', [['a', 2]]), 'kwargs': {'names': {'a', 'b'}, 'blob': b'\x00'}, 'error': ValueError("bad")}
+    decoded = decode_frame(pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL))
+    assert decoded['args'] == message['args'] and decoded['kwargs'] == message['kwargs']
+    assert type(decoded['error']) is ValueError and decoded['error'].args == ('bad',)
+
+@pytest.mark.parametrize('payload', [Exploit(), Custom(), {'nested': [Custom()]}])
+def test_frames_referencing_other_globals_are_rejected(payload):
+    with pytest.raises(pickle.UnpicklingError, match='forbidden global'): decode_frame(pickle.dumps(payload))
+
+def test_remote_calls_round_trip_and_other_shards_are_invalidated(db):
+    socket_dir = tempfile.mkdtemp(prefix='cb-') # Unix socket paths must stay short
+    socket_path = os.path.join(socket_dir, 'db.sock')
+    async def main():
+        service = DatabaseService(AsyncDatabaseManager(db), socket_path)
+        await service.start()
+        shard_a, shard_b = RemoteDatabaseManager(socket_path), RemoteDatabaseManager(socket_path)
+        events_a, events_b = [], []
+        shard_a.on_invalidate(events_a.append); shard_b.on_invalidate(events_b.append)
+        await shard_a.connect(); await shard_b.connect()
+        try:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o077 == 0
+            assert await shard_a.create_counters(1, 'g', ['a', 'b']) == {'created': ['a', 'b'], 'duplicates': []}
+            await shard_a.apply_counter_deltas(1, 'g', {'a': 3})
+            assert await shard_b.get_counters_in_group(1, 'g') == [{'name': 'a', 'value': 3}, {'name': 'b', 'value': 0}]
+            with pytest.raises(TypeError): await shard_a.create_counter(1, 'g') # Built-in errors arrive as themselves
+            with pytest.raises(AttributeError): shard_a.initialize_database
+            while len(events_b) < 2: await asyncio.sleep(0.01)
+        finally:
+            shard_a.shutdown(); shard_b.shutdown(); await service.stop()
+        return events_a, events_b
+    events_a, events_b = asyncio.run(main())
+    assert events_a == [] # The shard that made a change refreshes its own views
+    assert [(e['action'], e['group_name'], e['version']) for e in events_b] == [('create_counters', 'g', 1), ('apply_counter_deltas', 'g', 2)]
+    assert not os.path.exists(socket_path)
+    os.rmdir(socket_dir)
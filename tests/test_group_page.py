@@ -0,0 +1,30 @@
+# /tests/test_group_page.py
+
+import modules.database_manager as database_manager
+
+def test_pages_are_clamped_and_carry_the_version(db):
+    db.create_counters(1, 'g', [f"c{i}" for i in range(10)])
+    db.apply_counter_deltas(1, 'g', {'c9': 5})
+    page = db.get_group_page(1, 'g', 3, 4)
+    assert page == {'version': db.get_group_version(1, 'g'), 'page': 3, 'total_pages': 3, 'total': 10, 'items': [{'name': 'c8', 'value': 0}, {'name': 'c9', 'value': 5}]}
+    assert db.get_group_page(1, 'g', 99, 4)['page'] == 3 and db.get_group_page(1, 'g', 0, 4)['page'] == 1
+    assert db.get_group_page(1, 'missing', 1, 4) == {'version': 0, 'page': 1, 'total_pages': 1, 'total': 0, 'items': []}
+
+def test_a_miss_fills_the_cache_and_later_pages_are_served_from_it(db):
+    db.create_counters(1, 'g', [f"c{i}" for i in range(6)])
+    db.cache.invalidate(1, 'g')
+    first = db.get_group_page(1, 'g', 1, 4)
+    assert db.cache.get_group(1, 'g') is not None
+    misses = db.cache.misses
+    second = db.get_group_page(1, 'g', 2, 4)
+    assert db.cache.misses == misses and [item['name'] for item in first['items'] + second['items']] == [f"c{i}" for i in range(6)]
+    db.apply_counter_deltas(1, 'g', {'c5': 1}) # Written through to the cached group
+    assert db.get_group_page(1, 'g', 2, 4)['items'][-1] == {'name': 'c5', 'value': 1}
+
+def test_large_groups_are_read_a_page_at_a_time(db, monkeypatch):
+    monkeypatch.setattr(database_manager, 'GROUP_CACHE_FILL_LIMIT', 5)
+    db.create_counters(1, 'g', [f"c{i}" for i in range(12)])
+    db.cache.invalidate(1, 'g')
+    page = db.get_group_page(1, 'g', 3, 5)
+    assert [item['name'] for item in page['items']] == ['c8', 'c9'] and page['total_pages'] == 3 # Sorted by name: c10 and c11 come before c2
+    assert db.cache.get_group(1, 'g') is None
@@ -0,0 +1,63 @@
+# /tests/test_group_purge.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+from modules.group_purge import GroupPurger, describe_purge_failures
+from modules.render_scheduler import RenderScheduler
+
+class Response:
+    def __init__(self, status: int, reason: str): self.status = status; self.reason = reason
+
+class FakeMessage:
+    def __init__(self, channel, message_id: int): self.channel = channel; self.id = message_id
+    async def delete(self):
+        if self.id in self.channel.gone: raise discord.NotFound(Response(404, 'Not Found'), 'Unknown Message')
+        self.channel.single_deletes.append(self.id)
+
+class FakeChannel:
+    def __init__(self, forbid_bulk: bool = False, gone=()):
+        self.forbid_bulk = forbid_bulk; self.gone = set(gone)
+        self.bulk_deletes: list[list[int]] = []; self.single_deletes: list[int] = []
+    async def delete_messages(self, messages, reason=None):
+        if self.forbid_bulk: raise discord.Forbidden(Response(403, 'Forbidden'), 'Missing Permissions')
+        self.bulk_deletes.append([m.id for m in messages])
+    def get_partial_message(self, message_id: int): return FakeMessage(self, message_id)
+
+class FakeBot:
+    def __init__(self, channels): self.channels = channels
+    def get_channel(self, channel_id: int): return self.channels.get(channel_id)
+
+def message_id(age: timedelta, n: int) -> int:
+    return discord.utils.time_snowflake(datetime.now(timezone.utc) - age) + n
+
+def test_recent_messages_are_bulk_deleted_in_chunks_and_old_ones_singly():
+    recent = [message_id(timedelta(hours=1), n) for n in range(250)]
+    old = [message_id(timedelta(days=15), n) for n in range(2)]
+    channel = FakeChannel(gone={old[1]})
+    records = [{'channel_id': 1, 'message_id': m} for m in recent + old]
+    summary = asyncio.run(GroupPurger(FakeBot({1: channel})).purge(records))
+    assert [len(chunk) for chunk in channel.bulk_deletes] == [100, 100, 50]
+    assert channel.single_deletes == [old[0]] # Past the 14-day bulk delete cutoff
+    assert (summary['messages'], summary['deleted'], summary['missing'], summary['failed']) == (252, 251, 1, 0)
+    assert describe_purge_failures({'purge': summary}) == ""
+
+def test_forbidden_bulk_delete_falls_back_to_single_deletes():
+    recent = [message_id(timedelta(minutes=5), n) for n in range(3)]
+    channels = {1: FakeChannel(forbid_bulk=True), 2: FakeChannel()}
+    records = [{'channel_id': 1, 'message_id': m} for m in recent] + [{'channel_id': 2, 'message_id': recent[0]}]
+    summary = asyncio.run(GroupPurger(FakeBot(channels)).purge(records))
+    assert channels[1].single_deletes == recent and channels[1].bulk_deletes == []
+    assert channels[2].single_deletes == [recent[0]] # A single message never needs a bulk request
+    assert summary['deleted'] == 4 and summary['failed'] == 0
+
+def test_cancel_group_drops_only_that_groups_pending_edits():
+    async def main():
+        async def edit(record, locked): pass
+        scheduler = RenderScheduler(edit)
+        for n, (guild_id, group_name) in enumerate([(1, 'gone'), (1, 'kept'), (2, 'gone'), (1, 'gone')]):
+            scheduler.schedule({'message_id': n, 'channel_id': n % 2, 'guild_id': guild_id, 'group_name': group_name})
+        return scheduler.cancel_group(1, 'gone'), scheduler.backlog()
+    assert asyncio.run(main()) == (2, 2)
@@ -0,0 +1,60 @@
+# /tests/test_job_scheduler.py
+
+import asyncio
+
+from modules.job_scheduler import JobScheduler, merge_jobs
+
+def deltas_job(group: str, deltas: dict, activity: dict = None, clicks: int = 1, event=None) -> dict:
+    return {'action': 'apply_deltas', 'payload': {'guild_id': 1, 'group_name': group, 'deltas': deltas, 'activity': activity or {}}, 'clicks': clicks, 'event': event}
+
+def test_merge_jobs_sums_deltas_and_activity():
+    queued = deltas_job('g', {'a': 2, 'b': 1}, {'a': [2, 0], 'b': [1, 0]}, clicks=3)
+    job = deltas_job('g', {'a': -1, 'c': 4}, {'a': [0, 1], 'c': [4, 0]}, clicks=2)
+    assert merge_jobs(queued, job)
+    assert queued['payload']['deltas'] == {'a': 1, 'b': 1, 'c': 4}
+    assert queued['payload']['activity'] == {'a': [2, 1], 'b': [1, 0], 'c': [4, 0]}
+    assert queued['clicks'] == 5 and queued['merged_jobs'] == [job]
+
+def test_merge_jobs_drops_deltas_that_cancel_out():
+    queued = deltas_job('g', {'a': 2})
+    assert merge_jobs(queued, deltas_job('g', {'a': -2}))
+    assert queued['payload']['deltas'] == {}
+
+def test_merge_jobs_only_merges_delta_batches():
+    create = {'action': 'create_counter', 'payload': {'guild_id': 1, 'group_name': 'g', 'counter_name': 'a'}}
+    assert not merge_jobs(create, deltas_job('g', {'a': 1}))
+    assert not merge_jobs(deltas_job('g', {'a': 1}), create)
+
+def run_jobs(lane_count: int, jobs: list[dict]) -> list[dict]:
+    async def scenario():
+        scheduler, done = JobScheduler(lane_count=lane_count), []
+        for job in jobs: await scheduler.put(job)
+        async def handler(job): await asyncio.sleep(0); done.append(job)
+        scheduler.start(handler)
+        assert await scheduler.drain(timeout=5)
+        await scheduler.stop()
+        return done
+    return asyncio.run(scenario())
+
+def test_jobs_of_one_group_run_in_order():
+    jobs = [{'action': 'update_counter', 'payload': {'guild_id': 1, 'group_name': 'g', 'value': i}} for i in range(20)]
+    done = run_jobs(4, jobs)
+    assert [job['payload']['value'] for job in done] == list(range(20))
+
+def test_queued_delta_batches_are_merged():
+    done = run_jobs(1, [deltas_job('g', {'a': 1}) for _ in range(5)])
+    assert len(done) == 1 and done[0]['payload']['deltas'] == {'a': 5} and done[0]['clicks'] == 5
+
+def test_lane_serves_groups_round_robin():
+    jobs = [{'action': 'update_counter', 'payload': {'guild_id': 1, 'group_name': 'busy', 'value': i}} for i in range(5)]
+    jobs.append({'action': 'update_counter', 'payload': {'guild_id': 1, 'group_name': 'quiet', 'value': 0}})
+    done = run_jobs(1, jobs)
+    assert [job['payload']['group_name'] for job in done[:2]] == ['busy', 'quiet']
+
+def test_drain_without_workers_reports_pending_jobs():
+    async def scenario():
+        scheduler = JobScheduler(lane_count=2)
+        assert await scheduler.drain(timeout=0.1)
+        scheduler.put_nowait(deltas_job('g', {'a': 1}))
+        return await scheduler.drain(timeout=0.1)
+    assert asyncio.run(scenario()) is False
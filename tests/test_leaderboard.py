@@ -0,0 +1,50 @@
+# /tests/test_leaderboard.py
+
+import sqlite3
+
+from modules.counter_cache import AggregateCache
+from modules.database_manager import FAST_SQL
+
+def seed(db):
+    db.create_counters(1, 'fruit', ['apple', 'pear', 'plum'])
+    db.create_counters(1, 'veg', ['kale', 'leek'])
+    db.adjust_counters(1, 'fruit', {'apple': 7, 'pear': -2, 'plum': 3})
+    db.adjust_counters(1, 'veg', {'kale': 5, 'leek': 1})
+    db.create_counter(2, 'fruit', 'apple'); db.adjust_counters(2, 'fruit', {'apple': 100}) # Another guild
+
+def test_leaderboards_and_summary(db):
+    seed(db)
+    assert db.get_leaderboard(1, limit=3) == [{'group': 'fruit', 'name': 'apple', 'value': 7}, {'group': 'veg', 'name': 'kale', 'value': 5}, {'group': 'fruit', 'name': 'plum', 'value': 3}]
+    assert [row['name'] for row in db.get_leaderboard(1, limit=10, group_name='fruit')] == ['apple', 'plum', 'pear']
+    assert db.get_group_summary(1) == [
+        {'group': 'fruit', 'counters': 3, 'total': 8, 'min': -2, 'max': 7},
+        {'group': 'veg', 'counters': 2, 'total': 6, 'min': 1, 'max': 5},
+    ]
+    assert db.get_leaderboard(3) == [] and db.get_group_summary(3) == []
+
+def test_results_are_cached_until_the_guild_changes(db):
+    seed(db)
+    first = db.get_leaderboard(1, limit=3)
+    hits = db.aggregates.hits
+    assert db.get_leaderboard(1, limit=3) == first and db.aggregates.hits == hits + 1
+    db.apply_counter_deltas(2, 'fruit', {'apple': 1}) # Another guild's change keeps the entry
+    assert db.get_leaderboard(1, limit=3) == first and db.aggregates.hits == hits + 2
+    db.apply_counter_deltas(1, 'veg', {'leek': 10})
+    assert db.get_leaderboard(1, limit=1) == [{'group': 'veg', 'name': 'leek', 'value': 11}]
+    assert db.get_leaderboard(1, limit=3)[0]['name'] == 'leek' and db.aggregates.hits == hits + 2
+    db.delete_group(1, 'veg')
+    assert [row['group'] for row in db.get_group_summary(1)] == ['fruit']
+
+def test_aggregate_cache_keeps_the_newest_version():
+    cache = AggregateCache(max_entries=2)
+    cache.put(('g', 'a'), 5, 'new'); cache.put(('g', 'a'), 4, 'stale')
+    assert cache.get(('g', 'a'), 5) == 'new' and cache.get(('g', 'a'), 4) is None and cache.get(('g', 'a'), 6) is None
+    cache.put(('g', 'b'), 1, 'b'); cache.get(('g', 'a'), 5); cache.put(('g', 'c'), 1, 'c')
+    assert cache.get(('g', 'b'), 1) is None and cache.get(('g', 'a'), 5) == 'new' # Least recently used goes first
+    assert cache.stats()['entries'] == 2
+
+def test_leaderboard_reads_the_value_index(db):
+    connection = sqlite3.connect(db.db_file_path)
+    plan = ' '.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + FAST_SQL['leaderboard'], {'b_guild': 1, 'b_limit': 10}))
+    connection.close()
+    assert 'ix_counters_guild_value' in plan and 'TEMP B-TREE' not in plan
@@ -0,0 +1,39 @@
+# /tests/test_loop_watchdog.py
+
+import time
+import asyncio
+
+from modules.loop_watchdog import LoopWatchdog
+
+def blocking_database_call(seconds: float):
+    time.sleep(seconds) # Stands in for a synchronous call made on the event loop
+
+def test_a_stall_is_reported_once_with_the_blocking_stack():
+    async def main():
+        watchdog = LoopWatchdog(threshold_seconds=0.05, interval_seconds=0.01)
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        blocking_database_call(0.3)
+        await asyncio.sleep(0.05)
+        watchdog.stop()
+        return watchdog
+    watchdog = asyncio.run(main())
+    assert watchdog.stalls == 1
+    assert 'blocking_database_call' in watchdog.last_stall['stack']
+    stats = watchdog.stats()
+    assert stats['max_ms'] >= 250 and stats['last_stall']['overdue_ms'] >= 50 and 'stack' not in stats['last_stall']
+
+def test_an_idle_loop_records_lag_without_stalls():
+    async def main():
+        watchdog = LoopWatchdog(threshold_seconds=0.2, interval_seconds=0.01)
+        watchdog.start(); await asyncio.sleep(0.15); watchdog.stop()
+        return watchdog
+    watchdog = asyncio.run(main())
+    assert watchdog.stalls == 0 and watchdog.stats()['samples'] > 0
+    assert watchdog.percentiles()['p50_ms'] <= watchdog.percentiles()['p99_ms'] < 200
+
+def test_percentiles_pick_from_the_sorted_samples():
+    watchdog = LoopWatchdog()
+    assert watchdog.percentiles() == {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    watchdog._samples.extend(i / 1000 for i in range(100, 0, -1))
+    assert watchdog.percentiles() == {'p50_ms': 51.0, 'p95_ms': 96.0, 'p99_ms': 100.0}
@@ -0,0 +1,38 @@
+# /tests/test_metrics.py
+
+import pytest
+
+from modules.metrics import MetricsRegistry
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    jobs = registry.counter('jobs_total', "Jobs processed.", labels=('action', 'outcome'))
+    jobs.inc(action='apply_deltas', outcome='ok'); jobs.inc(2, action='apply_deltas', outcome='ok'); jobs.inc(action='say "hi"\n', outcome='error')
+    seconds = registry.histogram('job_seconds', "Job time.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0): seconds.observe(value)
+    registry.gauge('queue_depth', "Jobs waiting.", lambda: {('0',): 4, ('1',): 0.5}, labels=('lane',))
+    registry.gauge('uptime_seconds', "Uptime.", lambda: 12)
+    assert registry.exposition() == '\n'.join([
+        '# HELP jobs_total Jobs processed.', '# TYPE jobs_total counter',
+        'jobs_total{action="apply_deltas",outcome="ok"} 3',
+        'jobs_total{action="say \\"hi\\"\\n",outcome="error"} 1',
+        '# HELP job_seconds Job time.', '# TYPE job_seconds histogram',
+        'job_seconds_bucket{le="0.1"} 2', 'job_seconds_bucket{le="1.0"} 3', 'job_seconds_bucket{le="+Inf"} 4',
+        'job_seconds_sum 3.65', 'job_seconds_count 4',
+        '# HELP queue_depth Jobs waiting.', '# TYPE queue_depth gauge', 'queue_depth{lane="0"} 4', 'queue_depth{lane="1"} 0.5',
+        '# HELP uptime_seconds Uptime.', '# TYPE uptime_seconds gauge', 'uptime_seconds 12',
+    ]) + '\n'
+
+def test_labels_must_match_and_names_are_unique():
+    registry = MetricsRegistry()
+    jobs = registry.counter('jobs_total', "Jobs processed.", labels=('action',))
+    with pytest.raises(ValueError): jobs.inc(outcome='ok')
+    with pytest.raises(ValueError): registry.counter('jobs_total', "Again.")
+    registry.gauge('depth', "Old bot.", lambda: 1); registry.gauge('depth', "New bot.", lambda: 2) # Gauges are rebound
+    assert 'depth 2' in registry.exposition()
+
+def test_a_failing_gauge_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge('broken', "Raises.", lambda: 1 / 0)
+    registry.counter('ok_total', "Fine.").inc()
+    assert registry.exposition().splitlines() == ['# broken collection failed: division by zero', '# HELP ok_total Fine.', '# TYPE ok_total counter', 'ok_total 1']
@@ -0,0 +1,54 @@
+# /tests/test_render_scheduler.py
+
+import asyncio
+
+import discord
+
+from modules.render_scheduler import RenderScheduler
+
+def record(message_id: int, channel_id: int = 1, group_name: str = 'g') -> dict:
+    return {'message_id': message_id, 'channel_id': channel_id, 'guild_id': 10, 'group_name': group_name}
+
+def run(scenario, **options) -> tuple[list, RenderScheduler]:
+    sent = []
+    async def main():
+        async def edit(record, locked): sent.append((record['message_id'], locked, record.get('state')))
+        scheduler = RenderScheduler(edit, **options)
+        await scenario(scheduler)
+        while scheduler.backlog() or scheduler._active_channels: await asyncio.sleep(0.01)
+        return scheduler
+    return sent, asyncio.run(main())
+
+def test_requests_for_one_message_collapse_to_the_latest():
+    async def scenario(scheduler):
+        for state in range(3): scheduler.schedule({**record(1), 'state': state})
+        scheduler.schedule(record(2))
+    sent, scheduler = run(scenario)
+    assert sent == [(1, False, 2), (2, False, None)]
+    assert scheduler.edits_sent == 2 and scheduler.edits_collapsed == 2
+
+def test_final_state_supersedes_a_held_back_transient_edit():
+    async def scenario(scheduler):
+        scheduler.schedule(record(1), locked=True)
+        await asyncio.sleep(0.01)
+        scheduler.schedule(record(1), locked=False)
+    sent, scheduler = run(scenario, transient_delay_seconds=0.2)
+    assert sent == [(1, False, None)] and scheduler.transient_skipped == 1
+
+def test_transient_edit_is_sent_once_its_delay_passes():
+    async def scenario(scheduler): scheduler.schedule(record(1), locked=True)
+    sent, _ = run(scenario, transient_delay_seconds=0.02)
+    assert sent == [(1, True, None)]
+
+def test_rate_limited_edit_is_retried():
+    sent, attempts = [], []
+    async def main():
+        async def edit(record, locked):
+            attempts.append(record['message_id'])
+            if len(attempts) == 1: raise discord.RateLimited(0.01)
+            sent.append(record['message_id'])
+        scheduler = RenderScheduler(edit)
+        scheduler.schedule(record(1))
+        while scheduler.backlog() or scheduler._active_channels: await asyncio.sleep(0.01)
+        return scheduler.rate_limited
+    assert asyncio.run(main()) == 1 and sent == [1] and attempts == [1, 1]
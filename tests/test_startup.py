@@ -0,0 +1,55 @@
+# /tests/test_startup.py
+
+import asyncio
+
+import discord
+import pytest
+from discord import app_commands
+
+from modules.startup import StartupError, StartupOrchestrator, command_tree_fingerprint
+
+def test_phases_start_once_their_dependencies_finish():
+    events = []
+    def phase(name: str, seconds: float):
+        async def run(): events.append(f"{name}:start"); await asyncio.sleep(seconds); events.append(f"{name}:end")
+        return run
+    startup = StartupOrchestrator()
+    startup.add('auth', phase('auth', 0.02))
+    startup.add('cogs', phase('cogs', 0.01))
+    startup.add('restore', phase('restore', 0.01), depends_on=('auth',))
+    startup.add('sync', phase('sync', 0), depends_on=('cogs', 'restore'))
+    timings = asyncio.run(startup.run())
+    assert events[:2] == ['auth:start', 'cogs:start'] # Independent phases overlap
+    assert events.index('restore:start') > events.index('auth:end')
+    assert events.index('sync:start') > max(events.index('cogs:end'), events.index('restore:end'))
+    assert set(timings) == {'auth', 'cogs', 'restore', 'sync', 'total'}
+
+def test_a_failed_phase_cancels_the_rest():
+    cancelled = []
+    async def fail(): raise StartupError("Google Drive authentication FAILED.")
+    async def slow():
+        try: await asyncio.sleep(10)
+        except asyncio.CancelledError: cancelled.append('slow'); raise
+    async def never(): raise AssertionError("depends on a failed phase")
+    startup = StartupOrchestrator()
+    startup.add('auth', fail); startup.add('cogs', slow); startup.add('restore', never, depends_on=('auth',))
+    with pytest.raises(StartupError): asyncio.run(startup.run())
+    assert cancelled == ['slow']
+
+def test_unknown_dependency_is_rejected():
+    async def noop(): pass
+    with pytest.raises(ValueError): StartupOrchestrator().add('sync', noop, depends_on=('missing',))
+
+def build_tree(description: str = "Adds one", reverse: bool = False) -> app_commands.CommandTree:
+    tree = app_commands.CommandTree(discord.Client(intents=discord.Intents.none()))
+    async def callback(interaction: discord.Interaction): pass
+    commands = [app_commands.Command(name='increment', description=description, callback=callback),
+                app_commands.Command(name='listcounters', description="Lists counters", callback=callback)]
+    for command in reversed(commands) if reverse else commands: tree.add_command(command)
+    return tree
+
+def test_command_tree_fingerprint_tracks_the_synced_payload():
+    fingerprint = command_tree_fingerprint(build_tree(), 1)
+    assert command_tree_fingerprint(build_tree(reverse=True), 1) == fingerprint # Registration order does not matter
+    assert command_tree_fingerprint(build_tree(description="Adds two"), 1) != fingerprint
+    assert command_tree_fingerprint(build_tree(), 2) != fingerprint
@@ -0,0 +1,109 @@
+# /tests/test_sync_journal.py
+
+import os
+import sys
+import json
+import asyncio
+import subprocess
+
+from modules.database_manager import DatabaseManager
+from modules.async_database import AsyncDatabaseManager
+from modules.local_sync import LocalDirectorySync
+from modules.sync_journal import MutationJournal, JournalSync, clean_marker_path
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One bot "process" over a workdir: restore, optionally mutate and sync, then exit cleanly or crash with os._exit
+# (leaving counters.db-wal/-shm behind, since SQLite's connections are never closed).
+PROCESS = """
+import os, sys, json, asyncio, logging
+logging.disable(logging.CRITICAL)
+from modules.database_manager import DatabaseManager
+from modules.async_database import AsyncDatabaseManager
+from modules.local_sync import LocalDirectorySync
+from modules.sync_journal import MutationJournal, JournalSync
+workdir, action, exit_mode = sys.argv[1:4]
+async def main():
+    manager = DatabaseManager(os.path.join(workdir, 'counters.db')); db = AsyncDatabaseManager(manager)
+    store = LocalDirectorySync(manager.db_file_path, os.path.join(workdir, 'remote')); await store.authenticate()
+    journal = MutationJournal(os.path.join(workdir, 'journal')); manager.journal = journal
+    sync = JournalSync(manager, store, journal); await sync.restore()
+    restored = {c['name']: c['value'] for c in manager.get_counters_in_group(1, 'g')}
+    if action == 'create': manager.create_counter(1, 'g', 'a'); await sync.sync(); await sync._snapshot()
+    elif action.startswith('add'): manager.apply_counter_deltas(1, 'g', {'a': int(action[3:])}); await sync.sync()
+    print(json.dumps({'restored': restored, 'downloads_skipped': sync.stats['downloads_skipped']}), flush=True)
+    if exit_mode == 'crash': os._exit(0)
+    db.shutdown(); journal.close(); sync.mark_clean_shutdown()
+asyncio.run(main())
+"""
+
+def run_process(workdir, action: str, exit_mode: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', PROCESS, str(workdir), action, exit_mode], cwd=REPO_ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_crash_with_leftover_wal_does_not_double_apply(tmp_path):
+    run_process(tmp_path, 'create', 'clean')
+    run_process(tmp_path, 'add5', 'clean')
+    run_process(tmp_path, 'add3', 'crash')
+    assert os.path.exists(tmp_path / 'counters.db-wal') # The crash left the newest commits in the WAL
+    after_crash = run_process(tmp_path, 'read', 'clean')
+    assert after_crash == {'restored': {'a': 8}, 'downloads_skipped': 0}
+
+def test_clean_shutdown_skips_the_download(tmp_path):
+    run_process(tmp_path, 'create', 'clean')
+    run_process(tmp_path, 'add2', 'clean')
+    assert os.path.exists(clean_marker_path(str(tmp_path / 'counters.db')))
+    assert run_process(tmp_path, 'read', 'clean') == {'restored': {'a': 2}, 'downloads_skipped': 1}
+
+def test_changed_file_invalidates_the_clean_marker(tmp_path):
+    run_process(tmp_path, 'create', 'clean')
+    run_process(tmp_path, 'add4', 'clean')
+    with open(tmp_path / 'counters.db', 'ab') as f: f.write(b'\0' * 4096) # Anything but the file that was closed
+    assert run_process(tmp_path, 'read', 'clean') == {'restored': {'a': 4}, 'downloads_skipped': 0}
+
+def test_snapshot_plus_segments_restore_on_a_fresh_machine(tmp_path):
+    async def scenario():
+        remote = str(tmp_path / 'remote')
+        def open_bot(name: str):
+            manager = DatabaseManager(str(tmp_path / name / 'counters.db')); os.makedirs(tmp_path / name, exist_ok=True)
+            store = LocalDirectorySync(manager.db_file_path, remote)
+            journal = MutationJournal(str(tmp_path / name / 'journal')); manager.journal = journal
+            return manager, AsyncDatabaseManager(manager), store, journal, JournalSync(manager, store, journal, snapshot_every=2)
+        manager, db, store, journal, sync = open_bot('first')
+        await store.authenticate(); await sync.restore()
+        manager.create_counters(1, 'g', ['a', 'b']); await sync.sync()
+        for step in range(5):
+            manager.apply_counter_deltas(1, 'g', {'a': 1, 'b': -2}); await sync.sync() # Snapshots every 2 segments
+        manager.delete_counter(1, 'g', 'b'); manager.create_counter(1, 'h', 'c'); await sync.sync()
+        expected = {group: manager.get_counters_in_group(1, group) for group in ('g', 'h')}
+        names = sorted(os.listdir(remote))
+        db.shutdown(); journal.close()
+        manager, db, store, journal, sync = open_bot('second')
+        await sync.restore()
+        try: return names, expected, {group: manager.get_counters_in_group(1, group) for group in ('g', 'h')}, journal.seq
+        finally: db.shutdown(); journal.close()
+    names, expected, restored, seq = asyncio.run(scenario())
+    assert any(name.startswith('snapshot-') for name in names) and any(name.startswith('journal-') for name in names)
+    assert restored == expected == {'g': [{'name': 'a', 'value': 5}], 'h': [{'name': 'c', 'value': 0}]}
+    assert seq > 0 # New mutations continue the sequence instead of restarting it
+
+def test_shutdown_waits_for_the_periodic_sync_pass_in_flight(monkeypatch):
+    import main
+    passes = []
+    async def storage_maintenance(db, journal, journal_sync, last_prune):
+        passes.append('started'); await asyncio.sleep(0.2); passes.append('finished')
+        return last_prune
+    monkeypatch.setattr(main, 'SYNC_INTERVAL_SECONDS', 0.01)
+    monkeypatch.setattr(main, 'storage_maintenance', storage_maintenance)
+    class Bot:
+        db = journal = journal_sync = object()
+        async def save_payload_hashes(self): pass
+    async def scenario():
+        bot = Bot(); bot.sync_stopping = asyncio.Event()
+        bot.sync_task = asyncio.create_task(main.CounterBot.sync_worker(bot))
+        while not passes: await asyncio.sleep(0.005)
+        stopped = await main.CounterBot.stop_sync_worker(bot)
+        return stopped, bot.sync_task.done()
+    assert asyncio.run(scenario()) == (True, True)
+    assert passes == ['started', 'finished'] # Stopped after the pass, before another one began
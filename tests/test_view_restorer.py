@@ -0,0 +1,41 @@
+# /tests/test_view_restorer.py
+
+import asyncio
+
+import discord
+
+from modules.view_restorer import ViewRestorer
+
+class Response:
+    status = 404; reason = 'Not Found'
+
+def record(message_id: int, channel_id: int, guild_id: int) -> dict:
+    return {'message_id': message_id, 'channel_id': channel_id, 'guild_id': guild_id, 'group_name': 'g'}
+
+def test_prioritized_guild_jumps_the_queue_and_stale_messages_are_collected():
+    order = []
+    restorer = None
+    async def edit(record):
+        order.append(record['message_id'])
+        if record['message_id'] == 1: restorer.prioritize(30) # A user clicks in guild 30 during startup
+        if record['message_id'] == 5: raise discord.NotFound(Response(), 'Unknown Message')
+        if record['message_id'] == 6: raise RuntimeError("edit failed")
+    records = [record(1, 100, 10), record(2, 100, 10), record(3, 101, 10), record(4, 200, 20), record(5, 300, 30), record(6, 300, 30)]
+    async def main():
+        nonlocal restorer
+        restorer = ViewRestorer(edit, concurrency=1)
+        return await restorer.run(records), restorer.progress
+    stale, progress = asyncio.run(main())
+    # Channel 100 finishes as one batch, then guild 30 goes before guilds 10 (channel 101) and 20
+    assert order == [1, 2, 5, 6, 3, 4]
+    assert stale == [5]
+    assert (progress['total'], progress['restored'], progress['stale'], progress['failed']) == (6, 4, 1, 1)
+
+def test_one_channel_is_never_edited_concurrently():
+    active, overlaps = set(), []
+    async def edit(record):
+        if record['channel_id'] in active: overlaps.append(record['channel_id'])
+        active.add(record['channel_id']); await asyncio.sleep(0.01); active.discard(record['channel_id'])
+    records = [record(i, i % 3, i % 2) for i in range(12)]
+    stale = asyncio.run(ViewRestorer(edit, concurrency=8).run(records))
+    assert stale == [] and overlaps == []
@@ -0,0 +1,81 @@
+# /tests/test_views_routing.py
+
+import asyncio
+
+import pytest
+
+from modules.autocomplete_index import AutocompleteIndex
+from modules.views import MAX_CUSTOM_ID_LENGTH, CounterActionButton, CounterPageButton, route_digest, route_id, resolve_route
+
+class StubDB:
+    def __init__(self, pairs): self.pairs = pairs; self.loads = 0
+    async def get_counter_names(self, guild_id: int): self.loads += 1; return self.pairs
+
+class StubBot:
+    def __init__(self, pairs): self.db = StubDB(pairs); self.autocomplete_index = AutocompleteIndex(route_digest=route_digest)
+
+def parse(custom_id: str, button_class) -> dict:
+    match = button_class.__discord_ui_compiled_template__.fullmatch(custom_id)
+    assert match, custom_id
+    return match.groupdict()
+
+@pytest.mark.parametrize('group, counter', [
+    ('fruit', 'apple'), ('a:b', 'c:d'), ('100%', '#1'), ('%3A', '%23'), ('x' * 40, 'y' * 40), ('émoji 🍎', 'naïve'),
+])
+def test_route_id_round_trip(group, counter):
+    bot = StubBot([(group, counter)])
+    custom_id = route_id('inc', 3, group, counter)
+    assert len(custom_id) <= MAX_CUSTOM_ID_LENGTH
+    fields = parse(custom_id, CounterActionButton)
+    assert fields['action'] == 'inc' and fields['page'] == '3'
+    assert asyncio.run(resolve_route(bot, 1, fields['ref'], with_counter=True)) == (group, counter)
+
+def test_page_route_round_trip():
+    fields = parse(route_id('next', 2, 'a:b'), CounterPageButton)
+    assert asyncio.run(resolve_route(StubBot([]), 1, fields['ref'], with_counter=False)) == ('a:b', None)
+
+def test_long_names_fall_back_to_a_digest():
+    group, counter = 'g' * 60, 'c' * 60
+    custom_id = route_id('del', 1, group, counter)
+    assert len(custom_id) <= MAX_CUSTOM_ID_LENGTH and parse(custom_id, CounterActionButton)['ref'].startswith('#')
+    bot = StubBot([('other', 'x'), (group, counter)])
+    assert asyncio.run(resolve_route(bot, 1, parse(custom_id, CounterActionButton)['ref'], with_counter=True)) == (group, counter)
+    assert asyncio.run(resolve_route(StubBot([('other', 'x')]), 1, parse(custom_id, CounterActionButton)['ref'], with_counter=True)) is None
+
+def test_digests_resolve_from_the_index_without_rescanning():
+    group, counter = 'g' * 90, 'c' * 5 # Too long for a custom_id even without the counter
+    bot = StubBot([(group, counter), ('short', 'x')])
+    async def clicks():
+        ref = parse(route_id('inc', 1, group, counter), CounterActionButton)['ref']
+        for _ in range(3): assert await resolve_route(bot, 1, ref, with_counter=True) == (group, counter)
+        # The counter route is dropped with the counter; the group route stays while the group's lists are up
+        bot.autocomplete_index.on_counter_deleted(1, group, counter)
+        assert await resolve_route(bot, 1, ref, with_counter=True) is None
+        page_ref = parse(route_id('refresh', 1, group), CounterPageButton)['ref']
+        assert await resolve_route(bot, 1, page_ref, with_counter=False) == (group, None)
+        bot.autocomplete_index.on_group_deleted(1, group)
+        assert await resolve_route(bot, 1, page_ref, with_counter=False) is None
+    asyncio.run(clicks())
+    assert bot.db.loads == 1
+    assert bot.autocomplete_index._guilds[1].routes == {} # Short names never need a digest
+
+def test_empty_groups_with_lists_stay_routable():
+    group = 'long group name ' * 6
+    bot = StubBot([(group, None)]) # A posted list, but no counters
+    ref = parse(route_id('next', 2, group), CounterPageButton)['ref']
+    assert ref.startswith('#') and asyncio.run(resolve_route(bot, 1, ref, with_counter=False)) == (group, None)
+    assert asyncio.run(bot.autocomplete_index.search_groups(1, 'long', bot.db.get_counter_names)) == []
+
+def test_route_digest_covers_every_fallback():
+    for length in range(30, 100):
+        group, counter = 'g' * length, 'c:' * (length // 4)
+        for page in (1, 999, 10**6):
+            custom_id = route_id('refresh', page, group)
+            if '#' in custom_id: assert route_digest(group) == custom_id.split('#')[1]
+            custom_id = route_id('dec', page, group, counter)
+            if '#' in custom_id: assert route_digest(group, counter) == custom_id.split('#')[1]
+
+def test_counter_names_include_groups_with_lists_only(db):
+    db.create_counter(1, 'fruit', 'apple')
+    db.add_active_view(10, 5, 1, 'fruit'); db.add_active_view(11, 5, 1, 'empty')
+    assert sorted(db.get_counter_names(1), key=str) == [('empty', None), ('fruit', 'apple'), ('fruit', None)]
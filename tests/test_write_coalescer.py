@@ -0,0 +1,47 @@
+# /tests/test_write_coalescer.py
+
+import asyncio
+
+from modules.job_scheduler import JobScheduler
+from modules.write_coalescer import DeltaCoalescer
+
+def test_clicks_in_one_window_become_one_job():
+    async def scenario():
+        scheduler = JobScheduler(lane_count=2)
+        coalescer = DeltaCoalescer(scheduler, window_seconds=60)
+        jobs = [coalescer.add(1, 'g', 'a', 1), coalescer.add(1, 'g', 'a', 1), coalescer.add(1, 'g', 'b', -1), coalescer.add(1, 'g', 'b', 1)]
+        assert all(job is jobs[0] for job in jobs) and coalescer.has_pending(1, 'g') and scheduler.qsize() == 0
+        coalescer.flush_all()
+        assert not coalescer.has_pending(1, 'g') and scheduler.qsize() == 1
+        queued = await scheduler.lane_for((1, 'g')).get()
+        assert queued is jobs[0]
+        return queued
+    job = asyncio.run(scenario())
+    assert job['payload']['deltas'] == {'a': 2} # b cancelled out
+    assert job['payload']['activity'] == {'a': [2, 0], 'b': [1, 1]} # but its clicks still count as activity
+    assert job['clicks'] == 4
+
+def test_window_flushes_on_its_own():
+    async def scenario():
+        scheduler = JobScheduler(lane_count=1)
+        coalescer = DeltaCoalescer(scheduler, window_seconds=0.01)
+        coalescer.add(1, 'g', 'a', 1); coalescer.add(2, 'g', 'a', 1) # Different guilds never share a batch
+        await asyncio.sleep(0.05)
+        return scheduler.qsize(), coalescer.batches_flushed, coalescer.clicks_received
+    assert asyncio.run(scenario()) == (2, 2, 2)
+
+def test_a_failed_batch_reaches_every_merged_click():
+    from main import CounterBot
+    class FailingDB:
+        async def apply_counter_deltas(self, **payload): raise RuntimeError("disk I/O error")
+    class Worker:
+        db = FailingDB()
+        async def proactive_group_refresh(self, *args, **kwargs): pass
+    async def scenario():
+        scheduler = JobScheduler(lane_count=1)
+        coalescer = DeltaCoalescer(scheduler, window_seconds=60)
+        first = coalescer.add(1, 'g', 'a', 1); coalescer.flush_all()
+        second = coalescer.add(1, 'g', 'a', 1); coalescer.flush_all() # Merges into the batch still queued
+        await CounterBot.db_worker(Worker(), await scheduler.lane_for((1, 'g')).get())
+        return first, second
+    for job in asyncio.run(scenario()): assert job['event'].is_set() and job['error']